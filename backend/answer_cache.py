@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import faiss
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers by question embedding, so repeated and
+    reworded questions skip retrieval and generation.
+
+    Past questions live in a small inner-product FAISS index per source
+    index (cosine similarity on normalized vectors). A lookup hits when the
+    nearest past question is at least `threshold` similar and younger than
+    `ttl_seconds`. Entries are evicted LRU beyond `max_entries`, and all
+    entries for a source index are dropped once its version changes (i.e.
+    build_index or update_index published new files).
+
+    Args:
+        threshold: Minimum cosine similarity for a hit.
+        ttl_seconds: Maximum age of a cached answer.
+        max_entries: Total entries across all source indexes; 0 disables caching.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._spaces = {}
+        self._lru = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _space(self, index_key: Hashable, version, dimension: int, create: bool):
+        """Per-source-index question index, reset when the source index version changes."""
+        space = self._spaces.get(index_key)
+        if space is not None and (space["version"] != version or space["index"].d != dimension):
+            self._drop_space(index_key)
+            self.invalidations += 1
+            space = None
+        if space is None and create:
+            space = {"version": version, "index": faiss.IndexIDMap2(faiss.IndexFlatIP(dimension)), "entries": {}}
+            self._spaces[index_key] = space
+        return space
+
+    def _drop_space(self, index_key: Hashable):
+        space = self._spaces.pop(index_key, None)
+        if space:
+            for entry_id in space["entries"]:
+                self._lru.pop(entry_id, None)
+
+    def _remove(self, index_key: Hashable, entry_id: int):
+        space = self._spaces.get(index_key)
+        if space and space["entries"].pop(entry_id, None) is not None:
+            space["index"].remove_ids(np.array([entry_id], dtype=np.int64))
+        self._lru.pop(entry_id, None)
+
+    def lookup(self, index_key: Hashable, version, vector) -> Optional[dict]:
+        """Returns {"question", "answer", "sources", "similarity"} on a hit, else None."""
+        if self.max_entries <= 0 or version is None:
+            return None
+        query = self._normalize(vector)
+        with self._lock:
+            space = self._space(index_key, version, query.shape[1], create=False)
+            if space is None or space["index"].ntotal == 0:
+                self.misses += 1
+                return None
+
+            similarities, ids = space["index"].search(query, 1)
+            entry_id, similarity = int(ids[0][0]), float(similarities[0][0])
+            entry = space["entries"].get(entry_id)
+            if entry is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry["created"] > self.ttl_seconds:
+                self._remove(index_key, entry_id)
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end(entry_id)
+            self.hits += 1
+            return {"question": entry["question"], "answer": entry["answer"],
+                    "sources": entry["sources"], "similarity": similarity}
+
+    def store(self, index_key: Hashable, version, vector, question: str, answer: str, sources: List[str]):
+        if self.max_entries <= 0 or version is None:
+            return
+        query = self._normalize(vector)
+        with self._lock:
+            space = self._space(index_key, version, query.shape[1], create=True)
+            entry_id = self._next_id
+            self._next_id += 1
+            space["index"].add_with_ids(query, np.array([entry_id], dtype=np.int64))
+            space["entries"][entry_id] = {"question": question, "answer": answer, "sources": list(sources),
+                                          "created": time.monotonic()}
+            self._lru[entry_id] = index_key
+
+            while len(self._lru) > self.max_entries:
+                oldest_id, oldest_key = next(iter(self._lru.items()))
+                self._remove(oldest_key, oldest_id)
+
+    def clear(self):
+        with self._lock:
+            self._spaces.clear()
+            self._lru.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "entries": len(self._lru),
+            "invalidations": self.invalidations,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Returns the process-wide answer cache, configured from
+    $ANSWER_CACHE_THRESHOLD, $ANSWER_CACHE_TTL_S and $ANSWER_CACHE_MAX.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = SemanticAnswerCache(
+                    threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95")),
+                    ttl_seconds=float(os.environ.get("ANSWER_CACHE_TTL_S", "3600")),
+                    max_entries=int(os.environ.get("ANSWER_CACHE_MAX", "1000")),
+                )
+    return _default_cache
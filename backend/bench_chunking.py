@@ -0,0 +1,92 @@
+"""
+Throughput and memory of the chunkers on a large synthetic document.
+
+Compares the recursive splitter (one shot over the whole text, and streamed
+page by page through iter_chunks as ingest used to) with the single-pass
+offset chunker (iter_chunk_spans), all at 1000/200 size/overlap. Pages look
+like extracted PDF text: ~90-character lines, paragraphs separated by blank
+lines.
+
+Usage:
+    python bench_chunking.py [--pages 2000] [--seed 0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from generate_sample_data import synthetic_paragraph  # noqa: E402
+
+from ingest_pipeline import iter_chunk_spans, iter_chunks, split_text  # noqa: E402
+
+
+def synthetic_pages(pages: int, seed: int = 0, paragraphs: int = 6):
+    rng = random.Random(seed)
+    result = []
+    for _ in range(pages):
+        blocks = []
+        for _ in range(paragraphs):
+            words = synthetic_paragraph(rng).split()
+            lines, line = [], ""
+            for word in words:
+                if len(line) + len(word) > 90:
+                    lines.append(line.rstrip())
+                    line = ""
+                line += word + " "
+            lines.append(line.rstrip())
+            blocks.append("\n".join(lines))
+        result.append("\n\n".join(blocks))
+    return result
+
+
+CHUNKERS = {
+    "splitter, whole text": lambda pages: split_text("\n".join(pages)),
+    "splitter, streamed pages": lambda pages: list(iter_chunks(iter(pages), split_text)),
+    "offset chunker": lambda pages: [chunk for _, chunk in iter_chunk_spans(iter(pages))],
+}
+
+
+def run(pages: int = 2000, seed: int = 0):
+    texts = synthetic_pages(pages, seed)
+    text_mb = sum(len(t) for t in texts) / 2**20
+    rows = []
+    for name, chunker in CHUNKERS.items():
+        start = time.perf_counter()
+        chunks = chunker(texts)
+        elapsed = time.perf_counter() - start
+        del chunks
+
+        # Second pass for allocations only; tracing slows the chunkers down
+        tracemalloc.start()
+        chunks = chunker(texts)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows.append({
+            "chunker": name,
+            "seconds": elapsed,
+            "mb_per_sec": text_mb / elapsed,
+            "chunks": len(chunks),
+            "mean_chars": sum(len(c) for c in chunks) / len(chunks),
+            "peak_mb": peak / 2**20,
+        })
+    return text_mb, rows
+
+
+def print_table(text_mb, rows):
+    print(f"{text_mb:.1f} MB of text")
+    print("| Chunker | Seconds | MB/s | Chunks | Mean chars | Peak alloc (MB) |")
+    print("|---|---:|---:|---:|---:|---:|")
+    for row in rows:
+        print(f"| {row['chunker']} | {row['seconds']:.2f} | {row['mb_per_sec']:.1f} | {row['chunks']} "
+              f"| {row['mean_chars']:.0f} | {row['peak_mb']:.1f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print_table(*run(args.pages, args.seed))
@@ -0,0 +1,106 @@
+"""
+Memory vs. recall of the compressed index options on synthetic embeddings.
+
+Builds each index spec over the same clustered vectors and reports the
+serialized index size, bytes per vector and recall@k against exact search.
+Re-ranking keeps the full-precision vectors on disk, so they are not
+counted in the index size.
+
+Usage:
+    python bench_compression.py [--n 20000] [--dim 768] [--queries 200] [--k 10]
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from faiss_utils import _rerank, _search_params, make_index
+
+DEFAULT_SPECS = [
+    "flat",
+    "flat:sq=16",
+    "flat:sq=8",
+    "flat:sq=8,rerank=4",
+    "flat:truncate=256",
+    "flat:truncate=256,rerank=4",
+    "flat:pca=128,sq=8",
+    "flat:pca=128,sq=8,rerank=4",
+    "hnsw:M=32,sq=8",
+    "hnsw:M=32,sq=8,rerank=4",
+    "ivf:sq=8,nprobe=16",
+    "ivf:sq=8,nprobe=16,rerank=4",
+    "ivfpq:m=96,nprobe=16",
+    "ivfpq:m=96,nprobe=16,rerank=4",
+]
+
+
+def synthetic_embeddings(n: int, dimension: int, latent: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    Vectors with the structure of real text embeddings: a low-rank signal
+    (clustered in a `latent`-dimensional space) plus small isotropic noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 200, 1), latent))
+    points = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.normal(size=(n, latent))
+    projection = rng.normal(size=(latent, dimension)) / np.sqrt(latent)
+    vectors = points @ projection + 0.05 * rng.normal(size=(n, dimension))
+    return vectors.astype(np.float32)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def run(n: int = 20000, dimension: int = 768, num_queries: int = 200, k: int = 10, specs=None):
+    vectors = synthetic_embeddings(n + num_queries, dimension)
+    data, queries = vectors[:n], vectors[n:]
+    _, truth = _exact(data, queries, k)
+
+    rows = []
+    for spec in specs or DEFAULT_SPECS:
+        index, resolved = make_index(spec, data)
+        size = len(faiss.serialize_index(index))
+        rerank = resolved.get("rerank")
+        start = time.perf_counter()
+        if rerank:
+            _, candidates = index.search(queries, k * rerank, params=_search_params(index))
+            _, found = _rerank(data, queries, candidates, k)
+        else:
+            _, found = index.search(queries, k)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        rows.append({
+            "spec": spec,
+            "index_mb": size / 2**20,
+            "bytes_per_vector": size / n,
+            "recall": recall_at_k(found, truth),
+            "query_ms": elapsed_ms,
+        })
+    return rows
+
+
+def _exact(data: np.ndarray, queries: np.ndarray, k: int):
+    index = faiss.IndexFlatL2(data.shape[1])
+    index.add(data)
+    return index.search(queries, k)
+
+
+def print_table(rows, k: int):
+    print(f"| Spec | Index size (MB) | Bytes/vector | Recall@{k} | ms/query |")
+    print("|---|---:|---:|---:|---:|")
+    for row in rows:
+        print(f"| `{row['spec']}` | {row['index_mb']:.1f} | {row['bytes_per_vector']:.0f} "
+              f"| {row['recall']:.3f} | {row['query_ms']:.2f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--spec", action="append", help="Index spec to include (repeatable)")
+    args = parser.parse_args()
+    print_table(run(args.n, args.dim, args.queries, args.k, args.spec), args.k)
@@ -0,0 +1,319 @@
+"""
+Offline benchmark: ingest throughput and /chat latency without the Gemini API.
+
+Generates synthetic PDFs, swaps in a deterministic local embedder and LLM
+with configurable simulated latency, and measures:
+  - extraction, chunking, embedding and indexing throughput (per stage)
+  - end-to-end bulk ingest throughput
+  - /chat latency percentiles and throughput under concurrent load
+  - peak RSS
+
+Results print as a table and can be written as JSON (--json) and compared
+against an earlier run (--compare).
+
+Usage:
+    python benchmark.py --docs 20 --pages 10 --requests 500 --concurrency 32 --json run.json
+    python benchmark.py --compare run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from generate_sample_data import WORDS, create_synthetic_corpus  # noqa: E402
+
+import embedding_providers  # noqa: E402
+import gemini_client  # noqa: E402
+import metrics  # noqa: E402
+from answer_cache import SemanticAnswerCache  # noqa: E402
+from embedding_providers import HashingEmbeddingProvider  # noqa: E402
+from faiss_utils import build_index  # noqa: E402
+from gemini_client import GeminiClient  # noqa: E402
+from ingest_pipeline import iter_embedded_batches, iter_pdf_pages  # noqa: E402
+from rag import rag_service  # noqa: E402
+
+class FakeEmbedder(HashingEmbeddingProvider):
+    """
+    The local hashing embedder plus a simulated network round trip: every
+    call sleeps `latency_ms` (plus `per_item_ms` per text), as the real API
+    would, before returning deterministic vectors.
+    """
+
+    name = "fake"
+
+    def __init__(self, dimension: int = 768, latency_ms: float = 0.0, per_item_ms: float = 0.0):
+        super().__init__(dimension=dimension)
+        self.latency_ms = latency_ms
+        self.per_item_ms = per_item_ms
+        self.calls = 0
+
+    def _delay(self, texts) -> float:
+        self.calls += 1
+        return (self.latency_ms + self.per_item_ms * len(texts)) / 1000
+
+    def embed_documents(self, texts):
+        time.sleep(self._delay(texts))
+        return super().embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(self._delay(texts))
+        return super().embed_documents(texts)
+
+
+class FakeLLMClient(GeminiClient):
+    """
+    Stand-in for the Gemini client: answers after `latency_ms` (time to
+    first token) and streams `answer_tokens` tokens `token_ms` apart. The
+    concurrency limits of the real client still apply.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, token_ms: float = 0.0, answer_tokens: int = 50,
+                 max_concurrency: int = None):
+        super().__init__(model_name="fake", max_concurrency=max_concurrency)
+        self.latency_ms = latency_ms
+        self.token_ms = token_ms
+        self.answer_tokens = answer_tokens
+
+    def configure(self):
+        pass
+
+    def _tokens(self, prompt: str):
+        return [f"{WORDS[(len(prompt) + i) % len(WORDS)]} " for i in range(self.answer_tokens)]
+
+    def _total_seconds(self) -> float:
+        return (self.latency_ms + self.token_ms * self.answer_tokens) / 1000
+
+    def generate(self, prompt: str) -> str:
+        with self.limit():
+            time.sleep(self._total_seconds())
+        return "".join(self._tokens(prompt))
+
+    async def agenerate(self, prompt: str) -> str:
+        async with self.async_limit():
+            await asyncio.sleep(self._total_seconds())
+        return "".join(self._tokens(prompt))
+
+    async def astream(self, prompt: str):
+        async with self.async_limit():
+            await asyncio.sleep(self.latency_ms / 1000)
+            for token in self._tokens(prompt):
+                yield token
+                await asyncio.sleep(self.token_ms / 1000)
+
+
+@contextmanager
+def fake_backends(embedder: FakeEmbedder, llm: FakeLLMClient, answer_cache: bool = False):
+    """
+    Routes every embedding and generation call in the backend to the fakes.
+    Unless answer_cache is set, the answer cache is replaced by a disabled
+    one so every request takes the full retrieval + generation path.
+    """
+    cache = SemanticAnswerCache() if answer_cache else SemanticAnswerCache(max_entries=0)
+    with patch.object(embedding_providers, "_provider", embedder), \
+            patch("rag.get_answer_cache", lambda: cache), \
+            patch.object(gemini_client, "_client", llm):
+        yield
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def bench_stages(paths, embedder: FakeEmbedder, work_dir: str, index_spec: str, batch_size: int = 100) -> dict:
+    """Times each ingest stage on its own, single-process, over the whole corpus."""
+    start = time.perf_counter()
+    pages = [page for path in paths for page in iter_pdf_pages(path)]
+    extraction_s = time.perf_counter() - start
+    text_mb = sum(len(p.encode("utf-8")) for p in pages) / 2**20
+
+    start = time.perf_counter()
+    chunks = [chunk for _, chunk in rag_service.iter_chunk_spans(pages)]
+    chunking_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batches = list(iter_embedded_batches(chunks, embedder.embed_documents, batch_size=batch_size))
+    vectors = np.vstack([v for _, v in batches])
+    embedding_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_index(chunks, vectors, index_name="bench_stages", data_dir=work_dir, index_spec=index_spec)
+    indexing_s = time.perf_counter() - start
+
+    return {
+        "extraction": {"seconds": round(extraction_s, 3), "pages": len(pages),
+                       "pages_per_sec": _rate(len(pages), extraction_s), "mb_per_sec": _rate(text_mb, extraction_s)},
+        "chunking": {"seconds": round(chunking_s, 3), "chunks": len(chunks),
+                     "chunks_per_sec": _rate(len(chunks), chunking_s)},
+        "embedding": {"seconds": round(embedding_s, 3), "chunks": len(chunks),
+                      "chunks_per_sec": _rate(len(chunks), embedding_s)},
+        "indexing": {"seconds": round(indexing_s, 3), "vectors": len(chunks),
+                     "vectors_per_sec": _rate(len(chunks), indexing_s)},
+    }
+
+
+def bench_ingest(workers: int = None) -> dict:
+    """End-to-end bulk ingest of the synthetic corpus through RAGService."""
+    result = rag_service.ingest_bulk(pattern="synthetic_*.pdf", workers=workers)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return {key: result[key] for key in ("seconds", "pages", "chunks_created", "pages_per_sec", "chunks_per_sec")
+            if key in result}
+
+
+async def _chat_load(num_requests: int, concurrency: int, questions, endpoint: str):
+    import httpx
+    from main import app
+
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=None) as client:
+        async def worker():
+            nonlocal next_request, errors
+            while next_request < num_requests:
+                question = questions[next_request % len(questions)]
+                next_request += 1
+                start = time.perf_counter()
+                response = await client.post(endpoint, json={"message": question})
+                body = response.text
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200 or "event: error" in body or '"error"' in body:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies)
+    return {
+        "endpoint": endpoint,
+        "requests": num_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": _rate(num_requests, elapsed),
+        "mean_ms": round(float(latencies.mean()), 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def bench_chat(num_requests: int, concurrency: int, seed: int = 0, endpoint: str = "/chat") -> dict:
+    """Concurrent /chat (or /chat/stream) requests against the app in-process."""
+    rng = np.random.default_rng(seed)
+    # Distinct questions so neither embedding nor answer caches short-circuit
+    questions = [" ".join(rng.choice(WORDS, size=8)) + "?" for _ in range(max(num_requests, 1))]
+    return asyncio.run(_chat_load(num_requests, concurrency, questions, endpoint))
+
+
+def run(docs: int = 10, pages: int = 10, requests: int = 200, concurrency: int = 16, embed_latency_ms: float = 50,
+        embed_per_item_ms: float = 0.1, llm_latency_ms: float = 300, token_ms: float = 0, answer_tokens: int = 50,
+        dimension: int = 768, index_spec: str = "flat", workers: int = None, endpoint: str = "/chat",
+        answer_cache: bool = False, seed: int = 0, work_dir: str = None) -> dict:
+    """Runs the whole benchmark and returns the machine-readable report."""
+    config = {key: value for key, value in locals().items() if key != "work_dir"}
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="rag_bench_")
+    embedder = FakeEmbedder(dimension, embed_latency_ms, embed_per_item_ms)
+    llm = FakeLLMClient(llm_latency_ms, token_ms, answer_tokens)
+    original_dir, original_spec = rag_service.data_dir, rag_service.index_spec
+
+    try:
+        start = time.perf_counter()
+        paths = create_synthetic_corpus(work_dir, docs, pages, seed)
+        generate_s = time.perf_counter() - start
+
+        rag_service.data_dir, rag_service.index_spec = work_dir, index_spec
+        with fake_backends(embedder, llm, answer_cache):
+            stages = bench_stages(paths, embedder, work_dir, index_spec)
+            ingest = bench_ingest(workers)
+            chat = bench_chat(requests, concurrency, seed, endpoint)
+    finally:
+        rag_service.data_dir, rag_service.index_spec = original_dir, original_spec
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "config": config,
+        "corpus": {"documents": docs, "pages": docs * pages, "generate_seconds": round(generate_s, 3)},
+        "stages": stages,
+        "ingest": ingest,
+        "chat": chat,
+        "memory": {"peak_rss_mb": metrics.peak_rss_mb(),
+                   "children_peak_rss_mb": metrics.peak_rss_mb(children=True)},
+    }
+
+
+def _flatten(report: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in report.items():
+        if key == "config":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def print_report(report: dict, baseline: dict = None):
+    current = _flatten(report)
+    previous = _flatten(baseline) if baseline else {}
+    width = max(len(name) for name in current)
+    for name, value in current.items():
+        line = f"{name:<{width}}  {value:>12}"
+        if previous.get(name):
+            line += f"  ({(value - previous[name]) / previous[name]:+.1%} vs baseline)"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10, help="Synthetic PDFs to generate")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per PDF")
+    parser.add_argument("--requests", type=int, default=200, help="Total chat requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Chat requests in flight")
+    parser.add_argument("--embed-latency-ms", type=float, default=50, help="Simulated latency per embedding call")
+    parser.add_argument("--embed-per-item-ms", type=float, default=0.1, help="Extra latency per embedded text")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Simulated time to first token")
+    parser.add_argument("--token-ms", type=float, default=0, help="Simulated delay between streamed tokens")
+    parser.add_argument("--answer-tokens", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension")
+    parser.add_argument("--index-spec", default="flat")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes for bulk ingest")
+    parser.add_argument("--stream", action="store_true", help="Load /chat/stream instead of /chat")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Earlier --json report to compare against")
+    args = parser.parse_args()
+
+    report = run(docs=args.docs, pages=args.pages, requests=args.requests, concurrency=args.concurrency,
+                 embed_latency_ms=args.embed_latency_ms, embed_per_item_ms=args.embed_per_item_ms,
+                 llm_latency_ms=args.llm_latency_ms, token_ms=args.token_ms, answer_tokens=args.answer_tokens,
+                 dimension=args.dim, index_spec=args.index_spec, workers=args.workers,
+                 endpoint="/chat/stream" if args.stream else "/chat", answer_cache=args.answer_cache,
+                 seed=args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
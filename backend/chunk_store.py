@@ -0,0 +1,175 @@
+import json
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# File layout (all integers little-endian, every section 8-byte aligned):
+#   header     magic, version, flags, n, blob_len, meta_len
+#   offsets    int64[n + 1]   byte offsets of each chunk in the text blob
+#   ids        int64[n]       vector id of each row, ascending
+#   meta_offs  int64[n + 1]   byte offsets into the metadata blob (if HAS_META)
+#   blob       UTF-8 text of all chunks, concatenated
+#   meta_blob  JSON object per chunk, concatenated (if HAS_META)
+MAGIC = b"RAGCHNK1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+FLAG_POSITIONAL = 1  # ids == row numbers, no lookup needed
+FLAG_HAS_META = 2
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _offsets(encoded: Sequence[bytes]) -> np.ndarray:
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets
+
+
+def write_chunk_store(path: str, chunks: Sequence[str], ids: Sequence[int] = None,
+                      metadata: Sequence[Optional[dict]] = None):
+    """
+    Writes chunks (and optional per-chunk metadata) as one compact file.
+
+    The file is written next to `path` and renamed into place, so readers
+    that already mapped the previous file keep a consistent view.
+
+    Args:
+        path: Destination file.
+        chunks: Chunk texts.
+        ids: Vector id of each chunk; defaults to 0..n-1 (positional).
+        metadata: Optional dict per chunk (e.g. {"source": ..., "page": ...}).
+    """
+    n = len(chunks)
+    if ids is None:
+        ids = np.arange(n, dtype=np.int64)
+    else:
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != n:
+            raise ValueError(f"{n} chunks but {len(ids)} ids")
+        # Rows are stored in id order so lookups can binary-search
+        order = np.argsort(ids, kind="stable")
+        if not np.array_equal(order, np.arange(n)):
+            chunks = [chunks[i] for i in order]
+            metadata = [metadata[i] for i in order] if metadata is not None else None
+            ids = ids[order]
+
+    encoded = [c.encode("utf-8") for c in chunks]
+    offsets = _offsets(encoded)
+
+    flags = 0
+    if np.array_equal(ids, np.arange(n, dtype=np.int64)):
+        flags |= FLAG_POSITIONAL
+    meta_encoded = []
+    meta_offsets = None
+    if metadata is not None:
+        flags |= FLAG_HAS_META
+        meta_encoded = [json.dumps(m or {}, separators=(",", ":")).encode("utf-8") for m in metadata]
+        meta_offsets = _offsets(meta_encoded)
+
+    blob_len = int(offsets[-1])
+    meta_len = int(meta_offsets[-1]) if meta_offsets is not None else 0
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, n, blob_len, meta_len))
+        f.write(offsets.tobytes())
+        f.write(ids.tobytes())
+        if meta_offsets is not None:
+            f.write(meta_offsets.tobytes())
+        f.writelines(encoded)
+        f.write(b"\0" * (_pad8(blob_len) - blob_len))
+        f.writelines(meta_encoded)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a chunk store file.
+
+    Opening is O(1): nothing is decoded until a row is requested, and all
+    processes mapping the same file share one copy in the page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if self._mm is None or size < HEADER.size:
+            raise ValueError(f"{path} is not a chunk store")
+
+        magic, version, flags, n, blob_len, meta_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a chunk store (or an unsupported version)")
+
+        pos = HEADER.size
+        self._offsets = np.frombuffer(self._mm, dtype=np.int64, count=n + 1, offset=pos)
+        pos += 8 * (n + 1)
+        self._ids = np.frombuffer(self._mm, dtype=np.int64, count=n, offset=pos)
+        pos += 8 * n
+        self._meta_offsets = None
+        if flags & FLAG_HAS_META:
+            self._meta_offsets = np.frombuffer(self._mm, dtype=np.int64, count=n + 1, offset=pos)
+            pos += 8 * (n + 1)
+        self._blob_start = pos
+        self._meta_start = pos + _pad8(blob_len)
+        self._positional = bool(flags & FLAG_POSITIONAL)
+        self._n = n
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def has_metadata(self) -> bool:
+        return self._meta_offsets is not None
+
+    def row_of(self, vector_id: int) -> Optional[int]:
+        """Row holding the given vector id, or None if it is not stored."""
+        vector_id = int(vector_id)
+        if vector_id < 0:
+            return None
+        if self._positional:
+            return vector_id if vector_id < self._n else None
+        row = int(np.searchsorted(self._ids, vector_id))
+        if row < self._n and self._ids[row] == vector_id:
+            return row
+        return None
+
+    def text_at(self, row: int) -> str:
+        start = self._blob_start + int(self._offsets[row])
+        end = self._blob_start + int(self._offsets[row + 1])
+        return self._mm[start:end].decode("utf-8")
+
+    def metadata_at(self, row: int) -> dict:
+        if self._meta_offsets is None:
+            return {}
+        start = self._meta_start + int(self._meta_offsets[row])
+        end = self._meta_start + int(self._meta_offsets[row + 1])
+        return json.loads(self._mm[start:end])
+
+    def get(self, vector_id: int) -> Optional[str]:
+        """Chunk text for a vector id, decoding only that row."""
+        row = self.row_of(vector_id)
+        return self.text_at(row) if row is not None else None
+
+    def get_metadata(self, vector_id: int) -> Optional[dict]:
+        row = self.row_of(vector_id)
+        return self.metadata_at(row) if row is not None else None
+
+    def ids(self) -> np.ndarray:
+        return np.array(self._ids)
+
+    def items(self) -> Iterator[Tuple[int, str, dict]]:
+        """Iterates (vector_id, text, metadata) over every row."""
+        for row in range(self._n):
+            yield int(self._ids[row]), self.text_at(row), self.metadata_at(row)
+
+    def texts(self) -> List[str]:
+        return [self.text_at(row) for row in range(self._n)]
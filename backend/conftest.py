@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+import embedding_cache
+import ingest_jobs
+from rag import rag_service
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def _data_dir_state() -> dict:
+    state = {}
+    for root, _, files in os.walk(DATA_DIR):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            state[os.path.relpath(os.path.join(root, name), DATA_DIR)] = (stat.st_size, stat.st_mtime_ns)
+    return state
+
+
+@pytest.fixture(autouse=True, scope="session")
+def data_dir_untouched():
+    """Fails the run if any test wrote to backend/data."""
+    before = _data_dir_state()
+    yield
+    assert _data_dir_state() == before, "the test suite modified backend/data"
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """
+    Keeps the suite out of backend/data: TestClient(app) runs the real
+    lifespan, which would otherwise warm up against the real index, start
+    ingest workers on the real job queue and write the real embedding cache.
+    Tests that need warmup or workers turn them back on themselves, and
+    tests that ingest point rag_service at their own directory.
+    """
+    monkeypatch.setenv("WARMUP", "0")
+    monkeypatch.setenv("INGEST_WORKERS", "0")
+    monkeypatch.setenv("INGEST_JOBS_PATH", str(tmp_path / "ingest_jobs.sqlite"))
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embedding_cache.sqlite"))
+    monkeypatch.setattr(rag_service, "data_dir", str(tmp_path / "data"))
+    monkeypatch.setattr(ingest_jobs, "_queue", None)
+    monkeypatch.setattr(embedding_cache, "_default_cache", None)
@@ -0,0 +1,144 @@
+"""
+Prompt context assembly.
+
+Retrieval returns the top-k chunks as cut at ingest time: neighbouring
+chunks share up to 200 characters, the same passage can be indexed twice
+(e.g. one policy under two file names), and nothing bounds the total size.
+build_context turns ranked hits into the smallest context that still holds
+everything they say:
+
+  1. hits from the same document whose character ranges overlap or touch
+     are merged back into one contiguous span, so shared text appears once;
+  2. spans that are near-duplicates of a better-ranked span are dropped;
+  3. spans are taken in rank order while they fit the token budget.
+"""
+from typing import List, Tuple
+
+from embedding_dispatch import estimate_tokens
+
+# Spans separated by at most this many characters (the whitespace the
+# chunker trims) count as adjacent
+MERGE_GAP = 2
+# Share of a span's word 5-grams already in a kept span that marks it as a duplicate
+DUPLICATE_THRESHOLD = 0.9
+SHINGLE_SIZE = 5
+
+
+def _as_hit(item, rank: int) -> dict:
+    # Plain chunk texts (no offsets) are accepted too and never merged
+    if isinstance(item, str):
+        return {"text": item, "metadata": {}, "rank": rank}
+    return dict(item, rank=rank)
+
+
+def merge_hits(hits: list) -> List[dict]:
+    """
+    Merges hits from the same source whose [start, end) ranges overlap or
+    touch into one span.
+
+    Args:
+        hits: Retrieval hits, best first: chunk texts or dicts with "text" and
+            "metadata" (carrying "source", "start", "end" when known).
+
+    Returns:
+        list[dict]: spans {"text", "source", "start", "end", "rank", "chunks"},
+        ordered by the best rank among their chunks.
+    """
+    spans = []
+    by_source = {}
+    for rank, item in enumerate(hits):
+        hit = _as_hit(item, rank)
+        meta = hit.get("metadata") or {}
+        span = {"text": hit["text"], "source": meta.get("source"), "start": meta.get("start"),
+                "end": meta.get("end"), "rank": rank, "chunks": 1}
+        if span["start"] is None or span["end"] is None:
+            spans.append(span)
+        else:
+            by_source.setdefault(span["source"], []).append(span)
+
+    for group in by_source.values():
+        group.sort(key=lambda s: s["start"])
+        current = group[0]
+        for span in group[1:]:
+            if span["start"] > current["end"] + MERGE_GAP:
+                spans.append(current)
+                current = span
+                continue
+            if span["end"] > current["end"]:
+                if span["start"] >= current["end"]:
+                    current["text"] += "\n" + span["text"]
+                else:
+                    current["text"] += span["text"][current["end"] - span["start"]:]
+                current["end"] = span["end"]
+            current["rank"] = min(current["rank"], span["rank"])
+            current["chunks"] += span["chunks"]
+        spans.append(current)
+
+    spans.sort(key=lambda s: s["rank"])
+    return spans
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _truncate(text: str, tokens: int) -> str:
+    # Inverse of estimate_tokens, cut back to a word boundary
+    text = text[:tokens * 4]
+    cut = text.rfind(" ")
+    return text[:cut] if cut > 0 else text
+
+
+def build_context(hits: list, token_budget: int = None) -> Tuple[List[str], dict]:
+    """
+    Builds prompt context from ranked retrieval hits.
+
+    Args:
+        hits: Retrieval hits, best first (see merge_hits).
+        token_budget: Maximum estimated tokens of context; None for no limit.
+            A best span larger than the whole budget is truncated rather than
+            dropped, so the context is never empty when there are hits.
+
+    Returns:
+        tuple: (passages, stats) where passages are the context texts in
+        rank order and stats reports chunks, spans, duplicates and
+        over-budget spans dropped, the estimated tokens used and the tokens
+        saved against joining the raw hits.
+    """
+    texts = [item if isinstance(item, str) else item["text"] for item in hits]
+    naive_tokens = estimate_tokens(texts) if texts else 0
+
+    passages = []
+    kept_shingles = []
+    used = 0
+    duplicates = 0
+    over_budget = 0
+    for span in merge_hits(hits):
+        shingles = _shingles(span["text"])
+        if any(len(shingles & kept) >= DUPLICATE_THRESHOLD * len(shingles) for kept in kept_shingles):
+            duplicates += 1
+            continue
+        text = span["text"]
+        tokens = estimate_tokens([text])
+        if token_budget is not None and used + tokens > token_budget:
+            if passages:
+                over_budget += 1
+                continue
+            text = _truncate(text, token_budget)
+            tokens = estimate_tokens([text])
+        passages.append(text)
+        kept_shingles.append(shingles)
+        used += tokens
+
+    stats = {
+        "chunks": len(hits),
+        "spans": len(passages),
+        "duplicates_dropped": duplicates,
+        "over_budget_dropped": over_budget,
+        "tokens": used,
+        "tokens_saved": max(naive_tokens - used, 0),
+    }
+    return passages, stats
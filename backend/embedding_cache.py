@@ -0,0 +1,133 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "embedding_cache.sqlite")
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially re-flowed text maps to the same key."""
+    return " ".join(str(text).split())
+
+
+def cache_key(model: str, task_type: str, text: str) -> str:
+    """Content address for one embedding: hash of (model, task_type, normalized text)."""
+    payload = f"{model}\x00{task_type}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-level embedding cache: a bounded in-memory LRU in front of a SQLite
+    file on disk. Vectors are stored as raw float32 bytes.
+
+    Args:
+        path: SQLite file to persist to, or None for a memory-only cache.
+        max_memory_entries: Size bound of the in-memory LRU.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, max_memory_entries: int = 10000):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            parent = os.path.dirname(path)
+            if parent and not os.path.exists(parent):
+                os.makedirs(parent)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+            )
+            self._conn.commit()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_entries:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for whichever of `keys` are known."""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                # SQLite limits the number of bound parameters per statement
+                for i in range(0, len(missing), 500):
+                    batch = missing[i : i + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Stores vectors in both the LRU and the on-disk table."""
+        if not items:
+            return
+        with self._lock:
+            rows = []
+            for key, vector in items.items():
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, int(vector.shape[0]), vector.tobytes()))
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)", rows
+                )
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "memory_entries": len(self._lru),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> EmbeddingCache:
+    """Returns the process-wide cache, stored at $EMBEDDING_CACHE_PATH if set."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = EmbeddingCache(os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH))
+    return _default_cache
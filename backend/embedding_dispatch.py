@@ -0,0 +1,170 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from typing import Optional
+
+
+def _api_errors():
+    """
+    (throttled, transient) exception classes of google.api_core. Its errors
+    can only have been raised once the Gemini SDK imported it, so it is
+    looked up rather than imported here.
+    """
+    api_exceptions = sys.modules.get("google.api_core.exceptions")
+    if api_exceptions is None:
+        return (), ()
+    return ((api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted),
+            (api_exceptions.ServiceUnavailable, api_exceptions.DeadlineExceeded, api_exceptions.InternalServerError))
+
+
+def is_throttled(error: Exception) -> bool:
+    """True for quota / rate-limit errors (HTTP 429)."""
+    return isinstance(error, _api_errors()[0]) or getattr(error, "code", None) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for errors worth retrying: throttling, timeouts and 5xx responses."""
+    return (is_throttled(error) or isinstance(error, _api_errors()[1] + (TimeoutError, ConnectionError))
+            or getattr(error, "code", None) in (500, 503, 504))
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def estimate_tokens(texts) -> int:
+    # Roughly four characters per token for English text
+    return max(1, sum(len(t) for t in texts) // 4)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute / 60` units per second, holding at
+    most one minute's worth. reserve() never blocks: it takes the units
+    (going into debt if needed) and returns how long the caller must wait
+    before using them, so the same bucket serves threads and coroutines.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute quotas for an upstream API.
+    Either limit may be None (unlimited).
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens: int) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def acquire(self, tokens: int):
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self, tokens: int):
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size that follows observed latency and errors (AIMD): it grows
+    while calls finish under `target_latency_ms`, shrinks by a quarter when
+    they are twice as slow or fail, and halves on throttling.
+
+    Args:
+        initial: Starting (and maximum) batch size.
+        minimum: Smallest batch size it will shrink to.
+        target_latency_ms: Latency a batch call should stay under.
+    """
+
+    def __init__(self, initial: int = 100, minimum: int = 8, target_latency_ms: float = 2000):
+        self.maximum = initial
+        self.minimum = min(minimum, initial)
+        self.target_latency_ms = target_latency_ms
+        self.size = initial
+        self._lock = threading.Lock()
+
+    def next_size(self, limit: int) -> int:
+        return max(1, min(self.size, limit))
+
+    def on_success(self, latency_ms: float):
+        with self._lock:
+            if latency_ms < self.target_latency_ms:
+                self.size = min(self.maximum, self.size + max(1, self.size // 10))
+            elif latency_ms > 2 * self.target_latency_ms:
+                self.size = max(self.minimum, self.size * 3 // 4)
+
+    def on_error(self, throttled: bool):
+        with self._lock:
+            factor = 2 if throttled else 4 / 3
+            self.size = max(self.minimum, int(self.size / factor))
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+_limiter = None
+_batch_sizes = {}
+_lock = threading.Lock()
+
+
+def get_embedding_limiter() -> RateLimiter:
+    """Process-wide embedding quota, from $EMBED_RPM and $EMBED_TPM (unset = unlimited)."""
+    global _limiter
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                _limiter = RateLimiter(_env_float("EMBED_RPM"), _env_float("EMBED_TPM"))
+    return _limiter
+
+
+def get_batch_size(model: str, initial: int) -> AdaptiveBatchSize:
+    """Adaptive batch size shared by every embedding call to `model` in this process."""
+    sizer = _batch_sizes.get(model)
+    if sizer is None:
+        with _lock:
+            sizer = _batch_sizes.get(model)
+            if sizer is None:
+                sizer = AdaptiveBatchSize(initial, target_latency_ms=float(os.environ.get("EMBED_TARGET_LATENCY_MS",
+                                                                                           "2000")))
+                _batch_sizes[model] = sizer
+    return sizer
+
+
+def max_retries() -> int:
+    return int(os.environ.get("EMBED_MAX_RETRIES", "5"))
+
+
+def max_concurrent_batches() -> int:
+    return int(os.environ.get("EMBED_CONCURRENCY", "4"))
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+
+from embedding_utils import aembed_texts, embed_texts
+
+DEFAULT_GEMINI_EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+class EmbeddingProvider:
+    """
+    Turns text into vectors for indexing and retrieval.
+
+    Documents (chunks being indexed) and queries (questions being searched)
+    are embedded through separate methods, so providers with asymmetric
+    models can treat them differently. All methods take a list of texts and
+    return a float32 array of shape (len(texts), dimension).
+    """
+
+    name = "base"
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return self.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_queries(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_queries, texts)
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """
+    Gemini embedding API (with the embedding cache, quotas and retries of
+    embed_texts). Documents use task_type "retrieval_document" and queries
+    "retrieval_query".
+    """
+
+    name = "gemini"
+
+    def __init__(self, model: str = DEFAULT_GEMINI_EMBEDDING_MODEL):
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return embed_texts(texts, model=self.model, task_type="retrieval_document")
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return embed_texts(texts, model=self.model, task_type="retrieval_query")
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        return await aembed_texts(texts, model=self.model, task_type="retrieval_document")
+
+    async def aembed_queries(self, texts: List[str]) -> np.ndarray:
+        return await aembed_texts(texts, model=self.model, task_type="retrieval_query")
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local CPU embedder that needs no network or model files: words and word
+    bigrams are hashed into `dimension` signed buckets (the hashing trick)
+    and each row is L2-normalized, so texts sharing vocabulary score close.
+    Lexical rather than semantic, but deterministic and sub-millisecond per
+    query.
+
+    A batch is encoded at once: each distinct feature is hashed a single time
+    and all rows are filled with one bincount. Large batches are split across
+    `workers` threads.
+
+    Args:
+        dimension: Vector size.
+        bigrams: Also hash adjacent word pairs (captures some phrasing).
+        workers: Threads for large batches; defaults to min(4, CPU count).
+    """
+
+    name = "hashing"
+    # Below this many texts a batch is encoded on the calling thread
+    parallel_threshold = 256
+
+    def __init__(self, dimension: int = 768, bigrams: bool = True, workers: int = None):
+        self.dimension = dimension
+        self.bigrams = bigrams
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # feature -> hash; the vocabulary of a corpus is small next to its token count
+        self._hashes = {}
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN.findall(text.lower())
+        if self.bigrams:
+            tokens += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return tokens
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        features = [self._features(t) for t in texts]
+        lengths = np.fromiter((len(f) for f in features), dtype=np.int64, count=len(texts))
+
+        # Hash each distinct feature once
+        ids = {}
+        inverse = np.fromiter((ids.setdefault(f, len(ids)) for row in features for f in row), dtype=np.int64,
+                              count=int(lengths.sum()))
+        hashes = self._hashes
+        if len(hashes) > 1_000_000:
+            hashes.clear()
+        unique = np.empty(len(ids), dtype=np.int64)
+        for feature, i in ids.items():
+            h = hashes.get(feature)
+            if h is None:
+                h = hashes[feature] = zlib.crc32(feature.encode("utf-8"))
+            unique[i] = h
+        buckets = (unique >> 1) % self.dimension
+        signs = np.where(unique & 1, 1.0, -1.0)
+
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        flat = rows * self.dimension + buckets[inverse]
+        vectors = np.bincount(flat, weights=signs[inverse], minlength=len(texts) * self.dimension)
+        vectors = vectors.reshape(len(texts), self.dimension).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing-embed")
+        return self._pool
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if len(texts) < self.parallel_threshold or self.workers < 2:
+            return self._encode(texts)
+        step = -(-len(texts) // self.workers)
+        parts = [texts[i:i + step] for i in range(0, len(texts), step)]
+        return np.vstack(list(self._executor().map(self._encode, parts)))
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        if len(texts) < self.parallel_threshold:
+            # Cheaper than a hop to a worker thread
+            return self.embed_documents(texts)
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_queries(self, texts: List[str]) -> np.ndarray:
+        return await self.aembed_documents(texts)
+
+
+EMBEDDING_PROVIDERS = {
+    "gemini": GeminiEmbeddingProvider,
+    "hashing": HashingEmbeddingProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def make_embedding_provider(name: str) -> EmbeddingProvider:
+    """Creates a provider by name; "hashing" reads its size from $EMBEDDING_DIM (default 768)."""
+    name = name.lower()
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {name!r}, expected one of {tuple(EMBEDDING_PROVIDERS)}")
+    if name == "hashing":
+        return HashingEmbeddingProvider(dimension=int(os.environ.get("EMBEDDING_DIM", "768")))
+    return EMBEDDING_PROVIDERS[name]()
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Returns the process-wide provider, chosen by $EMBEDDING_PROVIDER (default "gemini")."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = make_embedding_provider(os.environ.get("EMBEDDING_PROVIDER", "gemini"))
+    return _provider
+
+
+def set_embedding_provider(provider: EmbeddingProvider):
+    """Replaces the process-wide provider (None re-reads $EMBEDDING_PROVIDER on next use)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
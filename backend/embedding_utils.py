@@ -1,54 +1,276 @@
-import os
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import numpy as np
-import google.generativeai as genai
-from typing import List
+from typing import List, Optional
+from embedding_cache import EmbeddingCache, cache_key, get_default_cache
+from embedding_dispatch import (backoff_delay, estimate_tokens, get_batch_size, get_embedding_limiter, is_retryable,
+                                is_throttled, max_concurrent_batches, max_retries)
+from gemini_client import get_client
+import metrics
 
-def embed_texts(texts: List[str], model="models/text-embedding-004", batch_size=100) -> np.ndarray:
+_requests = metrics.counter("embedding_requests_total", "embed_texts / aembed_texts calls")
+_api_calls = metrics.counter("embedding_api_calls_total", "Batches sent to the embedding API")
+_api_errors = metrics.counter("embedding_api_errors_total", "Embedding API calls that failed")
+_retries = metrics.counter("embedding_retries_total", "Embedding API calls retried after a failure")
+_texts = metrics.counter("embedding_texts_total", "Texts sent to the embedding API")
+_tokens = metrics.counter("embedding_tokens_estimated_total", "Estimated tokens sent to the embedding API (chars / 4)")
+_cache_hits = metrics.counter("embedding_cache_hits_total", "Texts served from the embedding cache")
+_batch_sizes = metrics.histogram("embedding_batch_size", "Texts per embedding API call", (1, 2, 4, 8, 16, 32, 64, 100))
+
+# google.generativeai, imported on first use (see gemini_client)
+genai = None
+
+
+def _genai():
+    global genai
+    if genai is None:
+        import google.generativeai
+        genai = google.generativeai
+    return genai
+
+
+class _EmbeddingJob:
+    """
+    Shared bookkeeping for embed_texts/aembed_texts: cache lookup, handing
+    out the texts that still need the API in batches, checkpointing results
+    and reassembly in input order.
+    """
+
+    def __init__(self, texts, model, task_type, cache, use_cache):
+        # Pre-clean texts: Gemini prefers no newlines in some embedding models,
+        # but modern text-embedding-004 is robust. removing newlines is still safe practice.
+        self.texts = [str(t).replace("\n", " ") for t in texts]
+
+        if use_cache and cache is None:
+            cache = get_default_cache()
+        self.cache = cache if use_cache else None
+
+        # Look up every text first; only the misses go to the API.
+        self.keys = [cache_key(model, task_type, t) for t in self.texts]
+        self.cached = self.cache.get_many(self.keys) if self.cache is not None else {}
+
+        self.miss_positions = []
+        seen_keys = set()
+        for pos, key in enumerate(self.keys):
+            # Duplicate texts in one call are only embedded once
+            if key not in self.cached and key not in seen_keys:
+                self.miss_positions.append(pos)
+                seen_keys.add(key)
+        self.fresh = {}
+        self._next = 0
+
+        _requests.inc()
+        _cache_hits.inc(sum(1 for key in self.keys if key in self.cached))
+
+    def has_pending(self) -> bool:
+        return self._next < len(self.miss_positions)
+
+    def next_batch(self, size):
+        positions = self.miss_positions[self._next:self._next + size]
+        self._next += len(positions)
+        return positions, [self.texts[pos] for pos in positions]
+
+    def record(self, positions, result):
+        # result['embedding'] is a list of lists if batch
+        if 'embedding' not in result:
+            # Handle potential single return or error structure
+            raise ValueError("No embeddings returned")
+        if len(result['embedding']) != len(positions):
+            raise ValueError(f"{len(result['embedding'])} embeddings returned for {len(positions)} texts")
+        batch = {}
+        for pos, vector in zip(positions, result['embedding']):
+            batch[self.keys[pos]] = np.asarray(vector, dtype=np.float32)
+        self.fresh.update(batch)
+        # Checkpoint each batch as it lands: if a later batch fails, re-running
+        # the ingest only sends what is still missing.
+        if self.cache is not None:
+            self.cache.put_many(batch)
+
+    def finish(self) -> np.ndarray:
+        # Reassemble in input order
+        all_embeddings = [self.cached[key] if key in self.cached else self.fresh[key] for key in self.keys]
+        # Convert to numpy float32
+        return np.array(all_embeddings, dtype=np.float32)
+
+
+def _before_call(batch):
+    tokens = estimate_tokens(batch)
+    _api_calls.inc()
+    _texts.inc(len(batch))
+    _tokens.inc(tokens)
+    _batch_sizes.observe(len(batch))
+    return tokens
+
+
+def _after_error(error, attempt, sizer) -> float:
+    """Records a failed call; returns the backoff delay, or raises if it should not be retried."""
+    _api_errors.inc()
+    sizer.on_error(is_throttled(error))
+    if not is_retryable(error) or attempt >= max_retries():
+        raise error
+    _retries.inc()
+    return backoff_delay(attempt)
+
+
+def _call_with_retry(call, batch, sizer):
+    limiter = get_embedding_limiter()
+    attempt = 0
+    while True:
+        tokens = _before_call(batch)
+        limiter.acquire(tokens)
+        started = time.perf_counter()
+        try:
+            with metrics.span("embedding_api_call", "Embedding API call latency", request=False):
+                result = call(batch)
+        except Exception as e:
+            time.sleep(_after_error(e, attempt, sizer))
+            attempt += 1
+            continue
+        sizer.on_success((time.perf_counter() - started) * 1000)
+        return result
+
+
+async def _acall_with_retry(call, batch, sizer):
+    limiter = get_embedding_limiter()
+    attempt = 0
+    while True:
+        tokens = _before_call(batch)
+        await limiter.aacquire(tokens)
+        started = time.perf_counter()
+        try:
+            with metrics.span("embedding_api_call", "Embedding API call latency", request=False):
+                result = await call(batch)
+        except Exception as e:
+            await asyncio.sleep(_after_error(e, attempt, sizer))
+            attempt += 1
+            continue
+        sizer.on_success((time.perf_counter() - started) * 1000)
+        return result
+
+
+def embed_texts(texts: List[str], model="models/text-embedding-004", batch_size=100,
+                task_type="retrieval_document", cache: Optional[EmbeddingCache] = None,
+                use_cache: bool = True) -> np.ndarray:
     """
     Embeds a list of texts using Google Gemini embedding model.
     Handles batching efficiently and returns numpy float32 arrays.
-    
+    Texts already present in the embedding cache are not sent to the API.
+
+    Batches go out concurrently ($EMBED_CONCURRENCY at a time) within the
+    $EMBED_RPM / $EMBED_TPM quotas. Throttled and transient failures are
+    retried with jittered exponential backoff, and the batch size adapts to
+    the observed latency and errors (batch_size is the upper bound). Each
+    finished batch is written to the cache right away, so a failed call can
+    simply be repeated to resume.
+
     Args:
         texts: List of strings to embed.
         model: Gemini model identifier.
-        batch_size: Number of texts to send in one API call.
-        
+        batch_size: Maximum number of texts to send in one API call.
+        task_type: Gemini task type, part of the cache key.
+        cache: EmbeddingCache to use; defaults to the process-wide cache.
+        use_cache: Set to False to always call the API.
+
     Returns:
         np.ndarray: A 2D numpy array of shape (N, D) with dtype float32.
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not set")
-        
-    genai.configure(api_key=api_key)
-    
-    # Pre-clean texts: Gemini prefers no newlines in some embedding models, 
-    # but modern text-embedding-004 is robust. removing newlines is still safe practice.
-    texts = [str(t).replace("\n", " ") for t in texts]
-    
-    all_embeddings = []
-    
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        try:
-            # Gemini embedding API structure
-            result = genai.embed_content(
+    client = get_client()
+    client.configure()
+
+    job = _EmbeddingJob(texts, model, task_type, cache, use_cache)
+    sizer = get_batch_size(model, batch_size)
+
+    def call(batch):
+        # Gemini embedding API structure
+        with client.limit():
+            return _genai().embed_content(
                 model=model,
                 content=batch,
-                task_type="retrieval_document", # Optimize for storage/retrieval
+                task_type=task_type, # Optimize for storage/retrieval
                 title=None
             )
-            # result['embedding'] is a list of lists if batch
-            if 'embedding' in result:
-                batch_embeddings = result['embedding']
-                all_embeddings.extend(batch_embeddings)
-            else:
-                # Handle potential single return or error structure
-                 raise ValueError("No embeddings returned")
-                 
-        except Exception as e:
-            print(f"Error embedding batch {i}-{i+batch_size}: {e}")
-            raise e
 
-    # Convert to numpy float32
-    return np.array(all_embeddings, dtype=np.float32)
+    def run(positions, batch):
+        job.record(positions, _call_with_retry(call, batch, sizer))
+
+    if len(job.miss_positions) <= sizer.next_size(batch_size):
+        # Zero or one batch (e.g. a query): no need for worker threads
+        if job.has_pending():
+            try:
+                run(*job.next_batch(batch_size))
+            except Exception as e:
+                print(f"Error embedding {len(job.miss_positions)} of {len(job.texts)} texts: {e}")
+                raise
+        return job.finish()
+
+    workers = max_concurrent_batches()
+    in_flight = set()
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while (job.has_pending() and not errors) or in_flight:
+            # Keep up to `workers` batches in flight; stop submitting after an error
+            while job.has_pending() and not errors and len(in_flight) < workers:
+                in_flight.add(pool.submit(run, *job.next_batch(sizer.next_size(batch_size))))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            errors.extend(f.exception() for f in done if f.exception() is not None)
+
+    if errors:
+        print(f"Error embedding {len(job.miss_positions) - len(job.fresh)} of {len(job.texts)} texts: {errors[0]}")
+        raise errors[0]
+    return job.finish()
+
+
+async def aembed_texts(texts: List[str], model="models/text-embedding-004", batch_size=100,
+                       task_type="retrieval_document", cache: Optional[EmbeddingCache] = None,
+                       use_cache: bool = True) -> np.ndarray:
+    """
+    Async variant of embed_texts for the request path. Uses the same cache,
+    quotas, retries and adaptive batch size, and shares the client's
+    concurrency limit; takes the same arguments.
+    """
+    client = get_client()
+    client.configure()
+
+    job = _EmbeddingJob(texts, model, task_type, cache, use_cache)
+    sizer = get_batch_size(model, batch_size)
+
+    async def call(batch):
+        async with client.async_limit():
+            return await _genai().embed_content_async(
+                model=model,
+                content=batch,
+                task_type=task_type,
+                title=None
+            )
+
+    async def run(positions, batch):
+        job.record(positions, await _acall_with_retry(call, batch, sizer))
+
+    if len(job.miss_positions) <= sizer.next_size(batch_size):
+        if job.has_pending():
+            try:
+                await run(*job.next_batch(batch_size))
+            except Exception as e:
+                print(f"Error embedding {len(job.miss_positions)} of {len(job.texts)} texts: {e}")
+                raise
+        return job.finish()
+
+    workers = max_concurrent_batches()
+    in_flight = set()
+    errors = []
+    try:
+        while (job.has_pending() and not errors) or in_flight:
+            while job.has_pending() and not errors and len(in_flight) < workers:
+                in_flight.add(asyncio.ensure_future(run(*job.next_batch(sizer.next_size(batch_size)))))
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            errors.extend(t.exception() for t in done if t.exception() is not None)
+    finally:
+        # The caller was cancelled: do not leave batches running unobserved
+        for task in in_flight:
+            task.cancel()
+
+    if errors:
+        print(f"Error embedding {len(job.miss_positions) - len(job.fresh)} of {len(job.texts)} texts: {errors[0]}")
+        raise errors[0]
+    return job.finish()
@@ -1,84 +1,1125 @@
+import asyncio
+import functools
 import faiss
 import numpy as np
 import pickle
 import os
-from embedding_utils import embed_texts
+import json
+import math
+import re
+import shutil
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from embedding_providers import get_embedding_provider
+from query_batcher import QueryBatcher
+from chunk_store import ChunkStore, write_chunk_store
+import metrics
 
-def build_index(chunks: list[str], embeddings: np.ndarray, index_name: str = "faiss_index", data_dir: str = "data"):
+
+def _index_paths(index_name: str, data_dir: str):
+    index_path = os.path.join(data_dir, f"{index_name}.index")
+    chunks_path = os.path.join(data_dir, f"{index_name}.chunks")
+    return index_path, chunks_path
+
+
+def _legacy_chunks_path(index_name: str, data_dir: str):
+    # Indexes built before the chunk store existed pickled their chunks
+    return os.path.join(data_dir, f"{index_name}.pkl")
+
+
+def _existing_chunks_path(index_name: str, data_dir: str):
+    """Path of the chunk file actually on disk (chunk store, else legacy pickle)."""
+    chunks_path = _index_paths(index_name, data_dir)[1]
+    if os.path.exists(chunks_path):
+        return chunks_path
+    legacy_path = _legacy_chunks_path(index_name, data_dir)
+    if os.path.exists(legacy_path):
+        return legacy_path
+    raise FileNotFoundError(f"Chunks not found at {chunks_path}")
+
+
+def _open_chunks(path: str):
+    """Memory-maps a chunk store; legacy pickles are loaded whole (list or {id: chunk})."""
+    if path.endswith(".pkl"):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    return ChunkStore(path)
+
+
+def _docs_path(index_name: str, data_dir: str):
+    return os.path.join(data_dir, f"{index_name}.docs.json")
+
+
+def _meta_path(index_name: str, data_dir: str):
+    return os.path.join(data_dir, f"{index_name}.meta.json")
+
+
+def _vectors_path(index_name: str, data_dir: str):
+    # Full-precision vectors kept beside a compressed index for exact re-ranking
+    return os.path.join(data_dir, f"{index_name}.vectors.npy")
+
+
+# Published indexes live in versioned snapshot directories holding the files
+# above, {data_dir}/{index_name}.snapshots/v000001/, and the one-line file
+# {data_dir}/{index_name}.CURRENT names the live version. Publishing writes a
+# complete snapshot and then atomically replaces the pointer, so a reader
+# always opens one consistent set of files. Indexes written before snapshots
+# existed keep their files directly in data_dir until the next publish.
+_VERSION_NAME = re.compile(r"^v(\d+)$")
+
+
+def _pointer_path(index_name: str, data_dir: str):
+    return os.path.join(data_dir, f"{index_name}.CURRENT")
+
+
+def _snapshots_root(index_name: str, data_dir: str):
+    return os.path.join(data_dir, f"{index_name}.snapshots")
+
+
+def current_snapshot(index_name: str = "faiss_index", data_dir: str = "data"):
+    """Live snapshot version (e.g. "v000003"), or None for an unversioned or missing index."""
+    try:
+        with open(_pointer_path(index_name, data_dir), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_dir(index_name: str = "faiss_index", data_dir: str = "data", version: str = None) -> str:
+    """Directory holding the files of a snapshot version (default: the live one)."""
+    version = version or current_snapshot(index_name, data_dir)
+    if version is None:
+        return data_dir
+    return os.path.join(_snapshots_root(index_name, data_dir), version)
+
+
+def list_snapshots(index_name: str = "faiss_index", data_dir: str = "data") -> list:
+    """Published snapshot versions, oldest first."""
+    root = _snapshots_root(index_name, data_dir)
+    if not os.path.isdir(root):
+        return []
+    versions = [name for name in os.listdir(root) if _VERSION_NAME.match(name)]
+    return sorted(versions, key=lambda name: int(name[1:]))
+
+
+_writer_locks = {}
+_writer_locks_guard = threading.Lock()
+
+
+def _writer_lock(index_name: str, data_dir: str):
+    # Serializes publishers of one index within the process
+    with _writer_locks_guard:
+        return _writer_locks.setdefault((os.path.abspath(data_dir), index_name), threading.RLock())
+
+
+def _publish_snapshot(index_name: str, data_dir: str, write) -> str:
+    """
+    Writes a new snapshot with write(directory), makes it the live version,
+    then garbage-collects old versions.
+
+    Returns:
+        str: the published snapshot directory.
+    """
+    root = _snapshots_root(index_name, data_dir)
+    os.makedirs(root, exist_ok=True)
+    with _writer_lock(index_name, data_dir):
+        tmp_dir = os.path.join(root, f".tmp-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            write(tmp_dir)
+            while True:
+                versions = list_snapshots(index_name, data_dir)
+                version = f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+                try:
+                    os.rename(tmp_dir, os.path.join(root, version))
+                    break
+                except OSError:
+                    # Another process published this version number first
+                    if not os.path.isdir(os.path.join(root, version)):
+                        raise
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        current = current_snapshot(index_name, data_dir)
+        if current is None or int(current[1:]) < int(version[1:]):
+            _write_text_atomic(version, _pointer_path(index_name, data_dir))
+        if current is None:
+            # Unversioned files from before snapshots are superseded
+            for path in (*_index_paths(index_name, data_dir), _legacy_chunks_path(index_name, data_dir),
+                         _meta_path(index_name, data_dir), _vectors_path(index_name, data_dir),
+                         _docs_path(index_name, data_dir)):
+                _remove_file(path)
+    gc_snapshots(index_name, data_dir)
+    return os.path.join(root, version)
+
+
+def gc_snapshots(index_name: str = "faiss_index", data_dir: str = "data", retain: int = None,
+                 min_age_s: float = None) -> list:
+    """
+    Deletes old snapshot versions. The live version and the newest `retain`
+    versions are kept, and so is any version superseded less than
+    `min_age_s` seconds ago: another process may have resolved the pointer
+    just before the switch and still be opening its files.
+
+    Args:
+        retain: Versions to keep; defaults to $INDEX_RETAIN_VERSIONS or 2.
+        min_age_s: Grace period; defaults to $INDEX_RETAIN_SECONDS or 60.
+
+    Returns:
+        list[str]: the versions removed.
+    """
+    if retain is None:
+        retain = int(os.environ.get("INDEX_RETAIN_VERSIONS", "2"))
+    if min_age_s is None:
+        min_age_s = float(os.environ.get("INDEX_RETAIN_SECONDS", "60"))
+    root = _snapshots_root(index_name, data_dir)
+    versions = list_snapshots(index_name, data_dir)
+    keep = set(versions[-max(retain, 1):]) | {current_snapshot(index_name, data_dir)}
+    now = time.time()
+    removed = []
+    for version, successor in zip(versions, versions[1:]):
+        if version in keep:
+            continue
+        # A version was superseded when its successor was written
+        if now - os.path.getmtime(os.path.join(root, successor)) < min_age_s:
+            continue
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+        removed.append(version)
+    # Leftovers of publishers that crashed mid-write
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        path = os.path.join(root, name)
+        if name.startswith(".tmp-") and now - os.path.getmtime(path) > max(min_age_s, 3600):
+            shutil.rmtree(path, ignore_errors=True)
+    if removed:
+        print(f"Removed old snapshots of {index_name}: {', '.join(removed)}")
+    return removed
+
+
+def _lookup_chunk(chunks, idx):
+    """
+    Resolves a FAISS result id to its chunk, decoding only that row of a
+    ChunkStore. Legacy pickles hold a list (id == position) or {id: chunk}.
+    """
+    if idx == -1:
+        return None
+    if isinstance(chunks, (ChunkStore, dict)):
+        return chunks.get(int(idx))
+    if idx < len(chunks):
+        return chunks[idx]
+    return None
+
+
+def _lookup_hit(chunks, idx, distance, include_text: bool = True):
+    """
+    Like _lookup_chunk, but returns {"id", "text", "distance", "metadata"}
+    (without "text" unless `include_text`).
+    """
+    if idx == -1:
+        return None
+    if isinstance(chunks, ChunkStore):
+        row = chunks.row_of(int(idx))
+        if row is None:
+            return None
+        text, meta = chunks.text_at(row) if include_text else None, chunks.metadata_at(row)
+    else:
+        text, meta = _lookup_chunk(chunks, idx), {}
+        if text is None:
+            return None
+    hit = {"id": int(idx), "text": text, "distance": float(distance), "metadata": meta}
+    if not include_text:
+        del hit["text"]
+    return hit
+
+
+def _file_stamp(path: str):
+    """Returns a cheap change marker for a file (mtime in ns, size)."""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _index_stamp(index_name: str, data_dir: str):
+    """Cheap change marker: the pointer file's identity, else the unversioned index files' stamps."""
+    try:
+        st = os.stat(_pointer_path(index_name, data_dir))
+        # The pointer is replaced, never rewritten in place, so a new inode means a new version
+        return (st.st_ino, st.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    index_path = _index_paths(index_name, data_dir)[0]
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"Index not found at {index_path}")
+    return (_file_stamp(index_path), _file_stamp(_existing_chunks_path(index_name, data_dir)))
+
+
+def index_version(index_name: str = "faiss_index", data_dir: str = "data"):
+    """
+    Change marker of the index currently on disk (its snapshot version), or
+    None if there is none. Anything derived from an index (e.g. cached
+    answers) is stale once this value changes.
+    """
+    version = current_snapshot(index_name, data_dir)
+    if version is not None:
+        index_path = _index_paths(index_name, snapshot_dir(index_name, data_dir, version))[0]
+        return version if os.path.exists(index_path) else None
+    index_path = _index_paths(index_name, data_dir)[0]
+    try:
+        return (_file_stamp(index_path), _file_stamp(_existing_chunks_path(index_name, data_dir)))
+    except FileNotFoundError:
+        return None
+
+
+INDEX_LOAD_MODES = ("memory", "mmap")
+
+
+def _remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _write_json_atomic(data: dict, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _write_text_atomic(text: str, path: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class IndexRegistry:
+    """
+    Process-wide cache of loaded FAISS indexes and their chunk stores.
+
+    Entries are keyed by (data_dir, index_name). Each lookup stats the
+    snapshot pointer (or, for unversioned indexes, the index and chunk
+    files); the expensive read_index only happens on the first request or
+    after a new snapshot has been published.
+
+    In "mmap" mode indexes are opened read-only and memory-mapped, so every
+    worker process serving the same files shares one page-cache copy
+    instead of holding a private one. Mapped indexes must never be mutated.
+
+    With many collections, entries are kept in least-recently-used order and
+    the coldest ones are dropped once the loaded indexes exceed the memory
+    budget (the most recently used index always stays). An entry is charged
+    the size of its index file, plus its chunks for legacy pickles, which are
+    loaded whole; chunk stores and re-rank vectors are memory-mapped.
+
+    Loads take a per-index lock, so reading a cold index from disk never
+    delays lookups of other, already loaded indexes (or loads of them).
+
+    Args:
+        load_mode: "memory" or "mmap"; defaults to $INDEX_LOAD_MODE or "memory".
+        memory_budget_mb: Budget for loaded indexes; defaults to
+            $INDEX_CACHE_MB, unlimited if unset.
+    """
+
+    def __init__(self, load_mode: str = None, memory_budget_mb: float = None):
+        self.load_mode = None
+        self.set_load_mode(load_mode or os.environ.get("INDEX_LOAD_MODE", "memory"))
+        if memory_budget_mb is None and os.environ.get("INDEX_CACHE_MB"):
+            memory_budget_mb = float(os.environ["INDEX_CACHE_MB"])
+        self.memory_budget_mb = memory_budget_mb
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._hits = 0
+        self._loads = 0
+        self._reloads = 0
+        self._stale_hits = 0
+        self._evictions = 0
+
+    def set_load_mode(self, load_mode: str):
+        """Switches between "memory" and "mmap"; cached indexes are reloaded on next use."""
+        if load_mode not in INDEX_LOAD_MODES:
+            raise ValueError(f"Unknown index load mode {load_mode!r}, expected one of {INDEX_LOAD_MODES}")
+        if load_mode == "mmap" and not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+            # Older faiss only maps IVF inverted lists: flat and HNSW indexes get a private copy per worker
+            print(f"Warning: faiss {faiss.__version__} cannot memory-map flat or HNSW indexes; "
+                  "INDEX_LOAD_MODE=mmap needs faiss-cpu>=1.11")
+        if load_mode != self.load_mode:
+            self.load_mode = load_mode
+            if hasattr(self, "_entries"):
+                self.clear()
+
+    def _read_index(self, index_path: str):
+        if self.load_mode == "mmap":
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            return faiss.read_index(index_path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        return faiss.read_index(index_path)
+
+    @staticmethod
+    def _key(index_name: str, data_dir: str):
+        return (os.path.abspath(data_dir), index_name)
+
+    def get(self, index_name: str = "faiss_index", data_dir: str = "data"):
+        """
+        Returns (index, chunks) for the given index, loading it from disk only
+        if it is not cached yet or the files changed since the last load.
+        """
+        entry = self.get_entry(index_name, data_dir)
+        return entry["index"], entry["chunks"]
+
+    def get_entry(self, index_name: str = "faiss_index", data_dir: str = "data") -> dict:
+        """
+        Like get, but returns the whole cache entry: {"index", "chunks",
+        "meta", "vectors", "version", "stamp"}. `vectors` holds the
+        memory-mapped full-precision vectors of an index built with
+        re-ranking, else None.
+
+        An entry is one snapshot, and callers keep the entry they got, so a
+        search runs against a single version even if a new one is published
+        meanwhile. While a new version loads, other lookups are still served
+        the previous one instead of waiting.
+        """
+        key = self._key(index_name, data_dir)
+        stamp = _index_stamp(index_name, data_dir)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry["stamp"] == stamp:
+            self._hits += 1
+            self._touch(key)
+            return entry
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        if not load_lock.acquire(blocking=entry is None):
+            self._hits += 1
+            self._stale_hits += 1
+            return entry
+        try:
+            # Another thread may have loaded it while we waited for the lock.
+            entry = self._entries.get(key)
+            if entry is not None and entry["stamp"] == stamp:
+                self._hits += 1
+                self._touch(key)
+                return entry
+
+            try:
+                loaded = self._load(index_name, data_dir, entry)
+            except FileNotFoundError:
+                # The snapshot was garbage-collected between resolving and
+                # opening it (only after a grace period); use the live one
+                if current_snapshot(index_name, data_dir) is None:
+                    raise
+                loaded = self._load(index_name, data_dir, entry)
+            loaded["stamp"] = stamp
+
+            with self._lock:
+                if loaded is entry:
+                    pass
+                elif entry is None:
+                    self._loads += 1
+                else:
+                    self._reloads += 1
+                self._entries[key] = loaded
+                self._entries.move_to_end(key)
+                self._evict()
+            return loaded
+        finally:
+            load_lock.release()
+
+    def _load(self, index_name: str, data_dir: str, entry: dict = None) -> dict:
+        version = current_snapshot(index_name, data_dir)
+        if entry is not None and version is not None and entry["version"] == version:
+            # The pointer was rewritten but still names the loaded version
+            return entry
+        directory = snapshot_dir(index_name, data_dir, version)
+        index_path = _index_paths(index_name, directory)[0]
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"Index not found at {index_path}")
+        chunks_path = _existing_chunks_path(index_name, directory)
+
+        index = self._read_index(index_path)
+        meta = _read_meta(index_name, directory)
+        _apply_search_defaults(index, meta)
+        chunks = _open_chunks(chunks_path)
+        vectors = None
+        vectors_path = _vectors_path(index_name, directory)
+        if meta.get("rerank") and os.path.exists(vectors_path):
+            # Only the candidate rows are paged in at query time
+            vectors = np.load(vectors_path, mmap_mode="r")
+
+        size = os.path.getsize(index_path)
+        if not isinstance(chunks, ChunkStore):
+            size += os.path.getsize(chunks_path)
+        return {"index": index, "chunks": chunks, "meta": meta, "vectors": vectors, "version": version,
+                "bytes": size}
+
+    def refresh(self, index_name: str = "faiss_index", data_dir: str = "data"):
+        """
+        Loads a newly published version of an index that is in use, so no
+        query has to wait for the load. Indexes not loaded are left alone.
+        """
+        if self._key(index_name, data_dir) not in self._entries:
+            return
+        try:
+            self.get_entry(index_name, data_dir)
+        except FileNotFoundError:
+            self.invalidate(index_name, data_dir)
+
+    def _touch(self, key):
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            # Evicted or invalidated meanwhile; the caller still holds the entry
+            pass
+
+    def _evict(self):
+        # Caller holds self._lock. Readers holding an evicted entry keep using it until they finish.
+        # Load locks stay: a loader may hold one right now, and a new lock would let a second load run.
+        if self.memory_budget_mb is None:
+            return
+        budget = self.memory_budget_mb * 2**20
+        while len(self._entries) > 1 and self.memory_bytes() > budget:
+            key, _ = self._entries.popitem(last=False)
+            self._evictions += 1
+            print(f"Evicted index {key[1]} in {key[0]} from the index cache")
+
+    def memory_bytes(self) -> int:
+        """Approximate memory charged to the loaded indexes."""
+        return sum(entry["bytes"] for entry in list(self._entries.values()))
+
+    def invalidate(self, index_name: str = "faiss_index", data_dir: str = "data"):
+        """Drops a cached entry so the next lookup reads it from disk again."""
+        with self._lock:
+            self._entries.pop(self._key(index_name, data_dir), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "load_mode": self.load_mode,
+            "loaded_indexes": len(self._entries),
+            "memory_mb": round(self.memory_bytes() / 2**20, 2),
+            "memory_budget_mb": self.memory_budget_mb,
+            "hits": self._hits,
+            "loads": self._loads,
+            "reloads": self._reloads,
+            "stale_hits": self._stale_hits,
+            "evictions": self._evictions,
+        }
+
+
+index_registry = IndexRegistry()
+
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "auto")
+# Per-type parameters plus the compression options (see parse_index_spec)
+INDEX_PARAMS = ("nlist", "nprobe", "M", "efConstruction", "efSearch", "m", "nbits", "sq", "pca", "truncate", "rerank")
+
+
+def parse_index_spec(spec) -> dict:
+    """
+    Normalizes an index spec into {"type": str, **params}.
+
+    Accepts a dict ({"type": "ivf", "nlist": 1024}) or a string of the form
+    "type" or "type:key=value,key=value" (e.g. "hnsw:M=32,efSearch=64").
+
+    Besides the per-type parameters, flat/ivf/hnsw accept compression options:
+        sq=8 | sq=16      store vectors as int8 (SQ8) or float16 codes
+        pca=<dim>         project to <dim> dimensions with a trained PCA
+        truncate=<dim>    keep only the first <dim> dimensions
+        rerank=<factor>   fetch factor*top_k candidates and re-rank them
+                          exactly against full-precision vectors on disk
+    """
+    if spec is None:
+        spec = "flat"
+    if isinstance(spec, dict):
+        parsed = dict(spec)
+    else:
+        kind, _, rest = str(spec).partition(":")
+        parsed = {"type": kind}
+        for item in filter(None, rest.split(",")):
+            key, _, value = item.partition("=")
+            parsed[key.strip()] = int(value)
+    parsed["type"] = parsed.get("type", "flat").lower()
+    if parsed["type"] not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {parsed['type']!r}, expected one of {INDEX_TYPES}")
+    for key in parsed:
+        if key != "type" and key not in INDEX_PARAMS:
+            raise ValueError(f"Unknown index parameter {key!r}, expected one of {INDEX_PARAMS}")
+    return parsed
+
+
+def _pq_subquantizers(dimension: int, max_bytes_per_vector: int) -> int:
+    """Largest PQ sub-quantizer count that divides dimension and fits the byte budget."""
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if m <= max_bytes_per_vector and dimension % m == 0:
+            return m
+    return 1
+
+
+def choose_index_spec(n: int, dimension: int, memory_budget_mb: float = None) -> dict:
+    """
+    Picks an index type from corpus size and a memory budget.
+
+    - up to 10k vectors: exact flat search is fast enough
+    - up to 1M vectors, if raw vectors plus graph links fit: HNSW
+    - otherwise, if raw vectors fit: IVF (flat lists)
+    - otherwise, if 1 byte per dimension fits: IVF with SQ8 codes + re-rank
+    - otherwise: IVF-PQ compressed to fit the budget
+    """
+    budget = (memory_budget_mb * 1024 * 1024) if memory_budget_mb else float("inf")
+    raw_bytes = n * dimension * 4
+    nlist = max(1, int(4 * math.sqrt(n)))
+
+    if n <= 10_000 and raw_bytes <= budget:
+        return {"type": "flat"}
+    hnsw_m = 32
+    if n <= 1_000_000 and raw_bytes + n * hnsw_m * 2 * 4 <= budget:
+        return {"type": "hnsw", "M": hnsw_m}
+    if raw_bytes <= budget:
+        return {"type": "ivf", "nlist": nlist}
+    # SQ8 codes are a quarter of the raw size; re-rank restores exact order
+    if n * (dimension + 8) <= budget:
+        return {"type": "ivf", "nlist": nlist, "sq": 8, "rerank": 4}
+    # ids (8 bytes) are stored next to each code in the inverted lists
+    per_vector = int(budget / max(n, 1)) - 8
+    return {"type": "ivfpq", "nlist": nlist, "m": _pq_subquantizers(dimension, max(per_vector, 1)), "nbits": 8}
+
+
+def make_index(spec, embeddings: np.ndarray, memory_budget_mb: float = None):
+    """
+    Creates, trains (if needed) and fills a FAISS index for the given spec.
+
+    Returns:
+        tuple: (index, resolved_spec) where resolved_spec has every parameter
+        filled in so it can be saved and reapplied on load.
+    """
+    n, dimension = embeddings.shape
+    spec = parse_index_spec(spec)
+    if spec["type"] == "auto":
+        spec = choose_index_spec(n, dimension, memory_budget_mb)
+
+    # Optional dimensionality reduction in front of the index
+    if spec.get("pca") and spec.get("truncate"):
+        raise ValueError("Use either pca or truncate, not both")
+    reduced = spec.get("pca") or spec.get("truncate") or dimension
+    if reduced > dimension:
+        raise ValueError(f"Cannot reduce {dimension} dimensions to {reduced}")
+
+    sq = spec.get("sq")
+    if sq not in (None, 8, 16):
+        raise ValueError(f"sq must be 8 (SQ8) or 16 (float16), got {sq}")
+    qtype = None
+    if sq is not None:
+        if spec["type"] == "ivfpq":
+            raise ValueError("sq does not apply to ivfpq, which is already compressed")
+        qtype = faiss.ScalarQuantizer.QT_8bit if sq == 8 else faiss.ScalarQuantizer.QT_fp16
+
+    index = _make_base_index(spec, reduced, n, qtype)
+    if spec.get("pca"):
+        index = faiss.IndexPreTransform(faiss.PCAMatrix(dimension, reduced), index)
+    elif spec.get("truncate"):
+        index = faiss.IndexPreTransform(_truncation(dimension, reduced), index)
+
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    _apply_search_defaults(index, spec)
+    return index, spec
+
+
+def _make_base_index(spec: dict, dimension: int, n: int, qtype=None):
+    kind = spec["type"]
+    if kind == "flat":
+        if qtype is not None:
+            return faiss.IndexScalarQuantizer(dimension, qtype)
+        return faiss.IndexFlatL2(dimension)
+    if kind == "hnsw":
+        spec.setdefault("M", 32)
+        spec.setdefault("efConstruction", 40)
+        spec.setdefault("efSearch", 64)
+        if qtype is not None:
+            index = faiss.IndexHNSWSQ(dimension, qtype, spec["M"])
+        else:
+            index = faiss.IndexHNSWFlat(dimension, spec["M"])
+        index.hnsw.efConstruction = spec["efConstruction"]
+        return index
+
+    # k-means needs at least as many training points as centroids
+    spec["nlist"] = max(1, min(spec.get("nlist", int(4 * math.sqrt(n))), n))
+    spec.setdefault("nprobe", min(spec["nlist"], 16))
+    quantizer = faiss.IndexFlatL2(dimension)
+    if kind == "ivf":
+        if qtype is not None:
+            return faiss.IndexIVFScalarQuantizer(quantizer, dimension, spec["nlist"], qtype)
+        return faiss.IndexIVFFlat(quantizer, dimension, spec["nlist"])
+    spec.setdefault("m", _pq_subquantizers(dimension, 64))
+    if dimension % spec["m"] != 0:
+        raise ValueError(f"PQ m={spec['m']} must divide dimension {dimension}")
+    spec["nbits"] = max(1, min(spec.get("nbits", 8), int(math.log2(max(n, 2)))))
+    return faiss.IndexIVFPQ(quantizer, dimension, spec["nlist"], spec["m"], spec["nbits"])
+
+
+def _truncation(dimension: int, keep: int):
+    """Linear transform keeping the first `keep` dimensions (for Matryoshka-style embeddings)."""
+    transform = faiss.LinearTransform(dimension, keep, True)
+    matrix = np.zeros((keep, dimension), dtype=np.float32)
+    matrix[np.arange(keep), np.arange(keep)] = 1.0
+    faiss.copy_array_to_vector(matrix.ravel(), transform.A)
+    faiss.copy_array_to_vector(np.zeros(keep, dtype=np.float32), transform.b)
+    transform.is_trained = True
+    return transform
+
+
+def _unwrap_index(index):
+    """The index doing the search, beneath any IndexPreTransform."""
+    while isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def _apply_search_defaults(index, spec: dict):
+    """Restores the search-time knobs recorded in the spec onto an index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and "nprobe" in spec:
+        ivf.nprobe = spec["nprobe"]
+    base = _unwrap_index(index)
+    if isinstance(base, faiss.IndexHNSW) and "efSearch" in spec:
+        base.hnsw.efSearch = spec["efSearch"]
+
+
+def _search_params(index, nprobe: int = None, ef_search: int = None):
+    """Per-query FAISS search parameters, leaving the shared index untouched."""
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search is not None and isinstance(_unwrap_index(index), faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+
+def _read_meta(index_name: str, directory: str) -> dict:
+    meta_path = _meta_path(index_name, directory)
+    if not os.path.exists(meta_path):
+        return {"type": "flat"}
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index_meta(index_name: str = "faiss_index", data_dir: str = "data") -> dict:
+    """Reads the spec saved with the live index; indexes built before specs existed are flat."""
+    return _read_meta(index_name, snapshot_dir(index_name, data_dir))
+
+
+def build_index(chunks: list[str], embeddings: np.ndarray, index_name: str = "faiss_index", data_dir: str = "data",
+                index_spec="flat", memory_budget_mb: float = None, metadata: list[dict] = None):
     """
     Builds a FAISS index from embeddings and saves it along with the text chunks.
-    
+
     Args:
         chunks: List of text strings corresponding to embeddings.
         embeddings: Numpy array of floats (shape NxD).
         index_name: Base name for the index files.
         data_dir: Directory to save files in.
-        
+        index_spec: "flat", "ivf", "hnsw", "ivfpq" or "auto", optionally with
+            parameters (see parse_index_spec).
+        memory_budget_mb: Memory budget used by "auto" to pick an index type.
+        metadata: Optional dict per chunk (e.g. source file, page) kept in
+            the chunk store.
+
     Returns:
-        tuple: (index_path, chunks_path)
+        tuple: (index_path, chunks_path) in the published snapshot.
     """
     if embeddings.dtype != np.float32:
         embeddings = embeddings.astype(np.float32)
-        
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
-    
+
+    index, spec = make_index(index_spec, embeddings, memory_budget_mb)
+
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
-    
-    # Save Index
-    index_path = os.path.join(data_dir, f"{index_name}.index")
-    faiss.write_index(index, index_path)
-    
-    # Save Chunks (metadata)
-    chunks_path = os.path.join(data_dir, f"{index_name}.pkl")
-    with open(chunks_path, "wb") as f:
-        pickle.dump(chunks, f)
-        
-    print(f"Index built with {index.ntotal} vectors.")
-    return index_path, chunks_path
 
-def retrieve_chunks(query: str, index_name: str = "faiss_index", data_dir: str = "data", top_k: int = 3):
+    # A full rebuild is not tracked per document, so the new snapshot has no
+    # document registry.
+    def write(directory):
+        index_path, chunks_path = _index_paths(index_name, directory)
+        _write_json_atomic(dict(spec, dimension=int(embeddings.shape[1]), ntotal=int(index.ntotal)),
+                           _meta_path(index_name, directory))
+        if spec.get("rerank"):
+            np.save(_vectors_path(index_name, directory), embeddings)
+        faiss.write_index(index, index_path)
+        # Chunks (and their metadata) as a memory-mappable chunk store
+        write_chunk_store(chunks_path, chunks, metadata=metadata)
+
+    directory = _publish_snapshot(index_name, data_dir, write)
+
+    # Readers in this process move to the new snapshot without waiting for
+    # the load; other processes notice the new pointer on their next lookup.
+    index_registry.refresh(index_name, data_dir)
+
+    print(f"Index built with {index.ntotal} vectors ({spec['type']}), published as {os.path.basename(directory)}.")
+    return _index_paths(index_name, directory)
+
+def load_document_registry(index_name: str = "faiss_index", data_dir: str = "data") -> dict:
+    """
+    Loads the per-document registry of an incrementally maintained index.
+
+    Returns:
+        dict: {"next_id": int, "documents": {name: {"hash": str, "ids": list[int]}}}
+    """
+    docs_path = _docs_path(index_name, snapshot_dir(index_name, data_dir))
+    if not os.path.exists(docs_path):
+        return {"next_id": 0, "documents": {}}
+    with open(docs_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_index(upserts: dict, removals: list, index_name: str = "faiss_index", data_dir: str = "data"):
+    """
+    Applies document-level changes to an ID-mapped FAISS index instead of
+    rebuilding it from every chunk, and publishes the result as a new
+    snapshot.
+
+    Args:
+        upserts: {name: {"hash": str, "chunks": list[str], "embeddings": np.ndarray}},
+            optionally with "metadata": list[dict] per chunk. Every chunk's
+            metadata records its source document. Documents already in the
+            registry have their old vectors replaced.
+        removals: Names of documents whose vectors should be dropped.
+        index_name: Base name for the index files.
+        data_dir: Directory the index lives in.
+
+    Returns:
+        dict: {"added": int, "removed": int, "total": int} vector counts.
+    """
+    # Concurrent updates in this process would each start from the same
+    # snapshot and lose the other's changes
+    with _writer_lock(index_name, data_dir):
+        return _update_index(upserts, removals, index_name, data_dir)
+
+
+def _update_index(upserts: dict, removals: list, index_name: str, data_dir: str):
+    source = snapshot_dir(index_name, data_dir)
+    index_path = _index_paths(index_name, source)[0]
+    docs_path = _docs_path(index_name, source)
+    registry = load_document_registry(index_name, data_dir)
+    documents = registry["documents"]
+
+    # Work on a private copy so readers keep using the live snapshot until
+    # the new one is published. Without a registry the existing index (if
+    # any) came from a full rebuild and cannot be edited per document.
+    index = None
+    rows = {}
+    try:
+        existing_chunks_path = _existing_chunks_path(index_name, source)
+    except FileNotFoundError:
+        existing_chunks_path = None
+    if os.path.exists(docs_path) and os.path.exists(index_path) and existing_chunks_path:
+        index = faiss.read_index(index_path)
+        existing = _open_chunks(existing_chunks_path)
+        if isinstance(existing, ChunkStore):
+            rows = {vid: (text, meta) for vid, text, meta in existing.items()}
+        else:
+            rows = {vid: (text, {}) for vid, text in existing.items()}
+    else:
+        documents.clear()
+        registry["next_id"] = 0
+
+    # 1. Remove vectors of deleted and changed documents
+    stale_ids = []
+    for name in list(removals) + [n for n in upserts if n in documents]:
+        entry = documents.pop(name, None)
+        if entry:
+            stale_ids.extend(entry["ids"])
+    if stale_ids and index is not None:
+        index.remove_ids(np.array(stale_ids, dtype=np.int64))
+        for vid in stale_ids:
+            rows.pop(vid, None)
+
+    # 2. Append vectors of new and changed documents under fresh ids
+    added = 0
+    for name, doc in upserts.items():
+        if not doc["chunks"]:
+            # Keep the hash so an empty document is not re-read next time
+            documents[name] = {"hash": doc["hash"], "ids": []}
+            continue
+        embeddings = np.asarray(doc["embeddings"], dtype=np.float32)
+        if len(doc["chunks"]) != embeddings.shape[0]:
+            raise ValueError(f"{name}: {len(doc['chunks'])} chunks but {embeddings.shape[0]} embeddings")
+        if index is None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(embeddings.shape[1]))
+
+        start = registry["next_id"]
+        ids = np.arange(start, start + embeddings.shape[0], dtype=np.int64)
+        registry["next_id"] = start + embeddings.shape[0]
+        index.add_with_ids(embeddings, ids)
+        chunk_metadata = doc.get("metadata") or [{}] * len(doc["chunks"])
+        for vid, chunk, meta in zip(ids.tolist(), doc["chunks"], chunk_metadata):
+            rows[vid] = (chunk, dict(meta, source=name))
+        documents[name] = {"hash": doc["hash"], "ids": ids.tolist()}
+        added += embeddings.shape[0]
+
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+
+    def write(directory):
+        if index is not None:
+            # Incremental indexes are always exact: per-id removal and appends
+            # without retraining are only cheap on a flat index.
+            new_index_path, chunks_path = _index_paths(index_name, directory)
+            _write_json_atomic({"type": "flat", "dimension": int(index.d), "ntotal": int(index.ntotal)},
+                               _meta_path(index_name, directory))
+            faiss.write_index(index, new_index_path)
+            row_ids = sorted(rows)
+            write_chunk_store(chunks_path, [rows[vid][0] for vid in row_ids], ids=row_ids,
+                              metadata=[rows[vid][1] for vid in row_ids])
+        _write_json_atomic(registry, _docs_path(index_name, directory))
+
+    _publish_snapshot(index_name, data_dir, write)
+    index_registry.refresh(index_name, data_dir)
+
+    total = index.ntotal if index is not None else 0
+    print(f"Index updated: +{added} / -{len(stale_ids)} vectors, {total} total.")
+    return {"added": added, "removed": len(stale_ids), "total": total}
+
+
+def _rerank(vectors: np.ndarray, query_vectors: np.ndarray, indices: np.ndarray, top_k: int):
+    """
+    Re-orders each row of candidate ids by exact L2 distance against the
+    full-precision vectors (row i of `vectors` is vector id i) and keeps top_k.
+
+    Returns:
+        tuple: (distances, ids), shaped like index.search results.
+    """
+    reranked = np.full((len(indices), top_k), -1, dtype=np.int64)
+    reranked_distances = np.full((len(indices), top_k), np.inf, dtype=np.float32)
+    for i, row in enumerate(indices):
+        # Sorted ids read the memory-mapped file front to back
+        candidates = np.unique(row[(row >= 0) & (row < len(vectors))])
+        if not len(candidates):
+            continue
+        exact = np.asarray(vectors[candidates], dtype=np.float32)
+        distances = ((exact - query_vectors[i]) ** 2).sum(axis=1)
+        order = np.argsort(distances, kind="stable")[:top_k]
+        reranked[i, :len(order)] = candidates[order]
+        reranked_distances[i, :len(order)] = distances[order]
+    return reranked_distances, reranked
+
+
+def _search_ids(index, query_vectors: np.ndarray, top_k: int, nprobe: int = None, ef_search: int = None,
+                vectors: np.ndarray = None, rerank: int = None):
+    """One multi-row index.search (plus re-ranking); returns (distances, ids)."""
+    if query_vectors.shape[1] != index.d:
+        raise ValueError(f"Query embeddings have {query_vectors.shape[1]} dimensions but the index has {index.d}; "
+                         "re-ingest after changing the embedding provider")
+    params = _search_params(index, nprobe, ef_search)
+    if vectors is not None and rerank:
+        # Over-fetch from the compressed index, then order exactly
+        _, candidates = index.search(query_vectors, top_k * rerank, params=params)
+        return _rerank(vectors, query_vectors, candidates, top_k)
+    return index.search(query_vectors, top_k, params=params)
+
+
+def _search_loaded(index, chunks, query_vectors: np.ndarray, top_k: int, nprobe: int = None, ef_search: int = None,
+                   vectors: np.ndarray = None, rerank: int = None, details: bool = False):
+    distances, indices = _search_ids(index, query_vectors, top_k, nprobe, ef_search, vectors, rerank)
+    results = []
+    for distance_row, row in zip(distances, indices):
+        matches = []
+        for distance, idx in zip(distance_row, row):
+            match = _lookup_hit(chunks, idx, distance) if details else _lookup_chunk(chunks, idx)
+            if match is not None:
+                matches.append(match)
+        results.append(matches)
+    return results
+
+
+def _search_entry(entry: dict, query_vectors: np.ndarray, top_k: int, nprobe: int = None, ef_search: int = None,
+                  details: bool = False):
+    return _search_loaded(entry["index"], entry["chunks"], query_vectors, top_k, nprobe, ef_search,
+                          vectors=entry["vectors"], rerank=entry["meta"].get("rerank"), details=details)
+
+
+def search_chunks(query_vectors: np.ndarray, index_name: str = "faiss_index", data_dir: str = "data", top_k: int = 3,
+                  nprobe: int = None, ef_search: int = None, details: bool = False):
+    """
+    Searches the FAISS index with already-embedded queries. This is the
+    blocking half of retrieval, run in a worker thread by the async path.
+
+    Returns:
+        list[list]: matching chunks for each query row (hit dicts if `details`).
+    """
+    entry = index_registry.get_entry(index_name, data_dir)
+    query_vectors = np.asarray(query_vectors, dtype=np.float32)
+    return _search_entry(entry, query_vectors, top_k, nprobe, ef_search, details)
+
+
+def retrieve_chunks(query: str, index_name: str = "faiss_index", data_dir: str = "data", top_k: int = 3,
+                    nprobe: int = None, ef_search: int = None, details: bool = False):
     """
     Embeds the query, searches the FAISS index, and returns top-k relevant chunks.
-    
+
     Args:
         query: User question string.
         index_name: Name of index to load.
         data_dir: Directory where index is stored.
         top_k: Number of chunks to return.
-        
+        nprobe: IVF lists to visit for this query (IVF/IVF-PQ indexes only).
+        ef_search: HNSW search breadth for this query (HNSW indexes only).
+        details: Return hit dicts {"id", "text", "distance", "metadata"}
+            instead of bare chunk texts.
+
     Returns:
-        list[str]: list of matching text chunks.
+        list: matching text chunks (or hits), closest first.
     """
-    # Load Index
-    index_path = os.path.join(data_dir, f"{index_name}.index")
-    if not os.path.exists(index_path):
-        raise FileNotFoundError(f"Index not found at {index_path}")
-        
-    index = faiss.read_index(index_path)
-    
-    # Load Chunks
-    chunks_path = os.path.join(data_dir, f"{index_name}.pkl")
-    if not os.path.exists(chunks_path):
-        raise FileNotFoundError(f"Chunks not found at {chunks_path}")
-        
-    with open(chunks_path, "rb") as f:
-        chunks = pickle.load(f)
-    
-    # Embed Query
-    # embed_texts returns shape (N, D), we need (1, D) for search
-    query_vectors = embed_texts([query]) 
-    
-    # Search
-    distances, indices = index.search(query_vectors, top_k)
-    
-    # Retrieve Results
-    results = []
-    # indices is shape (1, k)
-    for idx in indices[0]:
-        if idx != -1 and idx < len(chunks):
-            results.append(chunks[idx])
-            
+    # Load Index and Chunks (served from memory after the first call)
+    with metrics.span("retrieval_index_load", "Index lookup / load from disk"):
+        entry = index_registry.get_entry(index_name, data_dir)
+
+    # Embed Query (query mode); returns shape (1, D) for search
+    with metrics.span("retrieval_embed", "Query embedding"):
+        query_vectors = get_embedding_provider().embed_queries([query])
+
+    # Search; indices is shape (1, k)
+    with metrics.span("retrieval_search", "FAISS search and chunk lookup"):
+        return _search_entry(entry, query_vectors, top_k, nprobe, ef_search, details)[0]
+
+
+def search_queries(queries, index_name: str = "faiss_index", data_dir: str = "data", top_k: int = 10,
+                   offset: int = 0, max_distance: float = None, nprobe: int = None, ef_search: int = None,
+                   include_text: bool = True) -> list:
+    """
+    Retrieval without generation for one query or a batch of them: all
+    queries are embedded together and searched in a single multi-row
+    index.search, so thousands of evaluation queries cost one pass.
+
+    Args:
+        queries: A query string, a list of them, or a 2-D array of query
+            embeddings.
+        index_name: Name of index to load.
+        data_dir: Directory where index is stored.
+        top_k: Hits per query (the page size).
+        offset: Hits to skip per query, for fetching later pages.
+        max_distance: Drop hits farther than this (squared L2) distance.
+        nprobe: IVF lists to visit (IVF/IVF-PQ indexes only).
+        ef_search: HNSW search breadth (HNSW indexes only).
+        include_text: Include chunk texts; ids, distances and metadata
+            are always returned.
+
+    Returns:
+        list[dict]: per query {"query", "hits", "next_offset"}, where hits are
+        {"id", "text", "distance", "metadata", "rank"} closest first and
+        next_offset is None once there are no further hits.
+    """
+    if isinstance(queries, str):
+        queries = [queries]
+    with metrics.span("retrieval_index_load", "Index lookup / load from disk"):
+        entry = index_registry.get_entry(index_name, data_dir)
+
+    if isinstance(queries, np.ndarray):
+        query_vectors = np.asarray(queries, dtype=np.float32)
+        queries = [None] * len(query_vectors)
+    else:
+        queries = list(queries)
+        if not queries:
+            return []
+        with metrics.span("retrieval_embed", "Query embedding"):
+            query_vectors = get_embedding_provider().embed_queries(queries)
+
+    # One search for the whole batch; earlier pages are fetched and skipped
+    with metrics.span("retrieval_search", "FAISS search and chunk lookup"):
+        distances, indices = _search_ids(entry["index"], query_vectors, offset + top_k, nprobe, ef_search,
+                                         entry["vectors"], entry["meta"].get("rerank"))
+        results = []
+        for query, distance_row, row in zip(queries, distances, indices):
+            hits = []
+            more = bool(row[-1] != -1) and entry["index"].ntotal > offset + top_k
+            for rank in range(offset, len(row)):
+                if max_distance is not None and distance_row[rank] > max_distance:
+                    more = False
+                    break
+                hit = _lookup_hit(entry["chunks"], row[rank], distance_row[rank], include_text)
+                if hit is not None:
+                    hit["rank"] = rank
+                    hits.append(hit)
+            results.append({"query": query, "hits": hits, "next_offset": offset + top_k if more else None})
+    metrics.counter("search_queries_total", "Queries answered by retrieval-only search").inc(len(results))
     return results
+
+
+# Batch key of query embeddings requested on their own (see aembed_query)
+_EMBED_KEY = ("embed",)
+
+
+async def _embed_batch(queries: list) -> np.ndarray:
+    # Shared by every request in the batch, so kept out of per-request timings
+    with metrics.span("retrieval_embed", "Query embedding", request=False):
+        return np.asarray(await get_embedding_provider().aembed_queries(queries), dtype=np.float32)
+
+
+async def _retrieve_batch(key, items: list):
+    """
+    Batch handler of the QueryBatcher. Embedding batches return one vector
+    per query. Search batches get (query, vector or None) pairs: the queries
+    without a vector are embedded in one API call, then all are searched in
+    one multi-row search.
+    """
+    if key == _EMBED_KEY:
+        return list(await _embed_batch(items))
+    _, index_name, data_dir, top_k, nprobe, ef_search, details = key
+    search = functools.partial(search_chunks, details=True) if details else search_chunks
+    missing = [i for i, (_, vector) in enumerate(items) if vector is None]
+    vectors = [vector for _, vector in items]
+    if missing:
+        for i, vector in zip(missing, await _embed_batch([items[i][0] for i in missing])):
+            vectors[i] = vector
+    query_vectors = np.asarray(np.stack(vectors), dtype=np.float32)
+    with metrics.span("retrieval_search", "FAISS search and chunk lookup", request=False):
+        return await asyncio.to_thread(search, query_vectors, index_name, data_dir, top_k, nprobe, ef_search)
+
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+def get_query_batcher() -> QueryBatcher:
+    """
+    Returns the QueryBatcher for the running event loop. The window and batch
+    size come from $QUERY_BATCH_WINDOW_MS (default 2) and $QUERY_BATCH_MAX
+    (default 32).
+    """
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = QueryBatcher(
+            _retrieve_batch,
+            window_ms=float(os.environ.get("QUERY_BATCH_WINDOW_MS", "2")),
+            max_batch=int(os.environ.get("QUERY_BATCH_MAX", "32")),
+        )
+        _batchers[loop] = batcher
+    return batcher
+
+
+async def aembed_query(query: str) -> np.ndarray:
+    """
+    Query-mode embedding of one question, micro-batched with concurrent
+    callers into one embedding call. Callers that need the vector before
+    retrieval (e.g. the answer cache) pass it on to aretrieve_chunks.
+    """
+    return await get_query_batcher().submit(_EMBED_KEY, query)
+
+
+async def aretrieve_chunks(query: str, index_name: str = "faiss_index", data_dir: str = "data", top_k: int = 3,
+                           nprobe: int = None, ef_search: int = None, details: bool = False,
+                           query_vector: np.ndarray = None):
+    """
+    Async retrieve_chunks: the query embedding is awaited and the FAISS
+    search (and any index load) runs in a worker thread, off the event loop.
+
+    Concurrent calls against the same index and search settings are
+    micro-batched: one embed_content call and one multi-row index.search
+    serve the whole batch. A query_vector from aembed_query skips the
+    embedding.
+    """
+    key = ("search", index_name, data_dir, top_k, nprobe, ef_search, details)
+    return await get_query_batcher().submit(key, (query, query_vector))
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import metrics
+
+DEFAULT_CHAT_MODEL = "gemini-2.0-flash"
+
+# google.generativeai takes most of a second to import, so it is imported on
+# first use rather than by every process that imports this module
+genai = None
+
+
+def _genai():
+    global genai
+    if genai is None:
+        import google.generativeai
+        genai = google.generativeai
+    return genai
+
+
+class GeminiClient:
+    """
+    One Gemini client per process.
+
+    genai.configure and GenerativeModel construction happen once instead of
+    on every request, and all upstream calls (sync or async) go through a
+    concurrency limit so a burst of requests cannot open unbounded
+    connections to the API.
+
+    Args:
+        model_name: Generation model used by generate/agenerate.
+        max_concurrency: Upper bound on simultaneous upstream calls. Defaults
+            to $GEMINI_MAX_CONCURRENCY or 32.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_CHAT_MODEL, max_concurrency: int = None):
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency or int(os.environ.get("GEMINI_MAX_CONCURRENCY", "32"))
+        self._lock = threading.Lock()
+        self._api_key = None
+        self._model = None
+        self._sync_limit = threading.BoundedSemaphore(self.max_concurrency)
+        # asyncio semaphores are bound to the loop they are first used on
+        self._async_limits = weakref.WeakKeyDictionary()
+
+    def configure(self):
+        """Configures genai with $GEMINI_API_KEY; a no-op if already done for that key."""
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not set")
+        if api_key == self._api_key:
+            return
+        with self._lock:
+            if api_key != self._api_key:
+                _genai().configure(api_key=api_key)
+                self._model = None
+                self._api_key = api_key
+
+    @property
+    def model(self):
+        self.configure()
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = _genai().GenerativeModel(self.model_name)
+        return self._model
+
+    def reset(self):
+        """Forgets the configured key and model (used by tests and key rotation)."""
+        with self._lock:
+            self._api_key = None
+            self._model = None
+
+    def limit(self):
+        """Context manager bounding concurrent sync upstream calls."""
+        return self._sync_limit
+
+    def async_limit(self) -> asyncio.Semaphore:
+        """Semaphore bounding concurrent async upstream calls on the running loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_limits.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._async_limits[loop] = semaphore
+        return semaphore
+
+    def generate(self, prompt: str) -> str:
+        model = self.model
+        with self.limit():
+            response = model.generate_content(prompt)
+        _record_usage(response)
+        return response.text
+
+    async def agenerate(self, prompt: str) -> str:
+        model = self.model
+        async with self.async_limit():
+            response = await model.generate_content_async(prompt)
+        _record_usage(response)
+        return response.text
+
+    async def astream(self, prompt: str):
+        """
+        Streams generated text pieces as they arrive. Closing the generator
+        early (e.g. the HTTP client went away) cancels the upstream call so
+        no further tokens are generated or billed.
+        """
+        model = self.model
+        async with self.async_limit():
+            response = await model.generate_content_async(prompt, stream=True)
+            last_chunk = None
+            try:
+                async for chunk in response:
+                    last_chunk = chunk
+                    if chunk.text:
+                        yield chunk.text
+            finally:
+                await _cancel_stream(response)
+                # Usage totals arrive with the final chunk of the stream
+                _record_usage(last_chunk)
+
+
+_generate_calls = metrics.counter("llm_requests_total", "Generation calls sent to Gemini")
+_prompt_tokens = metrics.counter("llm_prompt_tokens_total", "Prompt tokens reported by Gemini")
+_output_tokens = metrics.counter("llm_output_tokens_total", "Generated tokens reported by Gemini")
+
+
+def _record_usage(response):
+    _generate_calls.inc()
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if isinstance(prompt_tokens, int):
+        _prompt_tokens.inc(prompt_tokens)
+    if isinstance(output_tokens, int):
+        _output_tokens.inc(output_tokens)
+
+
+def _stream_call(iterator):
+    """
+    The gRPC call behind a streaming response's iterator. The SDK keeps
+    aiter() of api_core's wrapped stream call, an async generator method of
+    that call, so the call is the generator's `self`.
+    """
+    if callable(getattr(iterator, "cancel", None)):
+        return iterator
+    frame = getattr(iterator, "ag_frame", None)
+    call = frame.f_locals.get("self") if frame is not None else None
+    return call if callable(getattr(call, "cancel", None)) else None
+
+
+async def _cancel_stream(response):
+    # Closing the SDK's iterator alone leaves the gRPC call generating, so
+    # cancel the call too. Both are no-ops once the stream has finished.
+    iterator = getattr(response, "_iterator", None)
+    call = _stream_call(iterator)
+    try:
+        if call is not None:
+            call.cancel()
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+    except Exception as e:
+        print(f"Could not cancel Gemini stream: {e!r}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GeminiClient:
+    """Returns the process-wide GeminiClient."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
@@ -0,0 +1,341 @@
+"""
+Background ingest jobs.
+
+POST /ingest only records a job in a SQLite queue and returns its id; a
+small pool of worker threads runs the jobs, highest priority first. While
+a job runs, its progress (pages, chunks and embeddings done) is written back
+to the queue, so any worker process can report it, and a cancel request is
+noticed between embedding batches. A cancelled job never publishes a
+partial index, because indexes are only ever replaced as a whole snapshot.
+
+Ingest shares the process with /chat, so it is throttled: at most
+INGEST_WORKERS jobs run at once, INGEST_CHUNKS_PER_SEC caps the embedding
+rate, and jobs pause between batches while chat requests are in flight.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+import metrics
+
+DEFAULT_JOBS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ingest_jobs.sqlite")
+
+MODES = ("full", "incremental", "bulk")
+
+_foreground_lock = threading.Lock()
+_foreground = 0
+
+# Ids of the jobs claimed by this process (any queue); see JobQueue._recover
+_claimed = set()
+_claimed_lock = threading.Lock()
+
+
+@contextmanager
+def foreground():
+    """Marks a latency-sensitive request in flight; running jobs yield to it."""
+    global _foreground
+    with _foreground_lock:
+        _foreground += 1
+    try:
+        yield
+    finally:
+        with _foreground_lock:
+            _foreground -= 1
+
+
+def foreground_requests() -> int:
+    return _foreground
+
+
+class IngestCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+class _Interrupted(Exception):
+    """Raised inside a running job when the worker pool stops."""
+
+
+class JobProgress:
+    """
+    Progress of one running job. RAGService ingest methods call advance()
+    from any pipeline stage and check() between embedding batches; check()
+    persists the counts, applies the throttle and raises IngestCancelled
+    once the job has been cancelled.
+    """
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.counts = {"documents": 0, "pages": 0, "chunks": 0, "embeddings": 0}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def advance(self, **counts):
+        with self._lock:
+            for key, n in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def check(self):
+        if self.queue._stop.is_set():
+            raise _Interrupted(self.job_id)
+        counts = self.snapshot()
+        if self.queue._save_progress(self.job_id, counts):
+            raise IngestCancelled(self.job_id)
+        self.queue._throttle(counts["embeddings"], time.perf_counter() - self._started)
+
+
+class JobQueue:
+    """
+    SQLite-backed ingest job queue with a pool of worker threads.
+
+    The queue file can be shared by several server processes: jobs are
+    claimed in an immediate (write-locked) transaction, so each runs exactly
+    once and at most one job per collection runs at a time across all
+    processes (publishing a snapshot replaces the whole index, so two jobs
+    on one collection would drop each other's documents). Status and
+    cancellation go through the file.
+
+    Args:
+        path: SQLite file holding the jobs.
+        workers: Jobs run concurrently by this process.
+        chunks_per_sec: Embedding rate limit per job; 0 for none.
+        yield_ms: Longest pause per batch while chat requests are in flight.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOBS_PATH, workers: int = 1, chunks_per_sec: float = 0,
+                 yield_ms: float = 200):
+        self.path = path
+        self.workers = workers
+        self.chunks_per_sec = chunks_per_sec
+        self.yield_ms = yield_ms
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+        parent = os.path.dirname(path)
+        if parent and not os.path.exists(parent):
+            os.makedirs(parent)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, collection TEXT, mode TEXT, pattern TEXT,"
+                " priority INTEGER, status TEXT, progress TEXT, result TEXT, error TEXT, cancel INTEGER DEFAULT 0,"
+                " pid INTEGER, created_at REAL, started_at REAL, finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, priority, created_at)")
+
+    def _execute(self, sql: str, params=()) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _row(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel"] = bool(job["cancel"])
+        del job["pid"]
+        return job
+
+    def submit(self, mode: str = "full", collection: Optional[str] = None, pattern: str = "*.pdf",
+               priority: int = 0) -> dict:
+        """Queues an ingest job and returns it; higher priorities run first."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown ingest mode: {mode}")
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, collection, mode, pattern, priority, status, created_at)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+            (job_id, collection, mode, pattern, priority, time.time()),
+        )
+        metrics.counter("ingest_jobs_submitted_total", "Ingest jobs queued").inc()
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._row(rows[0]) if rows else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Most recent jobs first, optionally only those with one status."""
+        if status:
+            rows = self._query("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                               (status, limit))
+        else:
+            rows = self._query("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self._row(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Cancels a job. Queued jobs are cancelled at once; running jobs stop
+        at their next embedding batch. Finished jobs are left as they are.
+        """
+        self._execute("UPDATE jobs SET status = 'cancelled', cancel = 1, finished_at = ?"
+                      " WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+        self._execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def _claim(self) -> Optional[dict]:
+        # Jobs of collections with a job running wait their turn; the write lock
+        # keeps other processes from claiming between the SELECT and the UPDATE
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT id FROM jobs AS queued WHERE status = 'queued' AND NOT EXISTS"
+                " (SELECT 1 FROM jobs WHERE status = 'running' AND collection IS queued.collection)"
+                " ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', pid = ?, started_at = ? WHERE id = ?",
+                (os.getpid(), time.time(), row["id"]),
+            )
+            with _claimed_lock:
+                _claimed.add(row["id"])
+        return self.get(row["id"])
+
+    def _save_progress(self, job_id: str, counts: dict) -> bool:
+        """Persists progress; returns True once the job has been cancelled."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(counts), job_id))
+            row = self._conn.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel"])
+
+    def _finish(self, job_id: str, status: str, counts: dict, result=None, error=None):
+        self._execute(
+            "UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(counts), json.dumps(result) if result is not None else None, error, time.time(),
+             job_id),
+        )
+        metrics.counter(f"ingest_jobs_{status}_total", f"Ingest jobs {status}").inc()
+
+    def _throttle(self, embedded: int, elapsed: float):
+        # Stay under the rate limit, then give way to chat requests for a while
+        if self.chunks_per_sec > 0:
+            ahead = embedded / self.chunks_per_sec - elapsed
+            if ahead > 0:
+                self._stop.wait(ahead)
+        deadline = time.perf_counter() + self.yield_ms / 1000
+        while foreground_requests() and time.perf_counter() < deadline and not self._stop.is_set():
+            time.sleep(0.01)
+
+    def run(self, job: dict) -> dict:
+        """Runs one claimed job to completion and records the outcome."""
+        from rag import rag_service
+        progress = JobProgress(self, job["id"])
+        print(f"Ingest job {job['id']} started: {job['mode']} ({job['collection'] or 'default'})")
+        try:
+            with metrics.span("ingest_job", "One background ingest job", request=False):
+                service = rag_service.collection(job["collection"])
+                if job["mode"] == "incremental":
+                    result = service.ingest_incremental(progress=progress)
+                elif job["mode"] == "bulk":
+                    result = service.ingest_bulk(job["pattern"], progress=progress)
+                else:
+                    result = service.ingest_pdf(progress=progress)
+        except IngestCancelled:
+            self._finish(job["id"], "cancelled", progress.snapshot())
+        except _Interrupted:
+            self._execute("UPDATE jobs SET status = 'queued', pid = NULL, progress = NULL WHERE id = ?", (job["id"],))
+            print(f"Ingest job {job['id']} interrupted; re-queued")
+            return self.get(job["id"])
+        except Exception as e:
+            self._finish(job["id"], "failed", progress.snapshot(), error=str(e))
+        else:
+            if "error" in result:
+                self._finish(job["id"], "failed", progress.snapshot(), result=result, error=result["error"])
+            else:
+                self._finish(job["id"], "succeeded", progress.snapshot(), result=result)
+        finally:
+            with _claimed_lock:
+                _claimed.discard(job["id"])
+        job = self.get(job["id"])
+        print(f"Ingest job {job['id']} {job['status']}: {job['progress']}")
+        return job
+
+    def _recover(self):
+        # Jobs left running by a process that no longer exists go back in the queue. A
+        # restarted server in a container often gets the crashed one's pid, so a job
+        # with our own pid is only alive if this process claimed it.
+        for row in self._query("SELECT id, pid FROM jobs WHERE status = 'running'"):
+            if row["pid"] == os.getpid():
+                with _claimed_lock:
+                    stale = row["id"] not in _claimed
+            else:
+                try:
+                    os.kill(row["pid"], 0)
+                    stale = False
+                except ProcessLookupError:
+                    stale = True
+                except (OSError, TypeError):
+                    stale = False
+            if stale:
+                self._execute("UPDATE jobs SET status = 'queued', pid = NULL WHERE id = ? AND status = 'running'",
+                              (row["id"],))
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                # Jobs submitted by other processes are picked up by polling; a job
+                # left running by a dead process would hold up its collection
+                self._recover()
+                self._wake.wait(1)
+                self._wake.clear()
+                continue
+            self.run(job)
+
+    def start(self):
+        """Starts the worker threads (idempotent)."""
+        if self._threads:
+            return
+        self._recover()
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 5):
+        """Stops the workers; running jobs stop at their next batch and go back in the queue."""
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue configured from the environment."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                path=os.environ.get("INGEST_JOBS_PATH", DEFAULT_JOBS_PATH),
+                workers=int(os.environ.get("INGEST_WORKERS", "1")),
+                chunks_per_sec=float(os.environ.get("INGEST_CHUNKS_PER_SEC", "0")),
+                yield_ms=float(os.environ.get("INGEST_YIELD_MS", "200")),
+            )
+        return _queue
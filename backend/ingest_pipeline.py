@@ -0,0 +1,351 @@
+import multiprocessing
+import os
+import queue
+import re
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+_DONE = object()
+
+
+class StageError(Exception):
+    """Raised by the pipeline when a stage fails; `stage` is "read" or "embed"."""
+
+    def __init__(self, stage: str, cause: Exception):
+        super().__init__(f"{stage} stage failed: {cause}")
+        self.stage = stage
+        self.cause = cause
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Yields the extracted text of each page, one page in memory at a time."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    """
+    Splits text with the recursive character splitter. Ingest now chunks
+    with iter_chunk_spans; this is kept as the baseline bench_chunking.py
+    and the chunking tests compare against.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    return text_splitter.split_text(text)
+
+
+class ChunkSpan(NamedTuple):
+    """A chunk as character offsets into the document text, plus the page it starts on (1-based)."""
+    start: int
+    end: int
+    page: int
+
+
+_SEPARATORS = ("\n\n", "\n", " ")
+_NON_SPACE = re.compile(r"\S")
+
+
+def iter_chunk_spans(pages: Iterable[str], chunk_size: int = 1000,
+                     chunk_overlap: int = 200) -> Iterator[Tuple[ChunkSpan, str]]:
+    """
+    Single-pass chunker over a stream of pages, yielding (span, text).
+
+    The document text is the pages joined by newlines; spans are offsets
+    into it. Chunks are at most `chunk_size` characters and end at the last
+    paragraph break, else line break, else space in their second half (a
+    hard cut only when there is none). As with the recursive splitter, the
+    next chunk repeats the trailing pieces at that same level (paragraphs,
+    lines or words) that fit in `chunk_overlap` characters, so neighbours
+    overlap by at most that much.
+
+    Cut points are found with str.rfind/regex searches on one rolling buffer;
+    the only string created per chunk is its own text, and only about two
+    chunks' worth of pages are held at a time. Runs in linear time.
+
+    Args:
+        pages: Iterable of page texts.
+        chunk_size: Maximum chunk length in characters.
+        chunk_overlap: Maximum overlap between consecutive chunks.
+    """
+    if not 0 <= chunk_overlap < chunk_size // 2:
+        raise ValueError("chunk_overlap must be smaller than half of chunk_size")
+    pages = iter(pages)
+    buffer = ""          # document text from offset `base` on
+    base = 0
+    length = 0           # document length read so far
+    page_starts = deque()  # (offset, page number) of pages not yet passed
+    page = 0
+    exhausted = False
+    pos = 0
+
+    def fill(upto):
+        # Read pages until the document reaches `upto` characters (or ends)
+        nonlocal buffer, length, page, exhausted
+        while not exhausted and length < upto:
+            text = next(pages, None)
+            if text is None:
+                exhausted = True
+                return
+            if page:
+                buffer += "\n"
+                length += 1
+            page += 1
+            page_starts.append((length, page))
+            buffer += text
+            length += len(text)
+
+    while True:
+        # Chunks never start on whitespace
+        fill(pos + chunk_size + 1)
+        match = _NON_SPACE.search(buffer, pos - base)
+        if match is None:
+            if exhausted:
+                return
+            pos = length
+            continue
+        pos = base + match.start()
+        fill(pos + chunk_size + 1)
+
+        limit = pos + chunk_size
+        cut_at = None  # separator the chunk was cut at; None for a hard cut
+        if length <= limit:
+            end = length
+        else:
+            end = limit
+            lo = pos - base + chunk_size // 2
+            for sep in _SEPARATORS:
+                cut = buffer.rfind(sep, lo, limit - base + len(sep))
+                if cut != -1:
+                    end = base + cut
+                    cut_at = sep
+                    break
+        while buffer[end - base - 1].isspace():
+            end -= 1
+
+        while len(page_starts) > 1 and page_starts[1][0] <= pos:
+            page_starts.popleft()
+        yield ChunkSpan(pos, end, page_starts[0][1]), buffer[pos - base:end - base]
+
+        # Done once only whitespace follows this chunk
+        while _NON_SPACE.search(buffer, end - base) is None:
+            if exhausted:
+                return
+            fill(length + 1)
+        # Like the recursive splitter, overlap with the trailing pieces (at the
+        # level the chunk was cut at) that fit in the overlap window
+        lo = max(end - chunk_overlap, pos + 1)
+        if cut_at is None:
+            pos = lo
+        else:
+            cut = buffer.find(cut_at, lo - base, end - base)
+            pos = base + cut + len(cut_at) if cut != -1 else end
+
+        # Drop text no future chunk can reach
+        if pos - base > 4 * chunk_size:
+            buffer = buffer[pos - base:]
+            base = pos
+
+
+def provenance(span: ChunkSpan) -> dict:
+    """Chunk-store metadata locating a chunk in its document."""
+    return {"page": span.page, "start": span.start, "end": span.end}
+
+
+def iter_chunks(pages: Iterable[str], split: Callable[[str], List[str]], chunk_size: int = 1000) -> Iterator[str]:
+    """
+    Chunks a stream of pages without ever holding the whole document. No
+    longer used by ingest (see iter_chunk_spans); kept as a benchmark baseline.
+
+    Text is buffered until it spans a few chunks, then split; every chunk but
+    the last is emitted and the last one stays in the buffer, so chunks (and
+    their overlap) continue seamlessly across page boundaries.
+
+    Args:
+        pages: Iterable of page texts.
+        split: Function splitting a string into overlapping chunks.
+        chunk_size: Target chunk size, used to decide when to flush the buffer.
+    """
+    buffer = ""
+    for page in pages:
+        buffer += page
+        if len(buffer) < 4 * chunk_size:
+            continue
+        chunks = split(buffer)
+        if len(chunks) < 2:
+            continue
+        yield from chunks[:-1]
+        # Keep the raw tail (not the stripped chunk) so whitespace before the
+        # next page is preserved.
+        buffer = buffer[buffer.rfind(chunks[-1]):]
+    if buffer:
+        yield from split(buffer)
+
+
+def _batched(items: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_embedded_batches(chunks: Iterable[str], embed: Callable[[List[str]], np.ndarray],
+                          batch_size: int = 100, embed_workers: int = 2,
+                          queue_size: int = 4) -> Iterator[Tuple[List[str], np.ndarray]]:
+    """
+    Runs extraction/chunking and embedding as concurrent stages connected by
+    bounded queues, yielding (chunks, vectors) batches in document order.
+
+    A producer thread drains `chunks` (and with it the page extractor) into
+    batches; `embed_workers` threads embed them. At most `queue_size` batches
+    wait between stages, so memory stays flat however long the document is.
+    Any stage error is re-raised in the consuming thread as a StageError.
+    """
+    todo = queue.Queue(maxsize=queue_size)
+    done = queue.Queue(maxsize=queue_size + embed_workers)
+    stop = threading.Event()
+
+    def put(q, item):
+        # Bounded put that gives up once the pipeline is shutting down
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for seq, batch in enumerate(_batched(chunks, batch_size)):
+                if not put(todo, (seq, batch)):
+                    return
+        except Exception as e:
+            put(done, (None, StageError("read", e)))
+        finally:
+            for _ in range(embed_workers):
+                put(todo, _DONE)
+
+    def embed_worker():
+        while not stop.is_set():
+            try:
+                item = todo.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                put(done, _DONE)
+                return
+            seq, batch = item
+            try:
+                put(done, (seq, (batch, embed(batch))))
+            except Exception as e:
+                put(done, (None, StageError("embed", e)))
+                return
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=embed_worker, daemon=True) for _ in range(embed_workers)]
+    for t in threads:
+        t.start()
+
+    try:
+        # Workers may finish out of order; hold early batches until their turn
+        pending = {}
+        next_seq = 0
+        finished = 0
+        while finished < embed_workers:
+            item = done.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            seq, payload = item
+            if seq is None:
+                raise payload
+            pending[seq] = payload
+            while next_seq in pending:
+                yield pending.pop(next_seq)
+                next_seq += 1
+        while next_seq in pending:
+            yield pending.pop(next_seq)
+            next_seq += 1
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=1)
+
+
+def extract_and_chunk(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200):
+    """
+    Process-pool worker: extracts and chunks one PDF.
+
+    Returns:
+        tuple: (page_count, chunks, metadata) with each chunk's provenance.
+    """
+    page_count = 0
+
+    def pages():
+        nonlocal page_count
+        for page in iter_pdf_pages(file_path):
+            page_count += 1
+            yield page
+
+    chunks = []
+    metadata = []
+    for span, chunk in iter_chunk_spans(pages(), chunk_size, chunk_overlap):
+        chunks.append(chunk)
+        metadata.append(provenance(span))
+    return page_count, chunks, metadata
+
+
+def iter_extracted_documents(paths: List[str], workers: int = None, chunk_size: int = 1000,
+                             chunk_overlap: int = 200) -> Iterator[Tuple[str, int, List[str], List[dict], Exception]]:
+    """
+    Extracts and chunks many PDFs in a process pool (pypdf is CPU-bound and
+    holds the GIL), yielding (path, page_count, chunks, metadata, error) as documents
+    finish. Only about two documents per worker are in flight at a time, so
+    results never pile up faster than the consumer can embed them.
+
+    Workers are spawned rather than forked: the server process runs other
+    threads (ingest jobs, query batching) whose locks a fork could copy
+    while held. If the consumer stops early (e.g. a cancelled job), queued
+    extractions are dropped and running ones are not waited for.
+    """
+    workers = workers or os.cpu_count() or 1
+    pending_paths = iter(paths)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        in_flight = {}
+
+        def submit_next():
+            path = next(pending_paths, None)
+            if path is not None:
+                in_flight[pool.submit(extract_and_chunk, path, chunk_size, chunk_overlap)] = path
+
+        for _ in range(2 * workers):
+            submit_next()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = in_flight.pop(future)
+                submit_next()
+                try:
+                    page_count, chunks, metadata = future.result()
+                    yield path, page_count, chunks, metadata, None
+                except Exception as e:
+                    yield path, 0, [], [], e
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,14 @@
-from fastapi import FastAPI
+from contextlib import aclosing, asynccontextmanager
+import time
+
+# Import time counts towards startup; see /ready
+_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import json
 import os
 
 # Optional dotenv loading (rag.py also loads it)
@@ -9,7 +18,96 @@ try:
 except ImportError:
     pass
 
-app = FastAPI(title="RAG 2.0 Backend")
+# Set once the startup warmup has finished; /ready reports it
+startup_state = {"ready": False, "startup_ms": None, "warmup": None, "error": None}
+
+
+async def warm_up():
+    """
+    Preloads the Gemini client, the embedding provider and the default
+    index and runs one search, so the first request does not pay for it.
+    $WARMUP=0 skips it.
+
+    A failed warmup is retried $WARMUP_ATTEMPTS times in all, waiting
+    $WARMUP_BACKOFF_S seconds and doubling after each failure. Missing index
+    files leave nothing to warm, and a warmup that keeps failing only means a
+    cold first request: either way the server still becomes ready, with the
+    last error in /ready.
+    """
+    if os.environ.get("WARMUP", "1") != "0":
+        from rag import rag_service
+        attempts = max(1, int(os.environ.get("WARMUP_ATTEMPTS", "5")))
+        delay = float(os.environ.get("WARMUP_BACKOFF_S", "1"))
+        for attempt in range(1, attempts + 1):
+            try:
+                startup_state["warmup"] = await asyncio.to_thread(rag_service.warmup)
+                startup_state["error"] = None
+                break
+            except FileNotFoundError as e:
+                print(f"Warmup: index files missing; nothing to warm: {e}")
+                startup_state["error"] = str(e)
+                break
+            except Exception as e:
+                print(f"Warmup attempt {attempt}/{attempts} failed: {e!r}")
+                startup_state["error"] = str(e)
+                if attempt < attempts:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+    startup_state["startup_ms"] = round((time.perf_counter() - _STARTED) * 1000, 1)
+    startup_state["ready"] = True
+    print(f"Ready after {startup_state['startup_ms']} ms")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background; the server answers /ready with 503 until done
+    startup_state.update(ready=False, startup_ms=None, warmup=None, error=None)
+    warmup = asyncio.create_task(warm_up())
+    # Ingest jobs run in background threads; INGEST_WORKERS=0 makes a query-only worker
+    from ingest_jobs import get_job_queue
+    jobs = get_job_queue()
+    if jobs.workers:
+        jobs.start()
+    yield
+    warmup.cancel()
+    jobs.stop()
+
+app = FastAPI(title="RAG 2.0 Backend", lifespan=lifespan)
+
+# Per-stage timings in a Server-Timing response header (visible in browser dev tools)
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING", "0") == "1"
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header listing the metrics spans each request went
+    through. Streaming responses only carry the spans finished before the
+    first byte. Plain ASGI so it adds nothing when disabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SERVER_TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        import metrics
+        started = time.perf_counter()
+        with metrics.request_timings() as timings:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    entries = timings + [("total", (time.perf_counter() - started) * 1000)]
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", metrics.server_timing_header(entries).encode("latin-1")))
+                    message = dict(message, headers=headers)
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+
+app.add_middleware(ServerTimingMiddleware)
 
 # CORS setup
 origins = [
@@ -30,23 +128,159 @@ app.add_middleware(
 def read_root():
     return {"message": "RAG 2.0 Backend API"}
 
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 class ChatRequest(BaseModel):
     message: str
+    # Per-request overrides of $RETRIEVAL_TOP_K and $CONTEXT_TOKEN_BUDGET
+    top_k: Optional[int] = Field(None, ge=1, le=100)
+    context_tokens: Optional[int] = Field(None, ge=1)
+    # Named document set to answer from; defaults to the "default" collection
+    collection: Optional[str] = None
+
+class SearchRequest(BaseModel):
+    # One query, or a batch searched together
+    query: Optional[str] = None
+    queries: Optional[List[str]] = None
+    top_k: Optional[int] = Field(None, ge=1, le=1000)
+    offset: int = Field(0, ge=0)
+    max_distance: Optional[float] = None
+    include_text: bool = True
+    collection: Optional[str] = None
 
 @app.post("/ingest")
-def ingest_data():
+async def ingest_data(mode: str = "full", pattern: str = "*.pdf", collection: Optional[str] = None,
+                      priority: int = 0):
+    """
+    Queues an ingest job and returns it at once; poll /ingest/jobs/{id} for
+    progress and the result.
+    """
+    from rag import rag_service
+    from ingest_jobs import get_job_queue
+    try:
+        rag_service.collection(collection)
+        return await asyncio.to_thread(get_job_queue().submit, mode, collection, pattern, priority)
+    except ValueError as e:
+        return {"error": str(e)}
+
+@app.get("/ingest/jobs")
+async def ingest_jobs(status: Optional[str] = None, limit: int = 50):
+    from ingest_jobs import get_job_queue
+    return {"jobs": await asyncio.to_thread(get_job_queue().list, status, limit)}
+
+@app.get("/ingest/jobs/{job_id}")
+async def ingest_job(job_id: str):
+    from ingest_jobs import get_job_queue
+    job = await asyncio.to_thread(get_job_queue().get, job_id)
+    return job if job else {"error": f"Unknown job: {job_id}"}
+
+@app.post("/ingest/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str):
+    from ingest_jobs import get_job_queue
+    job = await asyncio.to_thread(get_job_queue().cancel, job_id)
+    return job if job else {"error": f"Unknown job: {job_id}"}
+
+@app.get("/collections")
+async def collections():
+    from rag import rag_service
+    return {"collections": await asyncio.to_thread(rag_service.list_collections)}
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """
+    Retrieval without generation: the top-k chunks with ids, distances and
+    metadata for one query or a batch of queries.
+    """
     from rag import rag_service
-    return rag_service.ingest_pdf()
+    from ingest_jobs import foreground
+    if (request.query is None) == (request.queries is None):
+        return {"error": "Pass either query or queries"}
+    try:
+        service = rag_service.collection(request.collection)
+    except ValueError as e:
+        return {"error": str(e)}
+    queries = request.queries if request.queries is not None else request.query
+    with foreground():
+        return await asyncio.to_thread(service.search, queries, request.top_k, request.offset, request.max_distance,
+                                       request.include_text)
 
 @app.post("/chat")
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
     from rag import rag_service
-    response = rag_service.answer_question(request.message)
+    from ingest_jobs import foreground
+    try:
+        service = rag_service.collection(request.collection)
+    except ValueError as e:
+        return {"response": str(e)}
+    with foreground():
+        response = await service.aanswer_question(request.message, request.top_k, request.context_tokens)
     return {"response": response}
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Server-Sent Events variant of /chat: a `sources` event with the retrieved
+    chunks, then `token` events as the answer is generated, then `done`.
+    """
+    from rag import rag_service
+    from ingest_jobs import foreground
+    try:
+        service = rag_service.collection(request.collection)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    async def events():
+        with foreground():
+            async with aclosing(service.astream_answer(request.message, request.top_k,
+                                                       request.context_tokens)) as stream:
+                async for event, data in stream:
+                    # Stop (and cancel upstream generation) once the client is gone
+                    if await http_request.is_disconnected():
+                        break
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the startup warmup has finished, 503 before."""
+    return JSONResponse(startup_state, status_code=200 if startup_state["ready"] else 503)
+
+@app.get("/stats")
+def stats():
+    from faiss_utils import index_registry
+    from embedding_cache import get_default_cache
+    from answer_cache import get_answer_cache
+    import metrics
+    return {
+        "index_cache": index_registry.stats(),
+        "embedding_cache": get_default_cache().stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "memory": metrics.process_memory(),
+        "metrics": metrics.snapshot(),
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Counters and latency histograms in the Prometheus text format."""
+    import metrics
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    # Reload needs string import, works better with app instance directly in code if running simple
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    parser = argparse.ArgumentParser(description="Run the RAG 2.0 backend")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--index-mode", choices=["memory", "mmap"], default=os.environ.get("INDEX_LOAD_MODE", "memory"),
+                        help="mmap shares one page-cache copy of the index across workers")
+    args = parser.parse_args()
+    # Workers are separate processes; they read the mode from the environment
+    os.environ["INDEX_LOAD_MODE"] = args.index_mode
+    if args.workers > 1:
+        # Multiple workers need an import string rather than the app instance
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=args.workers)
+    else:
+        # Reload needs string import, works better with app instance directly in code if running simple
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,230 @@
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in milliseconds
+DEFAULT_MS_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Counter:
+    """Monotonic counter."""
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (cumulative bucket counts plus sum/count), cheap
+    enough to observe on every request. Percentiles are estimated from the
+    bucket bounds.
+    """
+
+    def __init__(self, name: str, help: str = "", buckets=DEFAULT_MS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative_counts(self):
+        """[(upper_bound, cumulative_count), ...] ending with (+inf, count)."""
+        with self._lock:
+            counts = list(self._counts)
+        total = 0
+        result = []
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def percentile(self, q: float):
+        """Upper bound of the bucket holding the q-th quantile (0 < q <= 1)."""
+        cumulative = self.cumulative_counts()
+        total = cumulative[-1][1]
+        if not total:
+            return None
+        target = q * total
+        for bound, n in cumulative:
+            if n >= target:
+                return bound
+        return cumulative[-1][0]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": (self.sum / self.count) if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name, *args, **kwargs):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                _registry[name] = metric
+    return metric
+
+
+def counter(name: str, help: str = "") -> Counter:
+    """Returns the process-wide counter with this name, creating it if needed."""
+    return _get_or_create(Counter, name, help)
+
+
+def histogram(name: str, help: str = "", buckets=DEFAULT_MS_BUCKETS) -> Histogram:
+    """Returns the process-wide histogram with this name, creating it if needed."""
+    return _get_or_create(Histogram, name, help, buckets)
+
+
+def snapshot() -> dict:
+    """Current value of every registered metric, for JSON endpoints."""
+    return {name: metric.snapshot() for name, metric in sorted(_registry.items())}
+
+
+# Spans finished while serving the current request, when Server-Timing is on
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(name: str, help: str = "", request: bool = True):
+    """
+    Times a block into the `{name}_ms` histogram. With request=True the span
+    is also listed in the current request's Server-Timing header (if one is
+    being collected); shared work such as a micro-batch passes False so it is
+    not attributed to whichever request happened to start it.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        histogram(f"{name}_ms", help).observe(elapsed_ms)
+        if request:
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.append((name, elapsed_ms))
+
+
+@contextmanager
+def request_timings():
+    """Collects the spans finished inside the block (threads started from it included)."""
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing_header(timings) -> str:
+    """Formats [(name, ms), ...] as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings)
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    """Every registered metric, plus process memory, in the Prometheus text format."""
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        if metric.help:
+            lines.append(f"# HELP {name} {metric.help}")
+        if isinstance(metric, Counter):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {_format_value(metric.value)}")
+        else:
+            lines.append(f"# TYPE {name} histogram")
+            for bound, count in metric.cumulative_counts():
+                lines.append(f'{name}_bucket{{le="{_format_value(bound)}"}} {count}')
+            lines.append(f"{name}_sum {_format_value(metric.sum)}")
+            lines.append(f"{name}_count {metric.count}")
+
+    memory = process_memory()
+    for key, metric_name in (("rss_mb", "process_resident_memory_bytes"),
+                             ("pss_mb", "process_proportional_memory_bytes"),
+                             ("peak_rss_mb", "process_peak_resident_memory_bytes")):
+        if memory.get(key) is not None:
+            lines.append(f"# TYPE {metric_name} gauge")
+            lines.append(f"{metric_name} {int(memory[key] * 1024 * 1024)}")
+    return "\n".join(lines) + "\n"
+
+
+def peak_rss_mb(children: bool = False):
+    """
+    Peak resident memory in MB of this process (or, with children=True, of
+    its largest finished child, e.g. an ingest worker). None if unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in KB on Linux but bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def process_memory() -> dict:
+    """
+    Memory of this process in MB, split into what it shares with other
+    processes (e.g. memory-mapped index files in the page cache) and what it
+    holds privately. `pss` charges shared pages proportionally and is the
+    fair per-worker number. Linux only; elsewhere just peak RSS is reported.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        peak = peak_rss_mb()
+        return {"pid": os.getpid()} if peak is None else {"pid": os.getpid(), "peak_rss_mb": peak}
+
+    return {
+        "pid": os.getpid(),
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1),
+        "shared_mb": round(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0), 1),
+        "private_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
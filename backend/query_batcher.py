@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable, List
+
+import metrics
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_MS_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100)
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent requests into batches.
+
+    Callers `await submit(key, item)`; items with the same key are collected
+    for up to `window_ms` (or until `max_batch` are waiting) and handed to
+    `process(key, items)` in one call, which must return one result per item.
+    Each caller gets its own result back, or the batch's exception.
+
+    Lives on a single event loop; create one per loop.
+
+    Args:
+        process: Async function (key, items) -> list of results.
+        window_ms: How long the first request of a batch waits for company.
+        max_batch: Flush immediately once this many requests are waiting.
+        name: Prefix for the batch size / queue wait histograms.
+    """
+
+    def __init__(self, process: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+                 window_ms: float = 2.0, max_batch: int = 32, name: str = "query_batch"):
+        self.process = process
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+        self._batch_sizes = metrics.histogram(f"{name}_size", "Requests per batch", BATCH_SIZE_BUCKETS)
+        self._queue_wait = metrics.histogram(f"{name}_queue_wait_ms", "Time a request waited for its batch",
+                                             QUEUE_WAIT_MS_BUCKETS)
+
+    async def submit(self, key: Hashable, item: Any):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future, time.perf_counter()))
+
+        if len(pending) >= self.max_batch:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.window_ms / 1000, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(key, None)
+        if not pending:
+            return
+        task = asyncio.ensure_future(self._run(key, pending))
+        # Hold a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, pending):
+        now = time.perf_counter()
+        self._batch_sizes.observe(len(pending))
+        for _, _, enqueued in pending:
+            self._queue_wait.observe((now - enqueued) * 1000)
+
+        try:
+            results = await self.process(key, [item for item, _, _ in pending])
+            if len(results) != len(pending):
+                raise RuntimeError(f"Batch returned {len(results)} results for {len(pending)} requests")
+        except asyncio.CancelledError:
+            for _, future, _ in pending:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future, _ in pending:
+                # Callers that were cancelled (e.g. disconnected) are skipped
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
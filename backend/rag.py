@@ -1,12 +1,26 @@
 import os
+import copy
+import glob
+import hashlib
+import re
+import time
 try:
     from dotenv import load_dotenv; load_dotenv()
 except ImportError:
     pass
-from pypdf import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from embedding_utils import embed_texts
-from faiss_utils import build_index, retrieve_chunks
+import numpy as np
+from embedding_providers import get_embedding_provider
+from faiss_utils import (aembed_query, aretrieve_chunks, build_index, index_registry, index_version, retrieve_chunks,
+                         load_document_registry, search_queries, update_index)
+from answer_cache import get_answer_cache
+from context_builder import build_context
+from gemini_client import get_client
+import metrics
+
+DEFAULT_COLLECTION = "default"
+# Named collections live below data_dir; their PDFs never belong to the parent
+_COLLECTIONS_DIR = "collections"
+_COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
 
 class RAGService:
     def __init__(self):
@@ -14,93 +28,606 @@ class RAGService:
         base_dir = os.path.dirname(os.path.abspath(__file__))
         self.data_dir = os.path.join(base_dir, "data")
         self.index_name = "faiss_index"
+        # Index type for full rebuilds; "auto" stays exact (flat) for small corpora
+        self.index_spec = os.environ.get("FAISS_INDEX_SPEC", "auto")
+        budget = os.environ.get("FAISS_MEMORY_BUDGET_MB")
+        self.memory_budget_mb = float(budget) if budget else None
+        # Chunks retrieved per question and the prompt context budget; both can be overridden per request
+        self.top_k = int(os.environ.get("RETRIEVAL_TOP_K", "3"))
+        self.context_tokens = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2000"))
         
+    def collection(self, name=None):
+        """
+        Returns the service for a named collection (a separate document set
+        and index, e.g. one per customer). The default collection is this
+        service; others keep their PDFs and index under
+        data_dir/collections/<name>/.
+
+        Raises:
+            ValueError: if the name is not 1-64 letters, digits, "-" or "_".
+        """
+        if name is None or name == DEFAULT_COLLECTION:
+            return self
+        if not _COLLECTION_NAME.match(name):
+            raise ValueError(f"Invalid collection name {name!r}: use 1-64 letters, digits, '-' or '_'")
+        service = copy.copy(self)
+        service.data_dir = os.path.join(self.data_dir, _COLLECTIONS_DIR, name)
+        return service
+
+    def list_collections(self):
+        """
+        Lists the default collection and every directory under
+        data_dir/collections. A missing data_dir (nothing uploaded yet) lists
+        only the empty default collection.
+        """
+        root = os.path.join(self.data_dir, _COLLECTIONS_DIR)
+        names = sorted(n for n in os.listdir(root) if os.path.isdir(os.path.join(root, n))) \
+            if os.path.isdir(root) else []
+        collections = []
+        for name in [DEFAULT_COLLECTION] + [n for n in names if _COLLECTION_NAME.match(n)]:
+            service = self.collection(name)
+            documents = load_document_registry(service.index_name, service.data_dir)["documents"]
+            collections.append({
+                "name": name,
+                "indexed": index_version(service.index_name, service.data_dir) is not None,
+                "pdfs": len(service.list_pdfs()) if os.path.isdir(service.data_dir) else 0,
+                "documents": len(documents),
+            })
+        return collections
+
+    def _owns(self, path):
+        """True if `path` is inside data_dir but not in a named collection's directory."""
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.data_dir))
+        return not (rel == os.pardir or rel.startswith(os.pardir + os.sep) or rel.startswith(_COLLECTIONS_DIR + os.sep))
+
+    def list_pdfs(self):
+        """
+        Every PDF of this collection, recursively, as paths relative to
+        data_dir: the names documents are registered under by all ingest modes.
+        """
+        names = []
+        for root, dirs, files in os.walk(self.data_dir):
+            if os.path.samefile(root, self.data_dir) and _COLLECTIONS_DIR in dirs:
+                dirs.remove(_COLLECTIONS_DIR)
+            dirs.sort()
+            names.extend(os.path.relpath(os.path.join(root, f), self.data_dir)
+                         for f in files if f.lower().endswith(".pdf"))
+        return sorted(names)
+
     def chunk_text(self, text):
         """
         Chunks text.
         Size: 1000 chars (approx) since we are moving away from tiktoken strictness
         Overlap: 200 chars
         """
-        # Simple character splitter is safer if we drop tiktoken, 
-        # but tiktoken is installed and good. Let's keep using it or switch to standard.
-        # User said "Use Gemini", implies removing OpenAI deps.
-        # Let's use standard recursive splitter to be vendor neutral.
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""] 
-        )
-        return text_splitter.split_text(text)
-
-    def ingest_pdf(self, filename="Insurance_FAQ.pdf"):
+        return [chunk for _, chunk in self.iter_chunk_spans([text])]
+
+    def iter_chunk_spans(self, pages):
+        """Yields (span, chunk) for a stream of pages; see ingest_pipeline.iter_chunk_spans."""
+        # Ingest-only modules are imported on first use, so query-only workers never load them
+        from ingest_pipeline import iter_chunk_spans
+        return iter_chunk_spans(pages, chunk_size=1000, chunk_overlap=200)
+
+    def iter_pages(self, file_path):
+        """Yields page texts of a PDF one at a time."""
+        from ingest_pipeline import iter_pdf_pages
+        return iter_pdf_pages(file_path)
+
+    def embed_document(self, file_path, progress=None):
+        """
+        Streams a PDF through extract -> chunk -> embed and returns
+        (chunks, vectors, metadata), where metadata holds each chunk's page
+        and character offsets. Raises StageError naming the failing stage.
+
+        `progress` (an ingest_jobs.JobProgress) is advanced as pages are read
+        and batches embedded, and checked for cancellation between batches.
+        """
+        from ingest_pipeline import iter_embedded_batches, provenance
+        chunks = []
+        metadata = []
+        vector_batches = []
+        pages = _timed_pages(self.iter_pages(file_path), progress)
+        items = ((chunk, provenance(span)) for span, chunk in self.iter_chunk_spans(pages))
+
+        # The stages run interleaved in pipeline threads; each step is timed on its own
+        def embed(batch):
+            with metrics.span("ingest_embed_batch", "Embedding one batch of chunks", request=False):
+                return get_embedding_provider().embed_documents([chunk for chunk, _ in batch])
+
+        for batch, batch_vectors in iter_embedded_batches(items, embed):
+            for chunk, meta in batch:
+                chunks.append(chunk)
+                metadata.append(meta)
+            vector_batches.append(batch_vectors)
+            if progress is not None:
+                progress.advance(chunks=len(batch), embeddings=len(batch))
+                progress.check()
+        vectors = np.concatenate(vector_batches) if vector_batches else None
+        return chunks, vectors, metadata
+
+    @staticmethod
+    def file_hash(file_path):
+        """SHA-256 of the file contents, used to detect changed documents."""
+        h = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def ingest_pdf(self, filename="Insurance_FAQ.pdf", progress=None):
+        from ingest_pipeline import StageError
         file_path = os.path.join(self.data_dir, filename)
         if not os.path.exists(file_path):
             return {"error": f"File not found at {file_path}"}
             
-        # 1. Read PDF
+        # 1-3. Read, chunk and embed as one streaming pipeline
         try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        except Exception as e:
-            return {"error": f"Failed to read PDF: {str(e)}"}
-            
-        # 2. Chunking
-        chunks = self.chunk_text(text)
+            with metrics.span("ingest_pipeline", "Extract, chunk and embed one document"):
+                chunks, vectors, metadata = self.embed_document(file_path, progress)
+        except StageError as e:
+            if e.stage == "read":
+                return {"error": f"Failed to read PDF: {str(e.cause)}"}
+            return {"error": f"Embedding failed: {str(e.cause)}"}
+
         if not chunks:
              return {"message": "No text extracted from PDF"}
 
-        # 3. Embedding
-        try:
-            vectors = embed_texts(chunks)
-        except Exception as e:
-            return {"error": f"Embedding failed: {str(e)}"}
-
         # 4. Indexing
         try:
-            build_index(chunks, vectors, index_name=self.index_name, data_dir=self.data_dir)
+            with metrics.span("ingest_index", "Index build and write"):
+                build_index(chunks, vectors, index_name=self.index_name, data_dir=self.data_dir,
+                            index_spec=self.index_spec, memory_budget_mb=self.memory_budget_mb,
+                            metadata=[dict(meta, source=filename) for meta in metadata])
         except Exception as e:
             return {"error": f"Indexing failed: {str(e)}"}
             
         return {"status": "success", "chunks_created": len(chunks)}
 
-    def answer_question(self, question):
-        # 1. Retrieve
+    def ingest_bulk(self, pattern="*.pdf", workers=None, progress=None):
+        """
+        Ingests every PDF matching a glob under data_dir (e.g. "*.pdf" or
+        "claims/**/*.pdf"). Extraction and chunking run in a process pool and
+        feed one shared embedding stage; the matched documents are then
+        upserted into the incremental index in a single write.
+
+        Args:
+            pattern: Glob relative to data_dir, or a directory under it.
+            workers: Extraction processes; defaults to one per CPU core.
+            progress: Optional ingest_jobs.JobProgress to report to.
+
+        Returns:
+            dict: per-document results plus pages/sec and chunks/sec.
+        """
+        from ingest_pipeline import StageError, iter_embedded_batches, iter_extracted_documents
+        root = os.path.join(self.data_dir, pattern)
+        if os.path.isdir(root):
+            root = os.path.join(root, "*.pdf")
+        # Never follow a pattern like "../*" out of data_dir or into another collection
+        paths = sorted(p for p in glob.glob(root, recursive=True) if p.lower().endswith(".pdf") and self._owns(p))
+        if not paths:
+            return {"error": f"No PDFs match {pattern} under {self.data_dir}"}
+
+        started = time.perf_counter()
+        documents = {}
+        per_doc_chunks = {}
+        per_doc_metadata = {}
+        per_doc_vectors = {}
+
+        def tagged_chunks():
+            # Runs in the pipeline's producer thread, draining the process pool
+            for path, page_count, chunks, metadata, error in iter_extracted_documents(paths, workers):
+                name = os.path.relpath(path, self.data_dir)
+                if error is not None:
+                    documents[name] = {"status": "error", "error": str(error)}
+                    continue
+                documents[name] = {"status": "success", "pages": page_count, "chunks": len(chunks),
+                                   "hash": self.file_hash(path)}
+                per_doc_chunks[name] = []
+                per_doc_metadata[name] = metadata
+                per_doc_vectors[name] = []
+                if progress is not None:
+                    progress.advance(documents=1, pages=page_count)
+                for chunk in chunks:
+                    yield name, chunk
+
         try:
-            # Need to embed query with task_type="retrieval_query" ideally, 
-            # but our util uses "retrieval_document". 
-            # For simplicity in this util, we reused the function.
-            # In a prod system, we'd add a parameter to embed_texts.
-            chunks = retrieve_chunks(question, index_name=self.index_name, data_dir=self.data_dir)
+            for batch, vectors in iter_embedded_batches(
+                    tagged_chunks(), lambda batch: get_embedding_provider().embed_documents([chunk for _, chunk in batch])):
+                for (name, chunk), vector in zip(batch, vectors):
+                    per_doc_chunks[name].append(chunk)
+                    per_doc_vectors[name].append(vector)
+                if progress is not None:
+                    progress.advance(chunks=len(batch), embeddings=len(batch))
+                    progress.check()
+        except StageError as e:
+            if e.stage == "read":
+                return {"error": f"Failed to read PDFs: {str(e.cause)}"}
+            return {"error": f"Embedding failed: {str(e.cause)}"}
+
+        upserts = {
+            name: {"hash": documents[name].pop("hash"), "chunks": per_doc_chunks[name],
+                   "metadata": per_doc_metadata[name], "embeddings": np.array(per_doc_vectors[name], dtype=np.float32)}
+            for name in per_doc_chunks
+        }
+        try:
+            update_index(upserts, [], index_name=self.index_name, data_dir=self.data_dir)
         except Exception as e:
-            return "System is not ready. Please ingest a PDF first."
+            return {"error": f"Indexing failed: {str(e)}"}
 
-        if not chunks:
-            return "I couldn't find any relevant information in the documents."
-            
+        elapsed = time.perf_counter() - started
+        total_pages = sum(d.get("pages", 0) for d in documents.values())
+        total_chunks = sum(d.get("chunks", 0) for d in documents.values())
+        return {
+            "status": "success",
+            "documents": documents,
+            "pages": total_pages,
+            "chunks_created": total_chunks,
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(total_pages / elapsed, 1) if elapsed else 0.0,
+            "chunks_per_sec": round(total_chunks / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def ingest_incremental(self, filenames=None, progress=None):
+        """
+        Syncs the index with the PDFs under data_dir: new documents are appended,
+        changed ones (by content hash) are replaced and documents that no
+        longer exist are removed. Unchanged files are never re-read.
+
+        Args:
+            filenames: PDFs to consider (relative to data_dir). Defaults to
+                every PDF under data_dir (see list_pdfs); with an explicit list, documents not
+                in it are left untouched rather than removed.
+            progress: Optional ingest_jobs.JobProgress to report to.
+        """
+        from ingest_pipeline import StageError
+        if filenames is None:
+            if not os.path.isdir(self.data_dir):
+                return {"error": f"Directory not found: {self.data_dir}"}
+            filenames = self.list_pdfs()
+            sync_removals = True
+        else:
+            sync_removals = False
+
+        documents = load_document_registry(self.index_name, self.data_dir)["documents"]
+
+        added, updated, unchanged = [], [], []
+        upserts = {}
+        for filename in filenames:
+            file_path = os.path.join(self.data_dir, filename)
+            if not os.path.exists(file_path):
+                return {"error": f"File not found at {file_path}"}
+
+            digest = self.file_hash(file_path)
+            known = documents.get(filename)
+            if known and known["hash"] == digest:
+                unchanged.append(filename)
+                continue
+
+            try:
+                chunks, vectors, metadata = self.embed_document(file_path, progress)
+            except StageError as e:
+                if e.stage == "read":
+                    return {"error": f"Failed to read PDF {filename}: {str(e.cause)}"}
+                return {"error": f"Embedding failed for {filename}: {str(e.cause)}"}
+            if progress is not None:
+                progress.advance(documents=1)
+
+            upserts[filename] = {"hash": digest, "chunks": chunks, "embeddings": vectors, "metadata": metadata}
+            (updated if known else added).append(filename)
+
+        removed = []
+        if sync_removals:
+            present = set(filenames)
+            removed = [name for name in documents if name not in present]
+
+        if not upserts and not removed:
+            return {"status": "success", "added": [], "updated": [], "removed": [],
+                    "unchanged": unchanged, "chunks_created": 0}
+
+        try:
+            counts = update_index(upserts, removed, index_name=self.index_name, data_dir=self.data_dir)
+        except Exception as e:
+            return {"error": f"Indexing failed: {str(e)}"}
+
+        return {
+            "status": "success",
+            "added": added,
+            "updated": updated,
+            "removed": removed,
+            "unchanged": unchanged,
+            "chunks_created": counts["added"],
+        }
+
+    def build_context(self, hits, token_budget=None):
+        """
+        Merges overlapping hits, drops duplicates and fits the token budget
+        (see context_builder). Logs and records the tokens saved.
+
+        Returns:
+            list[str]: context passages, best first.
+        """
+        budget = self.context_tokens if token_budget is None else token_budget
+        passages, stats = build_context(hits, budget)
+        metrics.counter("chat_context_tokens_saved_total", "Prompt tokens saved by context merging and budgeting").inc(stats["tokens_saved"])
+        metrics.histogram("chat_context_tokens", "Estimated prompt context tokens per request",
+                          buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000)).observe(stats["tokens"])
+        print(f"Context: {stats['chunks']} chunks -> {stats['spans']} passages, ~{stats['tokens']} tokens "
+              f"(saved ~{stats['tokens_saved']}; dropped {stats['duplicates_dropped']} duplicate, "
+              f"{stats['over_budget_dropped']} over budget)")
+        return passages
+
+    def warmup(self):
+        """
+        Loads what the first question would otherwise wait for: the Gemini
+        client (and SDK), the embedding provider and the index with its chunk
+        store, then runs one search so the index pages are resident.
+
+        Returns:
+            dict: per-step timings in ms and the warmed "index_version"
+            (None when nothing has been ingested yet).
+        """
+        timings = {}
+        started = time.perf_counter()
+        try:
+            get_client().configure()
+        except ValueError as e:
+            print(f"Warmup: Gemini client not configured: {e}")
+        timings["client_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        get_embedding_provider()
+        timings["embedding_provider_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        try:
+            entry = index_registry.get_entry(self.index_name, self.data_dir)
+        except FileNotFoundError:
+            print("Warmup: no index yet; skipping index load")
+            return dict(timings, index_version=None)
+        timings["index_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        # A zero vector needs no embedding call but walks the same search path
+        search_queries(np.zeros((1, entry["index"].d), dtype=np.float32), index_name=self.index_name,
+                       data_dir=self.data_dir, top_k=self.top_k)
+        timings["search_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"Warmup: {timings}")
+        return dict(timings, index_version=entry.get("version"))
+
+    def search(self, queries, top_k=None, offset=0, max_distance=None, include_text=True):
+        """
+        Retrieval-only search (no generation) for one query or a batch; see
+        faiss_utils.search_queries.
+
+        Returns:
+            dict: {"results": [...], "took_ms": ...} or {"error": ...}.
+        """
+        started = time.perf_counter()
+        try:
+            results = search_queries(queries, index_name=self.index_name, data_dir=self.data_dir,
+                                     top_k=top_k or self.top_k, offset=offset, max_distance=max_distance,
+                                     include_text=include_text)
+        except FileNotFoundError:
+            return {"error": "System is not ready. Please ingest a PDF first."}
+        except Exception as e:
+            return {"error": _retrieval_error(e)}
+        return {"results": results, "took_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    @staticmethod
+    def build_prompt(question, chunks):
         context = "\n\n".join(chunks)
-        
-        # 2. Generate Answer with Gemini
-        import google.generativeai as genai
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            return "GEMINI_API_KEY not set."
-            
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        prompt = f"""You are a helpful assistant. Answer the question based only on the following context. If the answer is not in the context, say so.
+        return f"""You are a helpful assistant. Answer the question based only on the following context. If the answer is not in the context, say so.
 
 Context:
 {context}
 
 Question: {question}
 """
+
+    def answer_question(self, question, top_k=None, token_budget=None):
+        # 1. Retrieve
+        try:
+            with metrics.span("chat_retrieve", "Retrieval: index load, query embedding and search"):
+                hits = retrieve_chunks(question, index_name=self.index_name, data_dir=self.data_dir,
+                                       top_k=top_k or self.top_k, details=True)
+        except FileNotFoundError:
+            return "System is not ready. Please ingest a PDF first."
+        except Exception as e:
+            return _retrieval_error(e)
+
+        if not hits:
+            return "I couldn't find any relevant information in the documents."
+
+        # 2. Generate Answer with Gemini (shared, configured-once client)
+        client = get_client()
         try:
-            response = model.generate_content(prompt)
-            return response.text
+            client.configure()
+        except ValueError:
+            return "GEMINI_API_KEY not set."
+
+        with metrics.span("chat_prompt", "Prompt assembly"):
+            prompt = self.build_prompt(question, self.build_context(hits, token_budget))
+        try:
+            with metrics.span("chat_generate", "Answer generation"):
+                return client.generate(prompt)
         except Exception as e:
             return f"Error generating answer: {str(e)}"
 
+    async def _lookup_answer_cache(self, question, top_k=None, token_budget=None):
+        """
+        Checks the semantic answer cache. Returns (hit, store, vector) where
+        `store` records a freshly generated answer for this question and
+        `vector` is the question's query embedding, to be reused for
+        retrieval; all are None when caching does not apply (no index yet,
+        cache disabled, or the query could not be embedded). Answers built
+        from a different top_k or context budget are cached separately.
+        """
+        cache = get_answer_cache()
+        version = index_version(self.index_name, self.data_dir)
+        if cache.max_entries <= 0 or version is None:
+            return None, None, None
+        try:
+            # Batched with concurrent questions, like the retriever's own embedding
+            vector = await aembed_query(question)
+        except Exception:
+            return None, None, None
+
+        key = (self.data_dir, self.index_name, top_k or self.top_k,
+               self.context_tokens if token_budget is None else token_budget)
+        hit = cache.lookup(key, version, vector)
+
+        def store(answer, sources):
+            cache.store(key, version, vector, question, answer, sources)
+
+        return hit, store, vector
+
+    async def aanswer_question(self, question, top_k=None, token_budget=None):
+        """
+        Async answer_question: embedding and generation are awaited on the
+        shared client and the FAISS search runs in a worker thread, so one
+        event loop can hold many chats in flight without tying up threads.
+        Repeated or reworded questions are answered from the answer cache.
+
+        Args:
+            question: User question.
+            top_k: Chunks to retrieve; defaults to $RETRIEVAL_TOP_K.
+            token_budget: Context token budget; defaults to $CONTEXT_TOKEN_BUDGET.
+        """
+        with metrics.span("chat_cache_lookup", "Semantic answer cache lookup"):
+            hit, store_answer, vector = await self._lookup_answer_cache(question, top_k, token_budget)
+        if hit is not None:
+            return hit["answer"]
+
+        # 1. Retrieve
+        try:
+            with metrics.span("chat_retrieve", "Retrieval: index load, query embedding and search"):
+                hits = await aretrieve_chunks(question, index_name=self.index_name, data_dir=self.data_dir,
+                                              top_k=top_k or self.top_k, details=True, query_vector=vector)
+        except FileNotFoundError:
+            return "System is not ready. Please ingest a PDF first."
+        except Exception as e:
+            return _retrieval_error(e)
+
+        if not hits:
+            return "I couldn't find any relevant information in the documents."
+
+        # 2. Generate Answer with Gemini
+        client = get_client()
+        try:
+            client.configure()
+        except ValueError:
+            return "GEMINI_API_KEY not set."
+
+        with metrics.span("chat_prompt", "Prompt assembly"):
+            chunks = self.build_context(hits, token_budget)
+            prompt = self.build_prompt(question, chunks)
+        try:
+            with metrics.span("chat_generate", "Answer generation"):
+                answer = await client.agenerate(prompt)
+        except Exception as e:
+            return f"Error generating answer: {str(e)}"
+
+        if store_answer is not None:
+            store_answer(answer, chunks)
+        return answer
+
+    async def astream_answer(self, question, top_k=None, token_budget=None):
+        """
+        Streams an answer as (event, data) pairs: one "sources" event with
+        the context passages, then "token" events as Gemini generates, then
+        "done" with timings (or "error"). If the consumer closes the stream
+        early, the upstream generation is cancelled. top_k and token_budget
+        are as for aanswer_question.
+        """
+        started = time.perf_counter()
+        with metrics.span("chat_cache_lookup", "Semantic answer cache lookup"):
+            hit, store_answer, vector = await self._lookup_answer_cache(question, top_k, token_budget)
+        if hit is not None:
+            yield "sources", {"chunks": hit["sources"]}
+            yield "token", {"text": hit["answer"]}
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield "done", {"ttft_ms": elapsed_ms, "total_ms": elapsed_ms, "cached": True}
+            return
+
+        try:
+            with metrics.span("chat_retrieve", "Retrieval: index load, query embedding and search"):
+                hits = await aretrieve_chunks(question, index_name=self.index_name, data_dir=self.data_dir,
+                                              top_k=top_k or self.top_k, details=True, query_vector=vector)
+        except FileNotFoundError:
+            yield "error", {"message": "System is not ready. Please ingest a PDF first."}
+            return
+        except Exception as e:
+            yield "error", {"message": _retrieval_error(e)}
+            return
+
+        with metrics.span("chat_prompt", "Prompt assembly"):
+            chunks = self.build_context(hits, token_budget) if hits else []
+        yield "sources", {"chunks": chunks}
+        if not chunks:
+            yield "token", {"text": "I couldn't find any relevant information in the documents."}
+            yield "done", {"ttft_ms": None, "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+            return
+
+        client = get_client()
+        try:
+            client.configure()
+        except ValueError:
+            yield "error", {"message": "GEMINI_API_KEY not set."}
+            return
+
+        metrics.counter("chat_streams_total", "Streaming chats started").inc()
+        ttft_ms = None
+        completed = False
+        pieces = []
+        stream = client.astream(self.build_prompt(question, chunks))
+        try:
+            async for text in stream:
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                    metrics.histogram("chat_time_to_first_token_ms", "Time from request to first generated token").observe(ttft_ms)
+                pieces.append(text)
+                yield "token", {"text": text}
+            completed = True
+        except Exception as e:
+            yield "error", {"message": f"Error generating answer: {str(e)}"}
+            return
+        finally:
+            await stream.aclose()
+            if not completed:
+                metrics.counter("chat_streams_cancelled_total", "Streaming chats abandoned before completion").inc()
+
+        # Only complete answers are cached
+        if store_answer is not None:
+            store_answer("".join(pieces), chunks)
+
+        yield "done", {
+            "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "cached": False,
+        }
+
+def _timed_pages(pages, progress=None):
+    """Times the extraction of each page as the pipeline pulls it."""
+    histogram = metrics.histogram("ingest_extract_page_ms", "Text extraction of one PDF page")
+    pages = iter(pages)
+    while True:
+        started = time.perf_counter()
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        histogram.observe((time.perf_counter() - started) * 1000)
+        if progress is not None:
+            progress.advance(pages=1)
+        yield page
+
+
+def _retrieval_error(error):
+    # Unexpected failures (embedding API, corrupt index, ...) are reported
+    # as such instead of being mistaken for a missing index.
+    metrics.counter("chat_retrieval_errors_total", "Retrievals that failed for a reason other than no index").inc()
+    print(f"Retrieval failed: {error!r}")
+    return f"Error retrieving context: {str(error)}"
+
+
 rag_service = RAGService()
@@ -0,0 +1,100 @@
+import os
+import asyncio
+import time
+import numpy as np
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+from answer_cache import SemanticAnswerCache
+from rag import rag_service
+
+
+def test_semantic_answer_cache():
+    cache = SemanticAnswerCache(threshold=0.9, ttl_seconds=60, max_entries=2)
+    key = ("data", "faiss_index")
+
+    cache.store(key, "v1", [1.0, 0.0, 0.0], "What is a deductible?", "It is $500.", ["Deductible is $500."])
+
+    # A near-duplicate question hits, an unrelated one misses
+    hit = cache.lookup(key, "v1", [0.98, 0.05, 0.0])
+    assert hit["answer"] == "It is $500."
+    assert cache.lookup(key, "v1", [0.0, 1.0, 0.0]) is None
+
+    # A new index version invalidates everything cached for that index
+    assert cache.lookup(key, "v2", [1.0, 0.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["entries"] == 0
+
+    # LRU eviction beyond max_entries
+    cache.store(key, "v2", [1.0, 0.0, 0.0], "q1", "a1", [])
+    cache.store(key, "v2", [0.0, 1.0, 0.0], "q2", "a2", [])
+    cache.lookup(key, "v2", [1.0, 0.0, 0.0])
+    cache.store(key, "v2", [0.0, 0.0, 1.0], "q3", "a3", [])
+    assert cache.lookup(key, "v2", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(key, "v2", [1.0, 0.0, 0.0])["answer"] == "a1"
+
+    # TTL expiry
+    expiring = SemanticAnswerCache(ttl_seconds=0.01)
+    expiring.store(key, "v1", [1.0, 0.0], "q", "a", [])
+    time.sleep(0.02)
+    assert expiring.lookup(key, "v1", [1.0, 0.0]) is None
+    print("Answer cache stats:", cache.stats())
+
+
+def test_cache_hit_skips_generation():
+    cache = SemanticAnswerCache()
+    client = MagicMock()
+    client.agenerate = AsyncMock(return_value="The deductible is $500.")
+    retrieve = AsyncMock(return_value=["Deductible is $500."])
+
+    async def run():
+        first = await rag_service.aanswer_question("What is the deductible?")
+        second = await rag_service.aanswer_question("what is the deductible")
+        return first, second
+
+    with patch("rag.get_answer_cache", return_value=cache), patch("rag.get_client", return_value=client), \
+         patch("rag.index_version", return_value="v1"), patch("rag.aretrieve_chunks", retrieve), \
+         patch("embedding_providers.aembed_texts", AsyncMock(return_value=np.array([[0.6, 0.8]], dtype=np.float32))):
+        first, second = asyncio.run(run())
+
+    assert first == second == "The deductible is $500."
+    assert client.agenerate.call_count == 1
+    assert retrieve.call_count == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_concurrent_chats_share_query_embeddings():
+    cache = SemanticAnswerCache()
+    client = MagicMock()
+    client.agenerate = AsyncMock(return_value="An answer.")
+    embed_calls = []
+
+    async def fake_aembed(texts, **kwargs):
+        embed_calls.append(list(texts))
+        rows = np.zeros((len(texts), 32), dtype=np.float32)
+        rows[np.arange(len(texts)), [int(t.split()[-1]) for t in texts]] = 1.0
+        return rows
+
+    def fake_search(query_vectors, index_name, data_dir, top_k, nprobe, ef_search, details=False):
+        return [[{"id": 0, "text": "A clause.", "distance": 0.1, "metadata": {}}] for _ in query_vectors]
+
+    async def run():
+        return await asyncio.gather(*[rag_service.aanswer_question(f"question {i}") for i in range(20)])
+
+    with patch("rag.get_answer_cache", return_value=cache), patch("rag.get_client", return_value=client), \
+         patch("rag.index_version", return_value="v1"), patch("faiss_utils.search_chunks", fake_search), \
+         patch("embedding_providers.aembed_texts", fake_aembed):
+        answers = asyncio.run(run())
+
+    assert answers == ["An answer."] * 20
+    # The cache lookup and retrieval reuse one batched embedding per question
+    print("Embedding calls for 20 chats:", [len(c) for c in embed_calls])
+    assert len(embed_calls) < 20
+    assert sum(len(c) for c in embed_calls) == 20
+
+
+if __name__ == "__main__":
+    test_semantic_answer_cache()
+    test_cache_hit_skips_generation()
+    test_concurrent_chats_share_query_embeddings()
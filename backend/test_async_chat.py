@@ -0,0 +1,69 @@
+import os
+import asyncio
+import numpy as np
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+from rag import rag_service
+from gemini_client import GeminiClient
+
+
+def test_async_chat_flow():
+    client = GeminiClient(max_concurrency=4)
+    client.configure = MagicMock()
+    in_flight = 0
+    peak = 0
+
+    async def slow_generate(prompt):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return MagicMock(text="The deductible is $500.")
+
+    model = MagicMock()
+    model.generate_content_async = slow_generate
+    client._model = model
+
+    async def run():
+        return await asyncio.gather(*[rag_service.aanswer_question(f"Question {i}?") for i in range(50)])
+
+    # index_version=None bypasses the answer cache so every question is generated
+    with patch("rag.get_client", return_value=client), patch("rag.index_version", return_value=None), \
+         patch("rag.aretrieve_chunks", AsyncMock(return_value=["Deductible is $500."])):
+        answers = asyncio.run(run())
+
+    assert all(a == "The deductible is $500." for a in answers)
+    # Upstream calls never exceed the configured concurrency limit
+    print("Peak concurrent generations:", peak)
+    assert 1 < peak <= 4
+
+
+@patch("faiss_utils.search_chunks")
+@patch("embedding_providers.aembed_texts")
+def test_aretrieve_runs_search_off_loop(mock_aembed, mock_search):
+    from faiss_utils import aretrieve_chunks
+    import threading
+
+    mock_aembed.return_value = np.zeros((1, 2), dtype=np.float32)
+    loop_thread = {}
+
+    def search(*args):
+        loop_thread["search"] = threading.get_ident()
+        return [["chunk"]]
+
+    mock_search.side_effect = search
+
+    async def run():
+        loop_thread["loop"] = threading.get_ident()
+        return await aretrieve_chunks("q", index_name="test", data_dir="unused")
+
+    assert asyncio.run(run()) == ["chunk"]
+    assert loop_thread["search"] != loop_thread["loop"]
+
+
+if __name__ == "__main__":
+    test_async_chat_flow()
+    test_aretrieve_runs_search_off_loop()
@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+
+from benchmark import FakeEmbedder, print_report, run
+
+
+def test_fake_embedder_is_deterministic():
+    embedder = FakeEmbedder(dimension=64)
+    a = embedder.embed_documents(["how do I file a claim", "how do I file a claim", "storm damage"])
+    b = embedder.embed_queries(["how do I file a claim"])
+    assert np.array_equal(a[0], b[0])
+    # Shared words give more similar vectors than unrelated text
+    assert float(a[0] @ b[0]) > float(a[2] @ b[0])
+
+
+def test_benchmark_smoke():
+    report = run(docs=2, pages=2, requests=20, concurrency=4, embed_latency_ms=0, embed_per_item_ms=0,
+                 llm_latency_ms=1, dimension=64)
+    print(json.dumps(report, indent=2))
+
+    assert report["stages"]["extraction"]["pages"] == 4
+    assert report["stages"]["chunking"]["chunks"] > 0
+    assert report["ingest"]["chunks_created"] == report["stages"]["chunking"]["chunks"]
+    assert report["chat"]["requests"] == 20
+    assert report["chat"]["errors"] == 0
+    assert report["chat"]["p50_ms"] <= report["chat"]["p99_ms"]
+    # Reports are JSON-serializable and comparable with each other
+    json.dumps(report)
+    print_report(report, baseline=report)
+    print("Benchmark verification successful!")
+
+
+if __name__ == "__main__":
+    test_fake_embedder_is_deterministic()
+    test_benchmark_smoke()
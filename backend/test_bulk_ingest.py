@@ -0,0 +1,128 @@
+import os
+import shutil
+import numpy as np
+from unittest.mock import patch
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+from rag import RAGService
+from faiss_utils import index_registry, load_document_registry
+
+
+def write_pdf(path, pages):
+    c = canvas.Canvas(path, pagesize=letter)
+    for page in range(pages):
+        y = 750
+        for line in range(40):
+            c.drawString(50, y, f"{os.path.basename(path)} page {page} line {line} lorem ipsum dolor")
+            y -= 18
+        c.showPage()
+    c.save()
+
+
+@patch("embedding_providers.embed_texts")
+def test_bulk_ingest(mock_embed):
+    test_dir = "test_data_bulk"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(os.path.join(test_dir, "claims"))
+
+    mock_embed.side_effect = lambda texts, **kwargs: np.random.rand(len(texts), 8).astype(np.float32)
+
+    service = RAGService()
+    service.data_dir = test_dir
+    service.index_name = "test"
+
+    try:
+        for i in range(4):
+            write_pdf(os.path.join(test_dir, "claims", f"doc{i}.pdf"), pages=3)
+        with open(os.path.join(test_dir, "claims", "broken.pdf"), "wb") as f:
+            f.write(b"not a pdf")
+
+        res = service.ingest_bulk("claims", workers=2)
+        print("Bulk ingest:", {k: v for k, v in res.items() if k != "documents"})
+
+        assert res["status"] == "success"
+        docs = res["documents"]
+        assert docs[os.path.join("claims", "broken.pdf")]["status"] == "error"
+        good = [name for name, d in docs.items() if d["status"] == "success"]
+        assert len(good) == 4
+        assert all(docs[name]["pages"] == 3 for name in good)
+        assert res["pages"] == 12
+        assert res["pages_per_sec"] > 0 and res["chunks_per_sec"] > 0
+
+        registry = load_document_registry("test", test_dir)["documents"]
+        assert sorted(registry) == sorted(good)
+        index, chunks = index_registry.get("test", test_dir)
+        assert index.ntotal == res["chunks_created"] == len(chunks)
+        print("Bulk ingest verification successful!")
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+@patch("embedding_providers.embed_texts")
+def test_bulk_then_incremental(mock_embed):
+    test_dir = "test_data_bulk_incremental"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(os.path.join(test_dir, "claims"))
+    os.makedirs(os.path.join(test_dir, "collections", "acme"))
+
+    mock_embed.side_effect = lambda texts, **kwargs: np.random.rand(len(texts), 8).astype(np.float32)
+
+    service = RAGService()
+    service.data_dir = test_dir
+    service.index_name = "test"
+
+    try:
+        write_pdf(os.path.join(test_dir, "claims", "a.pdf"), pages=2)
+        write_pdf(os.path.join(test_dir, "top.pdf"), pages=1)
+        # Another collection's document is never part of the default collection
+        write_pdf(os.path.join(test_dir, "collections", "acme", "acme.pdf"), pages=1)
+
+        res = service.ingest_bulk("**/*.pdf", workers=1)
+        assert sorted(res["documents"]) == [os.path.join("claims", "a.pdf"), "top.pdf"]
+        assert service.list_pdfs() == [os.path.join("claims", "a.pdf"), "top.pdf"]
+
+        # Incremental sees the same documents bulk registered, in subdirectories too
+        res = service.ingest_incremental()
+        print("Incremental after bulk:", res)
+        assert res["removed"] == [] and res["added"] == []
+        assert sorted(res["unchanged"]) == [os.path.join("claims", "a.pdf"), "top.pdf"]
+        index, _ = index_registry.get("test", test_dir)
+        assert index.ntotal == sum(len(d["ids"]) for d in load_document_registry("test", test_dir)["documents"].values())
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+def test_extraction_pool_stops_early():
+    import ingest_pipeline
+    test_dir = "test_data_bulk_pool"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        paths = [os.path.join(test_dir, f"doc{i}.pdf") for i in range(6)]
+        for path in paths:
+            write_pdf(path, pages=2)
+        with patch.object(ingest_pipeline, "ProcessPoolExecutor", wraps=ingest_pipeline.ProcessPoolExecutor) as pool:
+            documents = ingest_pipeline.iter_extracted_documents(paths, workers=1)
+            first = next(documents)
+            # A consumer that stops (e.g. a cancelled job) drops the queued extractions
+            documents.close()
+        assert first[0] in paths and first[4] is None
+        # Never forked from the threaded server process
+        assert pool.call_args.kwargs["mp_context"].get_start_method() == "spawn"
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_bulk_ingest()
+    test_bulk_then_incremental()
+    test_extraction_pool_stops_early()
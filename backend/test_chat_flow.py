@@ -5,17 +5,18 @@ from unittest.mock import patch, MagicMock
 os.environ["GEMINI_API_KEY"] = "sk-dummy"
 
 from rag import rag_service
+from gemini_client import get_client
 
-# Patch where it is imported in rag.py? 
-# In rag.py `answer_question`, we do `import google.generativeai as genai`
-# So we must patch `google.generativeai` in sys.modules or patch the module if it was top level.
-# Since it is a local import, we can patch `google.generativeai` globally before the function runs.
+# The shared client in gemini_client.py looks up `genai.configure` and
+# `genai.GenerativeModel` on the google.generativeai module at call time,
+# so patching them globally works once the client's cached state is reset.
 
 @patch("google.generativeai.GenerativeModel")
 @patch("google.generativeai.configure")
 @patch("rag.retrieve_chunks")
 def test_chat_flow(mock_retrieve, mock_configure, mock_model_cls):
     print("Testing Gemini chat flow...")
+    get_client().reset()
     
     # Mock Retrieval: Return some context
     mock_retrieve.return_value = ["Deductible is $500.", "File claims online."]
@@ -36,5 +37,10 @@ def test_chat_flow(mock_retrieve, mock_configure, mock_model_cls):
     # Verify configure called
     mock_configure.assert_called()
 
+    # A second question reuses the configured client and model
+    rag_service.answer_question("How do I file a claim?")
+    assert mock_configure.call_count == 1
+    assert mock_model_cls.call_count == 1
+
 if __name__ == "__main__":
     test_chat_flow()
@@ -0,0 +1,106 @@
+import os
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+from rag import rag_service
+from gemini_client import GeminiClient
+import metrics
+
+
+class FakeStreamCall:
+    """Mimics api_core's wrapped gRPC stream call: iterated by an async generator method, stopped by cancel()."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.produced = 0
+        self.cancelled = 0
+
+    async def _wrapped_aiter(self):
+        for piece in self.pieces:
+            await asyncio.sleep(0)
+            if self.cancelled:
+                return
+            self.produced += 1
+            yield piece
+
+    def __aiter__(self):
+        return self._wrapped_aiter()
+
+    def cancel(self):
+        self.cancelled += 1
+
+
+class FakeStreamResponse:
+    """Mimics the SDK's AsyncGenerateContentResponse, which keeps aiter() of the call as _iterator."""
+
+    def __init__(self, pieces):
+        self.call = FakeStreamCall(pieces)
+        self._iterator = aiter(self.call)
+
+    async def __aiter__(self):
+        async for piece in self._iterator:
+            yield MagicMock(text=piece)
+
+
+def make_client(response):
+    client = GeminiClient()
+    client.configure = MagicMock()
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(return_value=response)
+    client._model = model
+    return client
+
+
+@patch("rag.index_version", return_value=None)
+@patch("rag.aretrieve_chunks", AsyncMock(return_value=["Deductible is $500."]))
+def test_stream_answer(mock_version):
+    response = FakeStreamResponse(["The ", "deductible ", "is $500."])
+
+    async def run():
+        return [event async for event in rag_service.astream_answer("What is the deductible?")]
+
+    with patch("rag.get_client", return_value=make_client(response)):
+        events = asyncio.run(run())
+
+    names = [name for name, _ in events]
+    assert names == ["sources", "token", "token", "token", "done"]
+    assert events[0][1]["chunks"] == ["Deductible is $500."]
+    assert "".join(data["text"] for name, data in events if name == "token") == "The deductible is $500."
+    assert response.call.produced == 3
+    assert events[-1][1]["ttft_ms"] is not None
+    assert metrics.histogram("chat_time_to_first_token_ms").count >= 1
+    print("Streaming events:", names)
+
+
+@patch("rag.index_version", return_value=None)
+@patch("rag.aretrieve_chunks", AsyncMock(return_value=["Deductible is $500."]))
+def test_stream_cancel(mock_version):
+    response = FakeStreamResponse([f"tok{i} " for i in range(1000)])
+    cancelled_before = metrics.counter("chat_streams_cancelled_total").value
+
+    async def run():
+        stream = rag_service.astream_answer("What is the deductible?")
+        tokens = 0
+        async for name, _ in stream:
+            if name == "token":
+                tokens += 1
+                if tokens == 3:
+                    break
+        # Client went away: closing the stream must cancel the upstream call
+        await stream.aclose()
+
+    with patch("rag.get_client", return_value=make_client(response)):
+        asyncio.run(run())
+
+    assert response.call.produced < 10
+    # The gRPC call itself was cancelled and the SDK's iterator closed
+    assert response.call.cancelled == 1
+    assert response._iterator.ag_frame is None
+    assert metrics.counter("chat_streams_cancelled_total").value == cancelled_before + 1
+
+
+if __name__ == "__main__":
+    test_stream_answer()
+    test_stream_cancel()
@@ -0,0 +1,80 @@
+import os
+import pickle
+import shutil
+import faiss
+import numpy as np
+from unittest.mock import patch
+
+from chunk_store import ChunkStore, write_chunk_store
+from faiss_utils import build_index, retrieve_chunks
+
+
+def test_chunk_store_roundtrip():
+    test_dir = "test_data_chunk_store"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        path = os.path.join(test_dir, "store.chunks")
+        chunks = ["Apple is a fruit", "Ünïcödé – text ✓", "", "Banana is yellow"]
+        metadata = [{"source": "a.pdf", "page": 1}, {"source": "a.pdf", "page": 2}, None, {"source": "b.pdf"}]
+
+        # Positional store (ids 0..n-1)
+        write_chunk_store(path, chunks, metadata=metadata)
+        store = ChunkStore(path)
+        assert len(store) == 4
+        assert [store.get(i) for i in range(4)] == chunks
+        assert store.get_metadata(1) == {"source": "a.pdf", "page": 2}
+        assert store.get_metadata(2) == {}
+        assert store.get(4) is None and store.get(-1) is None
+
+        # Sparse ids given out of order, as left behind by incremental updates
+        write_chunk_store(path, ["c", "a", "b"], ids=[30, 10, 20])
+        store = ChunkStore(path)
+        assert store.get(10) == "a" and store.get(20) == "b" and store.get(30) == "c"
+        assert store.get(15) is None
+        assert not store.has_metadata
+        assert list(store.items()) == [(10, "a", {}), (20, "b", {}), (30, "c", {})]
+
+        # Empty store
+        write_chunk_store(path, [])
+        assert len(ChunkStore(path)) == 0
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+@patch("embedding_providers.embed_texts")
+def test_legacy_pickle_still_served(mock_embed):
+    test_dir = "test_data_chunk_store_legacy"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        embeddings = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+
+        # Simulate an index written before the chunk store (and snapshots) existed
+        index = faiss.IndexFlatL2(2)
+        index.add(embeddings)
+        faiss.write_index(index, os.path.join(test_dir, "test.index"))
+        with open(os.path.join(test_dir, "test.pkl"), "wb") as f:
+            pickle.dump(["Apple (legacy)", "Car (legacy)"], f)
+
+        mock_embed.return_value = np.array([[1.0, 0.0]], dtype=np.float32)
+        assert retrieve_chunks("fruit", index_name="test", data_dir=test_dir, top_k=1) == ["Apple (legacy)"]
+
+        # The next build publishes a snapshot and retires the unversioned files
+        build_index(["Apple", "Car"], embeddings, index_name="test", data_dir=test_dir)
+        assert not os.path.exists(os.path.join(test_dir, "test.pkl"))
+        assert not os.path.exists(os.path.join(test_dir, "test.index"))
+        assert retrieve_chunks("fruit", index_name="test", data_dir=test_dir, top_k=1) == ["Apple"]
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_chunk_store_roundtrip()
+    test_legacy_pickle_still_served()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+from faiss_utils import IndexRegistry, build_index, retrieve_chunks, snapshot_dir
+from rag import RAGService
+
+
+def read_fake_pdf(self, file_path):
+    # Test "PDFs" are plain text files (one page each) so no real parsing is needed
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield f.read()
+
+
+def test_lru_eviction_and_concurrent_loads():
+    test_dir = "test_data_collections_lru"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        embeddings = np.random.rand(1000, 64).astype(np.float32)
+        for name in ("a", "b", "c"):
+            build_index([f"{name} {i}" for i in range(1000)], embeddings, index_name=name, data_dir=test_dir)
+        index_mb = os.path.getsize(os.path.join(snapshot_dir("a", test_dir), "a.index")) / 2**20
+
+        # Room for two of the three indexes
+        registry = IndexRegistry(memory_budget_mb=2.5 * index_mb)
+        registry.get("a", test_dir)
+        registry.get("b", test_dir)
+        b_lock = registry._load_locks[registry._key("b", test_dir)]
+        registry.get("a", test_dir)  # a is now the most recently used
+        registry.get("c", test_dir)
+        stats = registry.stats()
+        print("Stats:", stats)
+        assert stats["loaded_indexes"] == 2 and stats["evictions"] == 1
+        assert stats["memory_mb"] <= 2.5 * index_mb
+        # Eviction keeps b's load lock, so a load of b in flight is never duplicated
+        assert registry._load_locks[registry._key("b", test_dir)] is b_lock
+        # b was the coldest; a is still served from memory
+        loads = stats["loads"]
+        registry.get("a", test_dir)
+        assert registry.stats()["loads"] == loads
+        registry.get("b", test_dir)
+        assert registry.stats()["loads"] == loads + 1
+
+        # A slow cold load does not hold up lookups of loaded indexes
+        registry = IndexRegistry()
+        registry.get("a", test_dir)
+        release = threading.Event()
+        read_index = registry._read_index
+
+        def slow_read(index_path):
+            if index_path.endswith("c.index"):
+                release.wait(5)
+            return read_index(index_path)
+
+        with patch.object(registry, "_read_index", slow_read):
+            cold = threading.Thread(target=registry.get, args=("c", test_dir))
+            cold.start()
+            time.sleep(0.05)
+            started = time.perf_counter()
+            registry.get("a", test_dir)  # warm
+            registry.get("b", test_dir)  # another cold index loads alongside
+            elapsed = time.perf_counter() - started
+            release.set()
+            cold.join()
+        print(f"Lookups during a cold load took {elapsed * 1000:.1f} ms")
+        assert elapsed < 1
+        assert registry.stats()["loaded_indexes"] == 3
+    finally:
+        shutil.rmtree(test_dir)
+
+
+@patch("rag.RAGService.iter_pages", read_fake_pdf)
+@patch("embedding_providers.embed_texts")
+def test_named_collections(mock_embed):
+    test_dir = "test_data_collections"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(os.path.join(test_dir, "collections", "acme"))
+
+    mock_embed.side_effect = lambda texts, **kwargs: np.ones((len(texts), 8), dtype=np.float32)
+    service = RAGService()
+    service.data_dir = test_dir
+    service.index_name = "test"
+
+    try:
+        with open(os.path.join(test_dir, "default.pdf"), "w", encoding="utf-8") as f:
+            f.write("Default policy text.")
+        with open(os.path.join(test_dir, "collections", "acme", "acme.pdf"), "w", encoding="utf-8") as f:
+            f.write("Acme policy text.")
+
+        acme = service.collection("acme")
+        assert service.collection("default") is service
+        assert acme.data_dir == os.path.join(test_dir, "collections", "acme")
+        for bad in ("../etc", "a/b", "", "x" * 65):
+            try:
+                service.collection(bad)
+                assert False, f"expected {bad!r} to be rejected"
+            except ValueError:
+                pass
+
+        assert service.ingest_incremental()["added"] == ["default.pdf"]
+        assert acme.ingest_incremental()["added"] == ["acme.pdf"]
+        # Each collection only sees its own documents
+        assert retrieve_chunks("q", index_name="test", data_dir=acme.data_dir) == ["Acme policy text."]
+        assert retrieve_chunks("q", index_name="test", data_dir=test_dir) == ["Default policy text."]
+
+        listed = service.list_collections()
+        print("Collections:", listed)
+        assert [(c["name"], c["indexed"], c["documents"], c["pdfs"]) for c in listed] == [
+            ("default", True, 1, 1), ("acme", True, 1, 1)]
+        # Fresh install: no data directory yet
+        fresh = RAGService()
+        fresh.data_dir = os.path.join(test_dir, "missing")
+        assert fresh.list_collections() == [{"name": "default", "indexed": False, "pdfs": 0, "documents": 0}]
+        assert service.collection("missing").ingest_incremental()["error"].startswith("Directory not found")
+        print("Collections verification successful!")
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_lru_eviction_and_concurrent_loads()
+    test_named_collections()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import numpy as np
+from unittest.mock import patch
+
+from faiss_utils import (build_index, retrieve_chunks, choose_index_spec, index_registry, load_index_meta, snapshot_dir,
+                         update_index)
+
+
+def test_compressed_auto_spec():
+    # 2M x 768 floats is ~6 GB; SQ8 codes (~1.5 GB) fit a 2 GB budget
+    spec = choose_index_spec(2_000_000, 768, memory_budget_mb=2048)
+    assert spec["type"] == "ivf" and spec["sq"] == 8 and spec["rerank"] == 4
+
+
+@patch("embedding_providers.embed_texts")
+def test_compressed_indexes(mock_embed):
+    test_dir = "test_data_compression"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        rng = np.random.default_rng(0)
+        embeddings = rng.random((2000, 32), dtype=np.float32)
+        chunks = [f"chunk {i}" for i in range(len(embeddings))]
+        # Query is an exact copy of chunk 42
+        mock_embed.return_value = embeddings[42:43]
+
+        for spec in ["flat:sq=8", "flat:sq=16", "hnsw:M=16,sq=8,rerank=4", "ivf:nlist=16,nprobe=4,sq=8,rerank=2",
+                     "flat:pca=8,sq=8,rerank=8", "flat:truncate=16,rerank=8"]:
+            build_index(chunks, embeddings, index_name="test", data_dir=test_dir, index_spec=spec)
+            meta = load_index_meta("test", test_dir)
+            entry = index_registry.get_entry("test", test_dir)
+            vectors_path = os.path.join(snapshot_dir("test", test_dir), "test.vectors.npy")
+            print(spec, "->", meta)
+
+            # Full-precision vectors are only kept (and mapped) when re-ranking
+            assert os.path.exists(vectors_path) == bool(meta.get("rerank"))
+            assert (entry["vectors"] is not None) == bool(meta.get("rerank"))
+
+            results = retrieve_chunks("q", index_name="test", data_dir=test_dir, top_k=5)
+            assert len(results) == 5
+            if meta.get("rerank"):
+                # Exact re-ranking puts the identical vector first
+                assert results[0] == "chunk 42"
+
+        # An incremental update replaces the compressed index with a flat one
+        update_index({"doc": {"hash": "h", "chunks": ["only"], "embeddings": embeddings[:1]}}, [],
+                     index_name="test", data_dir=test_dir)
+        assert not os.path.exists(os.path.join(snapshot_dir("test", test_dir), "test.vectors.npy"))
+        assert index_registry.get_entry("test", test_dir)["vectors"] is None
+        print("Compressed index verification successful!")
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_compressed_auto_spec()
+    test_compressed_indexes()
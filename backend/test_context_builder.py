@@ -0,0 +1,96 @@
+import os
+import shutil
+from unittest.mock import MagicMock, patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+import embedding_providers
+from context_builder import build_context, merge_hits
+from embedding_providers import HashingEmbeddingProvider
+from faiss_utils import build_index, retrieve_chunks
+from ingest_pipeline import iter_chunk_spans, provenance
+from rag import rag_service
+
+
+def document_hits(text, source="policy.pdf"):
+    return [{"text": chunk, "metadata": dict(provenance(span), source=source)}
+            for span, chunk in iter_chunk_spans([text])]
+
+
+def test_merge_and_budget():
+    text = " ".join(f"word{i}" for i in range(1000))
+    hits = document_hits(text)
+    # Retrieval order: the third chunk ranks best, then its neighbours
+    ranked = [hits[2], hits[1], hits[3], hits[6]]
+
+    spans = merge_hits(ranked)
+    assert [s["chunks"] for s in spans] == [3, 1]
+    merged = spans[0]
+    # Neighbours are stitched back into the original text, overlap included once
+    assert merged["text"] == text[merged["start"]:merged["end"]]
+    assert merged["rank"] == 0
+
+    passages, stats = build_context(ranked)
+    print("Stats:", stats)
+    assert passages == [merged["text"], hits[6]["text"]]
+    assert stats["tokens_saved"] > 0 and stats["spans"] == 2
+
+    # The budget keeps whole passages by rank and truncates only the best one
+    passages, stats = build_context(ranked, token_budget=stats["tokens"] - 1)
+    assert passages == [merged["text"]] and stats["over_budget_dropped"] == 1
+    passages, _ = build_context(ranked, token_budget=50)
+    assert len(passages) == 1 and merged["text"].startswith(passages[0]) and len(passages[0]) <= 200
+
+
+def test_duplicates_and_plain_chunks():
+    passage = "A deductible is the amount you pay before your coverage starts paying for a claim."
+    hits = [
+        {"text": passage, "metadata": {"source": "a.pdf", "start": 0, "end": len(passage)}},
+        # Same passage indexed under another file name
+        {"text": passage, "metadata": {"source": "copy.pdf", "start": 0, "end": len(passage)}},
+        "You can file a claim online or by phone.",
+    ]
+    passages, stats = build_context(hits)
+    assert passages == [passage, "You can file a claim online or by phone."]
+    assert stats["duplicates_dropped"] == 1
+
+
+def test_retrieval_details_and_prompt():
+    test_dir = "test_data_context"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    text = " ".join(f"clause{i} covers storm damage" for i in range(300))
+    hits = document_hits(text)
+    try:
+        with patch.object(embedding_providers, "_provider", HashingEmbeddingProvider(dimension=64)):
+            provider = embedding_providers.get_embedding_provider()
+            chunks = [h["text"] for h in hits]
+            build_index(chunks, provider.embed_documents(chunks), index_name="test", data_dir=test_dir,
+                        metadata=[h["metadata"] for h in hits])
+            found = retrieve_chunks("storm damage", index_name="test", data_dir=test_dir, top_k=4, details=True)
+        assert len(found) == 4
+        assert found == sorted(found, key=lambda h: h["distance"])
+        assert {"id", "text", "distance", "metadata"} <= set(found[0])
+        assert found[0]["metadata"]["source"] == "policy.pdf" and "page" in found[0]["metadata"]
+
+        # The prompt holds each retrieved character once, within the budget
+        client = MagicMock()
+        client.generate.return_value = "Storm damage is covered."
+        with patch("rag.retrieve_chunks", return_value=hits[:4]) as mock_retrieve, \
+                patch("rag.get_client", return_value=client):
+            assert rag_service.answer_question("storm?", top_k=4, token_budget=10000) == "Storm damage is covered."
+        assert mock_retrieve.call_args.kwargs["top_k"] == 4
+        prompt = client.generate.call_args.args[0]
+        assert text[hits[0]["metadata"]["start"]:hits[3]["metadata"]["end"]] in prompt
+        assert len(prompt) < sum(len(h["text"]) for h in hits[:4])
+        print("Context verification successful!")
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_merge_and_budget()
+    test_duplicates_and_plain_chunks()
+    test_retrieval_details_and_prompt()
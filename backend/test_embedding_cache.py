@@ -0,0 +1,61 @@
+import os
+import shutil
+import numpy as np
+from unittest.mock import patch
+
+from embedding_cache import EmbeddingCache
+from embedding_utils import embed_texts
+
+
+def fake_embed_content(model, content, task_type, title=None):
+    # Deterministic 3-dim vector per text so order can be checked
+    return {'embedding': [[float(len(t)), 1.0, 0.0] for t in content]}
+
+
+@patch("embedding_utils.genai")
+def test_embedding_cache(mock_genai):
+    test_dir = "test_data_embedding_cache"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+    os.environ["GEMINI_API_KEY"] = "dummy-key"
+    mock_genai.embed_content.side_effect = fake_embed_content
+
+    try:
+        cache_path = os.path.join(test_dir, "cache.sqlite")
+        cache = EmbeddingCache(cache_path, max_memory_entries=2)
+
+        texts = ["a", "bb", "ccc"]
+        first = embed_texts(texts, cache=cache)
+        assert first.shape == (3, 3)
+        assert mock_genai.embed_content.call_count == 1
+
+        # Re-embedding with one edited and one re-flowed text only sends the edit
+        second = embed_texts(["a", "dddd", "ccc\n"], cache=cache)
+        assert mock_genai.embed_content.call_count == 2
+        sent = mock_genai.embed_content.call_args.kwargs["content"]
+        assert sent == ["dddd"]
+        assert second[:, 0].tolist() == [1.0, 4.0, 3.0]
+
+        # Memory LRU is bounded, but the disk store still serves everything
+        assert cache.stats()["memory_entries"] == 2
+        reopened = EmbeddingCache(cache_path)
+        third = embed_texts(texts, cache=reopened)
+        assert mock_genai.embed_content.call_count == 2
+        np.testing.assert_array_equal(first, third)
+
+        # task_type is part of the key
+        embed_texts(["a"], cache=reopened, task_type="retrieval_query")
+        assert mock_genai.embed_content.call_count == 3
+
+        print("Cache stats:", reopened.stats())
+        cache.close()
+        reopened.close()
+        print("Embedding cache verification successful!")
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_embedding_cache()
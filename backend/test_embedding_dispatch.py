@@ -0,0 +1,121 @@
+import os
+import shutil
+import threading
+import time
+from unittest.mock import patch
+
+from google.api_core import exceptions as api_exceptions
+
+os.environ["GEMINI_API_KEY"] = "dummy-key"
+
+import metrics
+from embedding_cache import EmbeddingCache
+from embedding_dispatch import AdaptiveBatchSize, TokenBucket
+from embedding_utils import embed_texts
+
+
+def fake_embed_content(model, content, task_type, title=None):
+    return {'embedding': [[float(len(t)), 1.0, 0.0] for t in content]}
+
+
+def test_token_bucket_and_batch_size():
+    bucket = TokenBucket(per_minute=60)
+    # A full minute's quota is available at once, then one unit per second
+    assert bucket.reserve(60) == 0
+    assert 0.9 < bucket.reserve(1) <= 1.0
+
+    sizer = AdaptiveBatchSize(initial=100, minimum=8, target_latency_ms=100)
+    sizer.on_error(throttled=True)
+    assert sizer.size == 50
+    sizer.on_success(500)  # more than twice the target
+    assert sizer.size == 37
+    sizer.on_success(10)
+    assert sizer.size == 40
+    for _ in range(50):
+        sizer.on_error(throttled=True)
+    assert sizer.size == 8
+
+
+@patch("embedding_utils.genai")
+def test_concurrent_dispatch(mock_genai):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_embed(**kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return fake_embed_content(**kwargs)
+
+    mock_genai.embed_content.side_effect = slow_embed
+    texts = ["x" * (i + 1) for i in range(100)]
+    with patch.dict(os.environ, {"EMBED_CONCURRENCY": "4"}):
+        vectors = embed_texts(texts, model="models/test-concurrent", batch_size=10, use_cache=False)
+
+    print("Peak concurrent batches:", peak)
+    assert 1 < peak <= 4
+    # Results come back in input order however the batches finished
+    assert vectors[:, 0].tolist() == [float(i + 1) for i in range(100)]
+
+
+@patch("embedding_utils.backoff_delay", return_value=0)
+@patch("embedding_utils.genai")
+def test_retry_and_resume(mock_genai, mock_backoff):
+    # Two throttled responses, then success
+    responses = [api_exceptions.ResourceExhausted("quota"), api_exceptions.ResourceExhausted("quota")]
+
+    def flaky_embed(**kwargs):
+        if responses:
+            raise responses.pop(0)
+        return fake_embed_content(**kwargs)
+
+    mock_genai.embed_content.side_effect = flaky_embed
+    retries = metrics.counter("embedding_retries_total").value
+    vectors = embed_texts(["a", "bb"], model="models/test-retry", use_cache=False)
+    assert vectors.shape == (2, 3)
+    assert metrics.counter("embedding_retries_total").value == retries + 2
+
+    test_dir = "test_data_embedding_dispatch"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+    try:
+        cache = EmbeddingCache(os.path.join(test_dir, "cache.sqlite"))
+        texts = [f"text {i}" for i in range(40)]
+
+        def failing_embed(**kwargs):
+            # A non-retryable error in the batch holding "text 35"
+            if "text 35" in kwargs["content"]:
+                raise ValueError("bad request")
+            return fake_embed_content(**kwargs)
+
+        mock_genai.embed_content.side_effect = failing_embed
+        with patch.dict(os.environ, {"EMBED_CONCURRENCY": "1"}):
+            try:
+                embed_texts(texts, model="models/test-resume", batch_size=10, cache=cache)
+                assert False, "expected the failing batch to raise"
+            except ValueError:
+                pass
+
+            # Completed batches were checkpointed; the rerun only sends the rest
+            mock_genai.embed_content.reset_mock()
+            mock_genai.embed_content.side_effect = fake_embed_content
+            vectors = embed_texts(texts, model="models/test-resume", batch_size=10, cache=cache)
+        sent = [t for call in mock_genai.embed_content.call_args_list for t in call.kwargs["content"]]
+        print("Re-sent after resume:", sent)
+        assert vectors.shape == (40, 3)
+        assert "text 0" not in sent and "text 35" in sent
+        cache.close()
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_token_bucket_and_batch_size()
+    test_concurrent_dispatch()
+    test_retry_and_resume()
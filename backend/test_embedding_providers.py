@@ -0,0 +1,81 @@
+import os
+import shutil
+import time
+import numpy as np
+from unittest.mock import patch
+
+import embedding_providers
+from embedding_providers import (GeminiEmbeddingProvider, HashingEmbeddingProvider, get_embedding_provider,
+                                 set_embedding_provider)
+from faiss_utils import build_index, retrieve_chunks
+
+
+def test_hashing_provider():
+    provider = HashingEmbeddingProvider(dimension=256)
+    texts = ["How do I file a claim?", "Filing a claim online", "The storm damaged the roof"]
+    vectors = provider.embed_documents(texts)
+    assert vectors.shape == (3, 256) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.array_equal(provider.embed_queries(texts[:1])[0], vectors[0])
+    # Shared vocabulary scores higher than unrelated text
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+    assert provider.embed_documents([""]).shape == (1, 256)
+
+    # Large batches split across threads give the same result
+    many = [f"claim number {i} for policy {i % 7}" for i in range(1000)]
+    provider.parallel_threshold = 10
+    assert np.array_equal(provider.embed_documents(many), provider._encode(many))
+
+    timings = []
+    for _ in range(200):
+        start = time.perf_counter()
+        provider.embed_queries(["What documents are required for a claim?"])
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"Hashing query embedding: median {np.median(timings):.3f} ms")
+    assert np.median(timings) < 1.0
+
+
+@patch("embedding_providers.embed_texts")
+def test_gemini_provider_modes(mock_embed):
+    mock_embed.return_value = np.zeros((1, 3), dtype=np.float32)
+    provider = GeminiEmbeddingProvider()
+    provider.embed_documents(["chunk"])
+    assert mock_embed.call_args.kwargs["task_type"] == "retrieval_document"
+    provider.embed_queries(["question?"])
+    assert mock_embed.call_args.kwargs["task_type"] == "retrieval_query"
+
+
+def test_local_retrieval_without_api():
+    test_dir = "test_data_providers"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        with patch.dict(os.environ, {"EMBEDDING_PROVIDER": "hashing", "EMBEDDING_DIM": "128"}), \
+                patch.object(embedding_providers, "_provider", None):
+            provider = get_embedding_provider()
+            assert isinstance(provider, HashingEmbeddingProvider) and provider.dimension == 128
+
+            chunks = ["You can file a claim online or by phone.", "A deductible is paid before coverage starts.",
+                      "Add a driver in the My Policy section."]
+            build_index(chunks, provider.embed_documents(chunks), index_name="test", data_dir=test_dir)
+            assert retrieve_chunks("How do I add a driver?", index_name="test", data_dir=test_dir,
+                                   top_k=1) == [chunks[2]]
+
+            # An index built with another provider's dimension fails clearly
+            set_embedding_provider(HashingEmbeddingProvider(dimension=64))
+            try:
+                retrieve_chunks("q", index_name="test", data_dir=test_dir)
+                assert False, "expected a dimension mismatch"
+            except ValueError as e:
+                assert "re-ingest" in str(e)
+        print("Embedding provider verification successful!")
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_hashing_provider()
+    test_gemini_provider_modes()
+    test_local_retrieval_without_api()
@@ -3,9 +3,11 @@ import numpy as np
 from unittest.mock import MagicMock, patch
 
 from embedding_utils import embed_texts
+from gemini_client import get_client
 
+@patch("gemini_client.genai")
 @patch("embedding_utils.genai")
-def test_embeddings(mock_genai):
+def test_embeddings(mock_genai, mock_client_genai):
     texts = ["Hello world", "Another sentence"]
     print(f"Testing Gemini embedding for {len(texts)} texts...")
     
@@ -18,10 +20,11 @@ def test_embeddings(mock_genai):
     
     # Call function
     os.environ["GEMINI_API_KEY"] = "dummy-key"
-    vectors = embed_texts(texts, batch_size=2)
+    get_client().reset()
+    vectors = embed_texts(texts, batch_size=2, use_cache=False)
     
     # Verify configure called
-    mock_genai.configure.assert_called_with(api_key="dummy-key")
+    mock_client_genai.configure.assert_called_with(api_key="dummy-key")
     
     print("Function returned.")
     print(f"Shape: {vectors.shape}")
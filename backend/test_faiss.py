@@ -7,6 +7,9 @@ from unittest.mock import patch, MagicMock
 with patch("embedding_utils.embed_texts") as mock_embed:
     from faiss_utils import build_index, retrieve_chunks
 
+    # Queries are embedded through the provider, which may already have been
+    # imported with the real embed_texts bound, so patch the name it looks up.
+    @patch("embedding_providers.embed_texts", mock_embed)
     def test_faiss_logic():
         # Setup Data
         test_dir = "test_data"
@@ -0,0 +1,84 @@
+import os
+import shutil
+import numpy as np
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+from rag import RAGService
+from faiss_utils import index_registry, load_document_registry
+
+
+def read_fake_pdf(self, file_path):
+    # Test "PDFs" are plain text files (one page each) so no real parsing is needed
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield f.read()
+
+
+def write_doc(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+@patch("rag.RAGService.iter_pages", read_fake_pdf)
+@patch("embedding_providers.embed_texts")
+def test_incremental_ingest(mock_embed):
+    test_dir = "test_data_incremental"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    mock_embed.side_effect = lambda texts, **kwargs: np.random.rand(len(texts), 8).astype(np.float32)
+
+    service = RAGService()
+    service.data_dir = test_dir
+    service.index_name = "test"
+
+    try:
+        write_doc(os.path.join(test_dir, "a.pdf"), "alpha " * 300)
+        write_doc(os.path.join(test_dir, "b.pdf"), "bravo " * 300)
+
+        # 1. Initial sync indexes both documents
+        res = service.ingest_incremental()
+        print("Initial:", res)
+        assert sorted(res["added"]) == ["a.pdf", "b.pdf"]
+        total = res["chunks_created"]
+        assert mock_embed.call_count == 2
+
+        # 2. Nothing changed: no reads, no embedding calls
+        res = service.ingest_incremental()
+        assert sorted(res["unchanged"]) == ["a.pdf", "b.pdf"]
+        assert mock_embed.call_count == 2
+
+        # 3. Add one, change one, delete one
+        write_doc(os.path.join(test_dir, "c.pdf"), "charlie " * 10)
+        write_doc(os.path.join(test_dir, "a.pdf"), "alpha two " * 10)
+        os.remove(os.path.join(test_dir, "b.pdf"))
+
+        res = service.ingest_incremental()
+        print("Sync:", res)
+        assert res["added"] == ["c.pdf"]
+        assert res["updated"] == ["a.pdf"]
+        assert res["removed"] == ["b.pdf"]
+        # Only the two touched documents were embedded
+        assert mock_embed.call_count == 4
+
+        docs = load_document_registry("test", test_dir)["documents"]
+        assert sorted(docs) == ["a.pdf", "c.pdf"]
+
+        index, chunks = index_registry.get("test", test_dir)
+        live_ids = docs["a.pdf"]["ids"] + docs["c.pdf"]["ids"]
+        assert index.ntotal == len(live_ids) == len(chunks)
+        assert sorted(chunks.ids().tolist()) == sorted(live_ids)
+        assert all("bravo" not in c for c in chunks.texts())
+        # Each chunk remembers which document it came from
+        assert chunks.get_metadata(docs["c.pdf"]["ids"][0])["source"] == "c.pdf"
+        assert index.ntotal < total
+        print("Incremental ingest verification successful!")
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_incremental_ingest()
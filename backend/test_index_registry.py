@@ -0,0 +1,60 @@
+import os
+import shutil
+import time
+import numpy as np
+from unittest.mock import patch
+
+from faiss_utils import build_index, IndexRegistry
+
+
+def test_index_registry():
+    test_dir = "test_data_registry"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        chunks = ["Apple is a fruit", "Car is a vehicle"]
+        embeddings = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+        build_index(chunks, embeddings, index_name="test", data_dir=test_dir)
+
+        registry = IndexRegistry()
+
+        # First lookup loads from disk, later lookups are served from memory
+        with patch("faiss_utils.faiss.read_index", wraps=__import__("faiss").read_index) as mock_read:
+            index, loaded_chunks = registry.get("test", test_dir)
+            registry.get("test", test_dir)
+            registry.get("test", test_dir)
+            assert mock_read.call_count == 1
+
+        assert index.ntotal == 2
+        assert loaded_chunks.texts() == chunks
+        stats = registry.stats()
+        print("Stats after warm lookups:", stats)
+        assert stats["loads"] == 1
+        assert stats["hits"] == 2
+        assert stats["reloads"] == 0
+
+        # Rebuilding the index on disk is noticed and triggers a single reload
+        time.sleep(0.01)
+        new_chunks = chunks + ["Banana is yellow"]
+        new_embeddings = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 0.1]], dtype=np.float32)
+        build_index(new_chunks, new_embeddings, index_name="test", data_dir=test_dir)
+
+        index, loaded_chunks = registry.get("test", test_dir)
+        assert index.ntotal == 3
+        assert loaded_chunks.texts() == new_chunks
+        registry.get("test", test_dir)
+
+        stats = registry.stats()
+        print("Stats after rebuild:", stats)
+        assert stats["reloads"] == 1
+        assert stats["hits"] == 3
+        print("Registry verification successful!")
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_index_registry()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import numpy as np
+from unittest.mock import patch
+
+from faiss_utils import build_index, retrieve_chunks, choose_index_spec, parse_index_spec, index_registry, load_index_meta
+
+
+def test_choose_index_spec():
+    assert choose_index_spec(1_000, 768)["type"] == "flat"
+    assert choose_index_spec(500_000, 768)["type"] == "hnsw"
+    assert choose_index_spec(5_000_000, 768)["type"] == "ivf"
+    # 5M x 768 floats is ~15 GB; a 1 GB budget forces compression
+    spec = choose_index_spec(5_000_000, 768, memory_budget_mb=1024)
+    assert spec["type"] == "ivfpq"
+    assert 768 % spec["m"] == 0
+    assert parse_index_spec("hnsw:M=16,efSearch=32") == {"type": "hnsw", "M": 16, "efSearch": 32}
+    # Typos are rejected instead of silently falling back to defaults
+    try:
+        parse_index_spec("ivf:nprobes=16")
+        assert False, "expected an unknown parameter to be rejected"
+    except ValueError as e:
+        assert "nprobes" in str(e)
+
+
+@patch("embedding_providers.embed_texts")
+def test_index_types(mock_embed):
+    test_dir = "test_data_index_types"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        rng = np.random.default_rng(0)
+        embeddings = rng.random((2000, 16), dtype=np.float32)
+        chunks = [f"chunk {i}" for i in range(len(embeddings))]
+        # Query is an exact copy of chunk 42
+        mock_embed.return_value = embeddings[42:43]
+
+        for spec in ["flat", "ivf:nlist=32,nprobe=4", "hnsw:M=16,efSearch=48", "ivfpq:nlist=16,m=4"]:
+            build_index(chunks, embeddings, index_name="test", data_dir=test_dir, index_spec=spec)
+            meta = load_index_meta("test", test_dir)
+            print(spec, "->", meta)
+            assert meta["type"] == spec.split(":")[0]
+
+            index, _ = index_registry.get("test", test_dir)
+            if meta["type"] == "ivf":
+                # nprobe saved in the spec is restored on load
+                assert index.nprobe == 4
+            if meta["type"] == "hnsw":
+                assert index.hnsw.efSearch == 48
+
+            results = retrieve_chunks("q", index_name="test", data_dir=test_dir, top_k=5,
+                                      nprobe=8, ef_search=64)
+            assert len(results) == 5
+            if meta["type"] != "ivfpq":
+                assert results[0] == "chunk 42"
+        print("Index type verification successful!")
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_choose_index_spec()
+    test_index_types()
@@ -7,9 +7,12 @@ from unittest.mock import patch, MagicMock
 os.environ["OPENAI_API_KEY"] = "sk-dummy"
 
 from rag import rag_service
+from faiss_utils import snapshot_dir
+
+SAMPLE_PDF = os.path.join(rag_service.data_dir, "Insurance_FAQ.pdf")
 
 # Mock entire embedding call to return dummy vectors
-@patch("rag.embed_texts")
+@patch("embedding_providers.embed_texts")
 def test_ingest_flow(mock_embed):
     print("Testing full ingest flow...")
     
@@ -25,23 +28,35 @@ def test_ingest_flow(mock_embed):
         return np.random.rand(len(texts), 1536).astype(np.float32)
         
     mock_embed.side_effect = side_effect
-    
-    # 2. Run Ingest
-    res = rag_service.ingest_pdf("Insurance_FAQ.pdf")
-    print("Ingest Result:", res)
-    
-    if "error" in res:
-        print("Ingest failed:", res["error"])
-    else:
-        assert res["status"] == "success"
-        assert res["chunks_created"] > 0
-        print("Ingest successful.")
-        
-        # Check if files created
-        data_dir = rag_service.data_dir
-        assert os.path.exists(os.path.join(data_dir, "faiss_index.index"))
-        assert os.path.exists(os.path.join(data_dir, "faiss_index.pkl"))
-        print("Index files verified.")
+
+    # Ingest a copy, so the real index in data/ is left alone
+    test_dir = "test_data_ingest"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+    if os.path.exists(SAMPLE_PDF):
+        shutil.copy(SAMPLE_PDF, test_dir)
+
+    try:
+        # 2. Run Ingest
+        with patch.object(rag_service, "data_dir", test_dir):
+            res = rag_service.ingest_pdf("Insurance_FAQ.pdf")
+        print("Ingest Result:", res)
+
+        if "error" in res:
+            print("Ingest failed:", res["error"])
+        else:
+            assert res["status"] == "success"
+            assert res["chunks_created"] > 0
+            print("Ingest successful.")
+
+            # Check if files created
+            data_dir = snapshot_dir("faiss_index", test_dir)
+            assert os.path.exists(os.path.join(data_dir, "faiss_index.index"))
+            assert os.path.exists(os.path.join(data_dir, "faiss_index.chunks"))
+            print("Index files verified.")
+    finally:
+        shutil.rmtree(test_dir)
 
 if __name__ == "__main__":
     test_ingest_flow()
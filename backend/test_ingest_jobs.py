@@ -0,0 +1,218 @@
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+import ingest_jobs
+from faiss_utils import current_snapshot, retrieve_chunks
+from ingest_jobs import JobQueue, foreground
+from rag import rag_service
+
+
+def read_fake_pdf(self, file_path):
+    # Test "PDFs" are plain text files, one page per form feed
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield from f.read().split("\f")
+
+
+def write_document(test_dir, pages=3, words=600):
+    with open(os.path.join(test_dir, "Insurance_FAQ.pdf"), "w", encoding="utf-8") as f:
+        f.write("\f".join(" ".join(f"p{p}w{i}" for i in range(words)) for p in range(pages)))
+
+
+def wait_for(queue, job_id, statuses=("succeeded", "failed", "cancelled"), timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def fresh_dir(test_dir):
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+
+@patch("rag.RAGService.iter_pages", read_fake_pdf)
+@patch("embedding_providers.embed_texts")
+def test_jobs_run_by_priority_with_progress(mock_embed):
+    test_dir = "test_data_ingest_jobs"
+    fresh_dir(test_dir)
+    mock_embed.side_effect = lambda texts, **kwargs: np.random.rand(len(texts), 8).astype(np.float32)
+
+    try:
+        write_document(test_dir)
+        queue = JobQueue(path=os.path.join(test_dir, "jobs.sqlite"))
+        low = queue.submit("incremental")
+        high = queue.submit("full", priority=5)
+        dropped = queue.submit("full")
+        assert queue.cancel(dropped["id"])["status"] == "cancelled"
+        try:
+            queue.submit("everything")
+            assert False, "expected an unknown mode to be rejected"
+        except ValueError:
+            pass
+
+        with patch.object(rag_service, "data_dir", test_dir), patch.object(rag_service, "index_name", "test"):
+            first = queue._claim()
+            assert first["id"] == high["id"]
+            job = queue.run(first)
+            second = queue._claim()
+            assert second["id"] == low["id"]
+            queue.run(second)
+            assert queue._claim() is None
+
+        print("Job:", job)
+        assert job["status"] == "succeeded" and job["result"]["chunks_created"] > 0
+        assert job["progress"]["pages"] == 3
+        assert job["progress"]["chunks"] == job["progress"]["embeddings"] == job["result"]["chunks_created"]
+        assert [j["status"] for j in queue.list()] == ["cancelled", "succeeded", "succeeded"]
+        assert [j["id"] for j in queue.list(status="cancelled")] == [dropped["id"]]
+    finally:
+        shutil.rmtree(test_dir)
+
+
+@patch("rag.RAGService.iter_pages", read_fake_pdf)
+@patch("embedding_providers.embed_texts")
+def test_cancel_running_job(mock_embed):
+    test_dir = "test_data_ingest_jobs_cancel"
+    fresh_dir(test_dir)
+    release = threading.Event()
+
+    def slow_embed(texts, **kwargs):
+        release.wait(5)
+        return np.random.rand(len(texts), 8).astype(np.float32)
+
+    mock_embed.side_effect = slow_embed
+    queue = JobQueue(path=os.path.join(test_dir, "jobs.sqlite"))
+    try:
+        # Enough text for several embedding batches
+        write_document(test_dir, pages=20, words=2000)
+        with patch.object(rag_service, "data_dir", test_dir), patch.object(rag_service, "index_name", "test"):
+            queue.start()
+            job = queue.submit("full")
+            assert wait_for(queue, job["id"], statuses=("running",))["status"] == "running"
+            queue.cancel(job["id"])
+            release.set()
+            job = wait_for(queue, job["id"])
+        print("Cancelled job:", job)
+        assert job["status"] == "cancelled" and job["result"] is None
+        # It stopped after the first embedding batch
+        assert job["progress"]["embeddings"] == 100
+        # Nothing was published
+        assert current_snapshot("test", test_dir) is None
+    finally:
+        release.set()
+        queue.stop()
+        shutil.rmtree(test_dir)
+
+
+def test_one_running_job_per_collection():
+    test_dir = "test_data_ingest_jobs_claim"
+    fresh_dir(test_dir)
+    try:
+        path = os.path.join(test_dir, "jobs.sqlite")
+        # Two queues on one file stand in for two server processes
+        first, second = JobQueue(path=path), JobQueue(path=path)
+        default_a = first.submit("incremental")
+        default_b = first.submit("full")
+        acme = first.submit("incremental", collection="acme")
+
+        assert first._claim()["id"] == default_a["id"]
+        # The other default job waits for the running one, in any process
+        assert second._claim()["id"] == acme["id"]
+        assert second._claim() is None and first._claim() is None
+
+        first._finish(default_a["id"], "succeeded", {})
+        assert second._claim()["id"] == default_b["id"]
+    finally:
+        shutil.rmtree(test_dir)
+
+
+def test_recover_job_of_crashed_process_with_same_pid():
+    test_dir = "test_data_ingest_jobs_recover"
+    fresh_dir(test_dir)
+    try:
+        queue = JobQueue(path=os.path.join(test_dir, "jobs.sqlite"))
+        orphan = queue.submit("full")
+        live = queue.submit("full", collection="acme")
+        # Left running by a crashed server that had this process's pid
+        queue._execute("UPDATE jobs SET status = 'running', pid = ? WHERE id = ?", (os.getpid(), orphan["id"]))
+        assert queue._claim()["id"] == live["id"]
+
+        queue._recover()
+        assert queue.get(orphan["id"])["status"] == "queued"
+        # Jobs this process claimed itself stay running
+        assert queue.get(live["id"])["status"] == "running"
+        assert queue._claim()["id"] == orphan["id"]
+    finally:
+        shutil.rmtree(test_dir)
+
+
+def test_throttle():
+    test_dir = "test_data_ingest_jobs_throttle"
+    fresh_dir(test_dir)
+    try:
+        queue = JobQueue(path=os.path.join(test_dir, "jobs.sqlite"), chunks_per_sec=1000, yield_ms=100)
+        started = time.perf_counter()
+        queue._throttle(embedded=100, elapsed=0)
+        assert time.perf_counter() - started >= 0.09
+
+        # Ingest gives way to chat requests in flight, but only for a while
+        started = time.perf_counter()
+        with foreground():
+            queue._throttle(embedded=0, elapsed=0)
+        waited = time.perf_counter() - started
+        print(f"Yielded {waited * 1000:.0f} ms to a chat request")
+        assert 0.09 <= waited < 0.5
+        started = time.perf_counter()
+        queue._throttle(embedded=0, elapsed=0)
+        assert time.perf_counter() - started < 0.05
+    finally:
+        shutil.rmtree(test_dir)
+
+
+@patch("rag.RAGService.iter_pages", read_fake_pdf)
+@patch("embedding_providers.embed_texts")
+def test_ingest_endpoints(mock_embed):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    test_dir = "test_data_ingest_jobs_http"
+    fresh_dir(test_dir)
+    mock_embed.side_effect = lambda texts, **kwargs: np.ones((len(texts), 8), dtype=np.float32)
+    queue = JobQueue(path=os.path.join(test_dir, "jobs.sqlite"))
+
+    try:
+        write_document(test_dir, pages=1, words=50)
+        with patch.object(ingest_jobs, "_queue", queue), patch.object(rag_service, "data_dir", test_dir), \
+                patch.object(rag_service, "index_name", "test"), TestClient(app) as http:
+            submitted = http.post("/ingest").json()
+            assert submitted["status"] in ("queued", "running")
+            job = wait_for(queue, submitted["id"])
+            assert http.get(f"/ingest/jobs/{job['id']}").json()["status"] == "succeeded"
+            assert [j["id"] for j in http.get("/ingest/jobs").json()["jobs"]] == [job["id"]]
+            assert "error" in http.get("/ingest/jobs/missing").json()
+            assert "error" in http.post("/ingest?mode=everything").json()
+            assert "error" in http.post("/ingest?collection=../etc").json()
+            assert retrieve_chunks("q", index_name="test", data_dir=test_dir)
+        print("Ingest job endpoints verification successful!")
+    finally:
+        queue.stop()
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_jobs_run_by_priority_with_progress()
+    test_cancel_running_job()
+    test_one_running_job_per_collection()
+    test_recover_job_of_crashed_process_with_same_pid()
+    test_throttle()
+    test_ingest_endpoints()
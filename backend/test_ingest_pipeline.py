@@ -0,0 +1,66 @@
+import random
+import time
+import numpy as np
+
+from rag import rag_service
+from ingest_pipeline import StageError, iter_chunks, iter_embedded_batches
+
+
+def test_streaming_chunker():
+    # 200 "pages" of numbered words; a word may straddle a page boundary
+    words = [f"w{i}" for i in range(20000)]
+    text = " ".join(words)
+    pages = [text[i : i + 700] for i in range(0, len(text), 700)]
+
+    streamed = list(iter_chunks(iter(pages), rag_service.chunk_text))
+    full = rag_service.chunk_text(text)
+    print(f"Streamed {len(streamed)} chunks, full-text split {len(full)} chunks")
+
+    assert all(len(c) <= 1000 for c in streamed)
+    # Every word is covered and chunk count matches the one-shot split closely
+    covered = set(" ".join(streamed).split())
+    assert set(words) <= covered
+    assert abs(len(streamed) - len(full)) <= len(full) * 0.05
+    # Consecutive chunks still overlap across page boundaries
+    for a, b in zip(streamed, streamed[1:]):
+        assert a.split()[-1] in b
+
+
+def test_pipeline_order_and_errors():
+    chunks = [f"chunk {i}" for i in range(1000)]
+
+    def slow_embed(batch):
+        time.sleep(random.random() * 0.01)
+        return np.array([[float(c.split()[1])] for c in batch], dtype=np.float32)
+
+    out_chunks, out_vectors = [], []
+    for batch, vectors in iter_embedded_batches(iter(chunks), slow_embed, batch_size=7, embed_workers=4, queue_size=2):
+        out_chunks.extend(batch)
+        out_vectors.append(vectors)
+    assert out_chunks == chunks
+    assert np.concatenate(out_vectors)[:, 0].tolist() == list(range(1000))
+
+    def failing_embed(batch):
+        raise RuntimeError("quota exceeded")
+
+    try:
+        list(iter_embedded_batches(iter(chunks), failing_embed, batch_size=10))
+        assert False, "expected StageError"
+    except StageError as e:
+        assert e.stage == "embed"
+
+    def bad_pages():
+        yield "page one"
+        raise ValueError("corrupt page")
+
+    try:
+        list(iter_embedded_batches(iter_chunks(bad_pages(), rag_service.chunk_text), slow_embed))
+        assert False, "expected StageError"
+    except StageError as e:
+        assert e.stage == "read"
+    print("Pipeline verification successful!")
+
+
+if __name__ == "__main__":
+    test_streaming_chunker()
+    test_pipeline_order_and_errors()
@@ -0,0 +1,77 @@
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+import metrics
+from rag import rag_service
+
+
+def test_spans_and_prometheus_export():
+    with metrics.request_timings() as timings:
+        with metrics.span("test_stage", "A test stage"):
+            pass
+        with metrics.span("test_shared_stage", request=False):
+            pass
+    # Only request-scoped spans are listed for the request
+    assert [name for name, _ in timings] == ["test_stage"]
+    assert metrics.histogram("test_stage_ms").count >= 1
+    assert metrics.server_timing_header([("a", 1.25), ("b", 3)]) == "a;dur=1.2, b;dur=3.0"
+
+    # Outside a request, spans still feed the histograms
+    with metrics.span("test_stage"):
+        pass
+
+    metrics.counter("test_events_total", "Test events").inc(3)
+    text = metrics.render_prometheus()
+    print(text)
+    assert "# TYPE test_events_total counter" in text
+    assert "# TYPE test_stage_ms histogram" in text
+    assert 'test_stage_ms_bucket{le="+Inf"}' in text
+    assert "test_stage_ms_count" in text
+
+
+def test_answer_question_reports_retrieval_errors():
+    with patch("rag.retrieve_chunks", side_effect=FileNotFoundError("no index")):
+        assert rag_service.answer_question("q") == "System is not ready. Please ingest a PDF first."
+
+    # Anything else is surfaced instead of being reported as a missing index
+    before = metrics.counter("chat_retrieval_errors_total").value
+    with patch("rag.retrieve_chunks", side_effect=RuntimeError("quota exceeded")):
+        answer = rag_service.answer_question("q")
+    print("Answer:", answer)
+    assert "quota exceeded" in answer
+    assert metrics.counter("chat_retrieval_errors_total").value == before + 1
+
+
+def test_metrics_endpoint_and_server_timing():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = MagicMock()
+    client.agenerate = AsyncMock(return_value="The deductible is $500.")
+
+    with TestClient(app) as http, patch("main.SERVER_TIMING_ENABLED", True), \
+            patch("rag.get_client", return_value=client), patch("rag.index_version", return_value=None), \
+            patch("rag.aretrieve_chunks", AsyncMock(return_value=["Deductible is $500."])):
+        response = http.post("/chat", json={"message": "What is the deductible?"})
+        assert response.json()["response"] == "The deductible is $500."
+        header = response.headers["server-timing"]
+        print("Server-Timing:", header)
+        for stage in ("chat_cache_lookup", "chat_retrieve", "chat_prompt", "chat_generate", "total"):
+            assert f"{stage};dur=" in header
+
+        response = http.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "chat_generate_ms_bucket" in response.text
+
+    with TestClient(app) as http, patch("main.SERVER_TIMING_ENABLED", False):
+        assert "server-timing" not in http.get("/").headers
+    print("Metrics verification successful!")
+
+
+if __name__ == "__main__":
+    test_spans_and_prometheus_export()
+    test_answer_question_reports_retrieval_errors()
+    test_metrics_endpoint_and_server_timing()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import numpy as np
+
+import metrics
+from faiss_utils import IndexRegistry, build_index, update_index
+
+
+def test_mmap_registry():
+    test_dir = "test_data_mmap"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        rng = np.random.default_rng(0)
+        embeddings = rng.random((500, 16), dtype=np.float32)
+        chunks = [f"chunk {i}" for i in range(500)]
+
+        for spec in ["flat", "ivf:nlist=8", "hnsw:M=8"]:
+            build_index(chunks, embeddings, index_name="test", data_dir=test_dir, index_spec=spec)
+            in_memory = IndexRegistry("memory")
+            mapped = IndexRegistry("mmap")
+            index_a, _ = in_memory.get("test", test_dir)
+            index_b, store = mapped.get("test", test_dir)
+            _, expected = index_a.search(embeddings[:5], 3)
+            _, got = index_b.search(embeddings[:5], 3)
+            assert np.array_equal(expected, got), spec
+            assert mapped.stats()["load_mode"] == "mmap"
+
+        # A mapped reader survives the index being republished underneath it
+        # and picks the new version up on its next lookup.
+        build_index(chunks[:100], embeddings[:100], index_name="test", data_dir=test_dir)
+        index_b.search(embeddings[:5], 3)
+        index_c, _ = mapped.get("test", test_dir)
+        assert index_c.ntotal == 100
+        assert mapped.stats()["reloads"] >= 1
+
+        # Incremental updates never touch a mapped index in place
+        upserts = {"a.pdf": {"hash": "h", "chunks": chunks[:10], "embeddings": embeddings[:10]}}
+        update_index(upserts, [], index_name="inc", data_dir=test_dir)
+        index_d, _ = mapped.get("inc", test_dir)
+        update_index({"b.pdf": {"hash": "h2", "chunks": chunks[10:20], "embeddings": embeddings[10:20]}},
+                     ["a.pdf"], index_name="inc", data_dir=test_dir)
+        assert index_d.ntotal == 10
+        assert mapped.get("inc", test_dir)[0].ntotal == 10
+
+        try:
+            IndexRegistry("bogus")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+        memory = metrics.process_memory()
+        print("Process memory:", memory)
+        assert memory["pid"] == os.getpid()
+    finally:
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_mmap_registry()
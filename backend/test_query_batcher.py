@@ -0,0 +1,66 @@
+import asyncio
+import numpy as np
+from unittest.mock import patch
+
+import metrics
+from faiss_utils import aretrieve_chunks
+from query_batcher import QueryBatcher
+
+
+def test_concurrent_queries_are_batched():
+    embed_calls = []
+    search_rows = []
+
+    async def fake_aembed(texts, **kwargs):
+        embed_calls.append(list(texts))
+        return np.array([[float(t.split()[1])] for t in texts], dtype=np.float32)
+
+    def fake_search(query_vectors, index_name, data_dir, top_k, nprobe, ef_search):
+        search_rows.append(len(query_vectors))
+        return [[f"answer {int(v[0])}"] for v in query_vectors]
+
+    async def run():
+        return await asyncio.gather(*[aretrieve_chunks(f"question {i}", index_name="test", data_dir="unused")
+                                      for i in range(20)])
+
+    batches_before = metrics.histogram("query_batch_size").count
+    with patch("embedding_providers.aembed_texts", fake_aembed), patch("faiss_utils.search_chunks", fake_search):
+        results = asyncio.run(run())
+
+    # Each caller gets its own result back
+    assert results == [[f"answer {i}"] for i in range(20)]
+    # ...but the embedding API and FAISS were each hit once for all 20
+    assert len(embed_calls) == 1 and len(embed_calls[0]) == 20
+    assert search_rows == [20]
+    assert metrics.histogram("query_batch_size").count == batches_before + 1
+    print("Batch metrics:", metrics.histogram("query_batch_size").snapshot())
+
+
+def test_batcher_limits_and_errors():
+    calls = []
+
+    async def process(key, items):
+        calls.append((key, len(items)))
+        if key == "bad":
+            raise ValueError("upstream failed")
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = QueryBatcher(process, window_ms=50, max_batch=4, name="test_batch")
+        good = asyncio.gather(*[batcher.submit("a", i) for i in range(10)])
+        other = batcher.submit("b", 100)
+        bad = asyncio.gather(*[batcher.submit("bad", i) for i in range(2)], return_exceptions=True)
+        return await good, await other, await bad
+
+    good, other, bad = asyncio.run(run())
+    assert good == [i * 2 for i in range(10)]
+    assert other == 200
+    assert all(isinstance(e, ValueError) for e in bad)
+    # max_batch splits the 10 "a" requests; keys are never mixed
+    assert sorted(n for key, n in calls if key == "a") == [2, 4, 4]
+    assert ("b", 1) in calls
+
+
+if __name__ == "__main__":
+    test_concurrent_queries_are_batched()
+    test_batcher_limits_and_errors()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import time
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+import embedding_providers
+import faiss_utils
+from embedding_providers import HashingEmbeddingProvider
+from faiss_utils import build_index, retrieve_chunks, search_queries
+from rag import rag_service
+
+TOPICS = ["storm damage", "flood cover", "theft claims", "car rental", "deductible", "premium refund"]
+
+
+def build_test_index(test_dir, n=3000, index_spec=None):
+    chunks = [f"clause {i} about {TOPICS[i % len(TOPICS)]} and section {i // 7}" for i in range(n)]
+    metadata = [{"source": f"policy{i % 3}.pdf", "page": i // 40} for i in range(n)]
+    vectors = embedding_providers.get_embedding_provider().embed_documents(chunks)
+    build_index(chunks, vectors, index_name="test", data_dir=test_dir, index_spec=index_spec, metadata=metadata)
+
+
+def fresh_dir(test_dir):
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+
+def test_search_pages_and_thresholds():
+    test_dir = "test_data_search"
+    fresh_dir(test_dir)
+    try:
+        with patch.object(embedding_providers, "_provider", HashingEmbeddingProvider(dimension=64)):
+            build_test_index(test_dir)
+
+            [single] = search_queries("storm damage", index_name="test", data_dir=test_dir, top_k=5)
+            assert single["query"] == "storm damage" and len(single["hits"]) == 5
+            assert single["hits"] == sorted(single["hits"], key=lambda h: h["distance"])
+            assert {"id", "text", "distance", "metadata", "rank"} <= set(single["hits"][0])
+            assert single["hits"][0]["metadata"]["source"].startswith("policy")
+            found = retrieve_chunks("storm damage", index_name="test", data_dir=test_dir, top_k=5, details=True)
+            assert [h["id"] for h in single["hits"]] == [h["id"] for h in found]
+
+            # Pages line up with one deeper search
+            deep = search_queries("flood cover", index_name="test", data_dir=test_dir, top_k=20)[0]["hits"]
+            page = search_queries("flood cover", index_name="test", data_dir=test_dir, top_k=10, offset=10)[0]
+            assert [h["id"] for h in page["hits"]] == [h["id"] for h in deep[10:]]
+            assert [h["rank"] for h in page["hits"]] == list(range(10, 20)) and page["next_offset"] == 20
+            last = search_queries("flood cover", index_name="test", data_dir=test_dir, top_k=10, offset=2995)[0]
+            assert len(last["hits"]) == 5 and last["next_offset"] is None
+
+            # Hits beyond the threshold are dropped and end the pages
+            cutoff = sorted({h["distance"] for h in deep})[-2]
+            near = search_queries("flood cover", index_name="test", data_dir=test_dir, top_k=20,
+                                  max_distance=cutoff)[0]
+            assert all(h["distance"] <= cutoff for h in near["hits"]) and 0 < len(near["hits"]) < 20
+            assert near["next_offset"] is None
+
+            ids_only = search_queries("theft", index_name="test", data_dir=test_dir, include_text=False)[0]
+            assert "text" not in ids_only["hits"][0] and "metadata" in ids_only["hits"][0]
+        print("Search verification successful!")
+    finally:
+        shutil.rmtree(test_dir)
+
+
+def test_batch_is_one_search():
+    test_dir = "test_data_search_batch"
+    fresh_dir(test_dir)
+    try:
+        with patch.object(embedding_providers, "_provider", HashingEmbeddingProvider(dimension=64)):
+            build_test_index(test_dir, n=20000, index_spec="flat")
+            queries = [f"{TOPICS[i % len(TOPICS)]} section {i}" for i in range(2000)]
+            search_queries(queries[:1], index_name="test", data_dir=test_dir)
+
+            with patch.object(faiss_utils, "_search_ids", wraps=faiss_utils._search_ids) as search:
+                started = time.perf_counter()
+                results = search_queries(queries, index_name="test", data_dir=test_dir, top_k=10)
+                elapsed = time.perf_counter() - started
+            print(f"{len(queries)} queries over 20000 chunks in {elapsed * 1000:.0f} ms")
+            assert search.call_count == 1
+            assert len(results) == len(queries) and all(len(r["hits"]) == 10 for r in results)
+            assert elapsed < 10
+
+            # Batched results match searching each query on its own (ties may come back in either order)
+            for i in (0, 999, 1999):
+                alone = search_queries(queries[i], index_name="test", data_dir=test_dir, top_k=10)[0]
+                assert alone["hits"][0]["id"] == results[i]["hits"][0]["id"]
+                assert [round(h["distance"], 4) for h in alone["hits"]] == \
+                    [round(h["distance"], 4) for h in results[i]["hits"]]
+    finally:
+        shutil.rmtree(test_dir)
+
+
+def test_search_endpoint():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    test_dir = "test_data_search_http"
+    fresh_dir(test_dir)
+    try:
+        with patch.object(embedding_providers, "_provider", HashingEmbeddingProvider(dimension=64)), \
+                patch.object(rag_service, "data_dir", test_dir), patch.object(rag_service, "index_name", "test"), \
+                patch("rag.get_client") as get_client, TestClient(app) as http:
+            assert "error" in http.post("/search", json={"query": "storm"}).json()
+            build_test_index(test_dir, n=200)
+
+            body = http.post("/search", json={"query": "storm damage", "top_k": 4}).json()
+            assert len(body["results"]) == 1 and len(body["results"][0]["hits"]) == 4
+            body = http.post("/search", json={"queries": ["storm", "flood", "theft"], "offset": 2,
+                                              "include_text": False}).json()
+            assert [r["query"] for r in body["results"]] == ["storm", "flood", "theft"]
+            assert body["results"][0]["hits"][0]["rank"] == 2
+            print("Search response:", body["took_ms"], "ms")
+            assert "error" in http.post("/search", json={}).json()
+            assert "error" in http.post("/search", json={"query": "a", "queries": ["b"]}).json()
+            assert http.post("/search", json={"query": "a", "top_k": 0}).status_code == 422
+            # No generation on this path
+            get_client.return_value.generate.assert_not_called()
+            get_client.return_value.agenerate.assert_not_called()
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_search_pages_and_thresholds()
+    test_batch_is_one_search()
+    test_search_endpoint()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from unittest.mock import patch
+
+from faiss_utils import (IndexRegistry, build_index, current_snapshot, gc_snapshots, index_registry, list_snapshots,
+                         search_chunks, update_index)
+
+
+def generation(gen, n=50, dim=8):
+    # Every chunk names its generation; vector i points at chunk i
+    rng = np.random.default_rng(gen)
+    return [f"gen {gen} chunk {i}" for i in range(n + gen)], rng.random((n + gen, dim), dtype=np.float32)
+
+
+def test_publish_and_retention():
+    test_dir = "test_data_snapshots"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        for gen in range(3):
+            build_index(*generation(gen), index_name="test", data_dir=test_dir)
+        # Recently superseded versions are kept through the grace period
+        assert list_snapshots("test", test_dir) == ["v000001", "v000002", "v000003"]
+        assert current_snapshot("test", test_dir) == "v000003"
+        assert gc_snapshots("test", test_dir, retain=1) == []
+        assert gc_snapshots("test", test_dir, retain=2, min_age_s=0) == ["v000001"]
+
+        # A reader keeps the version it started with
+        registry = IndexRegistry()
+        entry = registry.get_entry("test", test_dir)
+        update_index({"a.pdf": {"hash": "h", "chunks": ["only"], "embeddings": np.ones((1, 8), np.float32)}}, [],
+                     index_name="test", data_dir=test_dir)
+        assert entry["version"] == "v000003" and entry["index"].ntotal == 52
+        assert entry["chunks"].get(0) == "gen 2 chunk 0"
+        assert registry.get_entry("test", test_dir)["version"] == "v000004"
+        print("Snapshots:", list_snapshots("test", test_dir))
+    finally:
+        shutil.rmtree(test_dir)
+
+
+def test_republish_under_load():
+    test_dir = "test_data_snapshots_load"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    errors = []
+    mixed = []
+    searches = 0
+    stop = threading.Event()
+    chunks, vectors = generation(0)
+    build_index(chunks, vectors, index_name="test", data_dir=test_dir)
+    index_registry.get_entry("test", test_dir)
+
+    def reader():
+        nonlocal searches
+        query = np.random.default_rng(99).random((1, 8), dtype=np.float32)
+        while not stop.is_set():
+            try:
+                results = search_chunks(query, index_name="test", data_dir=test_dir, top_k=5)[0]
+            except Exception as e:
+                errors.append(e)
+                continue
+            searches += 1
+            # Every result of one search comes from the same snapshot
+            if len({r.split()[1] for r in results}) != 1:
+                mixed.append(results)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    try:
+        with patch.dict(os.environ, {"INDEX_RETAIN_VERSIONS": "1", "INDEX_RETAIN_SECONDS": "0"}):
+            for t in threads:
+                t.start()
+            for gen in range(1, 21):
+                build_index(*generation(gen), index_name="test", data_dir=test_dir, index_spec="hnsw:M=8")
+        time.sleep(0.05)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        index_registry.invalidate("test", test_dir)
+        shutil.rmtree(test_dir)
+
+    print(f"{searches} searches during 20 publishes; errors: {errors[:3]}, mixed: {mixed[:1]}")
+    assert searches > 0 and not errors and not mixed
+
+
+def test_old_version_served_while_new_loads():
+    test_dir = "test_data_snapshots_swap"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    try:
+        build_index(*generation(0), index_name="test", data_dir=test_dir)
+        registry = IndexRegistry()
+        old = registry.get_entry("test", test_dir)
+        build_index(*generation(1), index_name="test", data_dir=test_dir)
+
+        release = threading.Event()
+        read_index = registry._read_index
+
+        def slow_read(index_path):
+            release.wait(5)
+            return read_index(index_path)
+
+        with patch.object(registry, "_read_index", slow_read):
+            loader = threading.Thread(target=registry.get_entry, args=("test", test_dir))
+            loader.start()
+            time.sleep(0.05)
+            started = time.perf_counter()
+            served = registry.get_entry("test", test_dir)
+            elapsed = time.perf_counter() - started
+            release.set()
+            loader.join()
+        assert served is old and elapsed < 0.5
+        assert registry.get_entry("test", test_dir)["version"] == "v000002"
+        assert registry.stats()["stale_hits"] == 1
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    test_publish_and_retention()
+    test_republish_under_load()
+    test_old_version_served_while_new_loads()
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "sk-dummy"
+
+import embedding_providers
+from embedding_providers import HashingEmbeddingProvider
+from faiss_utils import build_index, index_registry
+from rag import RAGService, rag_service
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Only needed to ingest or to call Gemini; a query worker imports them lazily
+INGEST_OR_GEMINI_MODULES = ["pypdf", "langchain_text_splitters", "ingest_pipeline", "google.generativeai",
+                            "google.api_core", "multiprocessing"]
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+main_ms = (time.perf_counter() - started) * 1000
+import rag
+total_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({"main_ms": main_ms, "total_ms": total_ms,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def test_import_time():
+    env = dict(os.environ, EMBEDDING_PROVIDER="hashing")
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE % INGEST_OR_GEMINI_MODULES], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, timeout=120, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    print(f"Import: main {result['main_ms']:.0f} ms, main + rag {result['total_ms']:.0f} ms")
+    assert result["loaded"] == []
+    assert result["total_ms"] < 5000
+
+
+def test_warmup_and_ready():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    test_dir = "test_data_startup"
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+    os.makedirs(test_dir)
+
+    release = threading.Event()
+    warmup = RAGService.warmup
+
+    def gated_warmup(self):
+        release.wait(5)
+        return warmup(self)
+
+    try:
+        with patch.object(embedding_providers, "_provider", HashingEmbeddingProvider(dimension=32)):
+            chunks = [f"clause {i}" for i in range(500)]
+            build_index(chunks, embedding_providers.get_embedding_provider().embed_documents(chunks),
+                        index_name="test", data_dir=test_dir)
+            index_registry.invalidate("test", test_dir)
+
+            with patch.object(rag_service, "data_dir", test_dir), patch.object(rag_service, "index_name", "test"), \
+                    patch.object(RAGService, "warmup", gated_warmup), \
+                    patch.dict(os.environ, {"WARMUP": "1", "INGEST_WORKERS": "0"}), TestClient(app) as http:
+                # Up, but not ready until warm
+                assert http.get("/").status_code == 200
+                assert http.get("/ready").status_code == 503
+                loads = index_registry.stats()["loads"]
+                release.set()
+                deadline = time.time() + 10
+                while http.get("/ready").status_code != 200 and time.time() < deadline:
+                    time.sleep(0.02)
+                body = http.get("/ready").json()
+                print("Ready:", body)
+                assert body["ready"] and body["warmup"]["index_version"] == "v000001"
+                assert body["startup_ms"] > 0 and "search_ms" in body["warmup"]
+                # The first search finds the index already loaded
+                assert index_registry.stats()["loads"] == loads + 1
+                assert http.post("/search", json={"query": "clause 7"}).json()["results"][0]["hits"]
+                assert index_registry.stats()["loads"] == loads + 1
+
+        # Nothing ingested yet: warm what there is and report ready
+        empty = RAGService()
+        empty.data_dir = os.path.join(test_dir, "empty")
+        assert empty.warmup()["index_version"] is None
+    finally:
+        release.set()
+        shutil.rmtree(test_dir)
+
+
+def test_failed_warmup_still_gets_ready():
+    import asyncio
+    import main
+
+    calls = []
+
+    def flaky_warmup(self):
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("embedding API unavailable")
+        return {"index_version": "v000001"}
+
+    def failing_warmup(self):
+        calls.append(1)
+        raise RuntimeError("quota exceeded")
+
+    def corrupt_warmup(self):
+        raise FileNotFoundError("test.chunks")
+
+    env = {"WARMUP": "1", "WARMUP_ATTEMPTS": "3", "WARMUP_BACKOFF_S": "0.01"}
+    with patch.dict(os.environ, env), patch.dict(main.startup_state, ready=False, error=None, warmup=None):
+        # Retried with backoff until it succeeds
+        with patch.object(RAGService, "warmup", flaky_warmup):
+            asyncio.run(main.warm_up())
+        assert len(calls) == 3
+        assert main.startup_state["ready"] and main.startup_state["error"] is None
+        assert main.startup_state["warmup"]["index_version"] == "v000001"
+
+        # Never succeeds: ready anyway, with the last error
+        main.startup_state.update(ready=False, warmup=None)
+        calls.clear()
+        with patch.object(RAGService, "warmup", failing_warmup):
+            asyncio.run(main.warm_up())
+        assert len(calls) == 3
+        assert main.startup_state["ready"] and main.startup_state["error"] == "quota exceeded"
+
+        # Missing index files: nothing to warm and no point retrying
+        main.startup_state.update(ready=False, error=None)
+        with patch.object(RAGService, "warmup", corrupt_warmup):
+            asyncio.run(main.warm_up())
+        assert main.startup_state["ready"] and "test.chunks" in main.startup_state["error"]
+        print("Failed warmup state:", main.startup_state)
+
+
+if __name__ == "__main__":
+    test_import_time()
+    test_warmup_and_ready()
+    test_failed_warmup_still_gets_ready()
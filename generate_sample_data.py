@@ -1,6 +1,18 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
+import argparse
 import os
+import random
+
+# Vocabulary for synthetic documents; insurance flavoured so retrieval
+# queries in benchmarks look like real questions.
+WORDS = (
+    "policy claim deductible premium coverage driver vehicle accident damage report adjuster "
+    "liability collision comprehensive renewal payment invoice agent customer account document "
+    "medical bill receipt police photo repair estimate limit excess benefit exclusion period "
+    "notice cancel refund quote discount household property theft fire flood storm travel "
+    "the a of to and in for with on by is are be can will may must within after before each"
+).split()
 
 def create_pdf(filename):
     c = canvas.Canvas(filename, pagesize=letter)
@@ -51,9 +63,72 @@ def create_pdf(filename):
         
     c.save()
 
+def synthetic_paragraph(rng, sentences=5):
+    """Deterministic filler text: a few sentences of 8-20 vocabulary words."""
+    result = []
+    for _ in range(sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+        result.append(" ".join(words).capitalize() + ".")
+    return " ".join(result)
+
+
+def create_synthetic_pdf(filename, pages=10, seed=0):
+    """
+    Writes a PDF of `pages` full pages of deterministic filler text (same
+    seed, same document), for ingest and query benchmarks.
+    """
+    rng = random.Random(seed)
+    c = canvas.Canvas(filename, pagesize=letter)
+    width, height = letter
+    for page in range(pages):
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(50, height - 50, f"Section {page + 1}")
+        c.setFont("Helvetica", 11)
+        y_position = height - 80
+        while y_position > 60:
+            line = ""
+            for word in synthetic_paragraph(rng).split():
+                if c.stringWidth(line + word) < 500:
+                    line += word + " "
+                else:
+                    c.drawString(50, y_position, line)
+                    y_position -= 14
+                    line = word + " "
+                    if y_position <= 60:
+                        break
+            if y_position > 60:
+                c.drawString(50, y_position, line)
+                y_position -= 24
+        c.showPage()
+    c.save()
+
+
+def create_synthetic_corpus(output_dir, count=10, pages=10, seed=0):
+    """Writes `count` synthetic PDFs (synthetic_000.pdf, ...) and returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(output_dir, f"synthetic_{i:03d}.pdf")
+        create_synthetic_pdf(path, pages=pages, seed=seed + i)
+        paths.append(path)
+    return paths
+
+
 if __name__ == "__main__":
-    output_dir = os.path.join("backend", "data")
+    parser = argparse.ArgumentParser(description="Generate sample PDFs for the RAG backend.")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="COUNT",
+                        help="Also generate COUNT synthetic PDFs of filler text")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic PDF")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=os.path.join("backend", "data"))
+    args = parser.parse_args()
+
+    output_dir = args.output_dir
     os.makedirs(output_dir, exist_ok=True)
     pdf_path = os.path.join(output_dir, "Insurance_FAQ.pdf")
     create_pdf(pdf_path)
     print(f"PDF generated at: {pdf_path}")
+
+    if args.synthetic:
+        paths = create_synthetic_corpus(output_dir, args.synthetic, args.pages, args.seed)
+        print(f"{len(paths)} synthetic PDFs ({args.pages} pages each) generated in: {output_dir}")